@@ -0,0 +1,141 @@
+"""Throttling of failed Basic-auth attempts.
+
+Failures are counted per username and per client address. Once either
+reaches `threshold` failures, further attempts for it are refused for an
+exponentially growing delay (`base` * 2^(failures - threshold), at most
+`max_delay`) before any user lookup or bcrypt work is done. A successful
+login clears its username's record; records are forgotten `window` seconds
+after their last failure, and at most `max_keys` are kept (least recently
+failed dropped first).
+
+Attempts still being verified count against the same budget: a key with
+`failures` recorded admits at most `threshold - failures` (at least one)
+attempts at a time, and `acquire` refuses the rest before hashing. Otherwise
+a parallel burst would pass the check together and each still cost a full
+bcrypt verify before the first failure was recorded.
+
+Keys do not depend on whether the user exists, so throttling reveals
+nothing about which accounts are real. All bookkeeping runs on the event
+loop, so no locking is needed.
+"""
+import time
+from collections import OrderedDict
+
+from app.core import metrics
+from app.core.config import (
+    AUTH_BACKOFF_BASE,
+    AUTH_BACKOFF_MAX,
+    AUTH_FAILURE_THRESHOLD,
+    AUTH_FAILURE_WINDOW,
+    AUTH_THROTTLE_MAX_KEYS,
+)
+
+
+class AuthThrottle:
+    def __init__(
+        self,
+        threshold: int = AUTH_FAILURE_THRESHOLD,
+        base: float = AUTH_BACKOFF_BASE,
+        max_delay: float = AUTH_BACKOFF_MAX,
+        window: float = AUTH_FAILURE_WINDOW,
+        max_keys: int = AUTH_THROTTLE_MAX_KEYS,
+        clock=time.monotonic,
+    ):
+        self.threshold = threshold
+        self.base = base
+        self.max_delay = max_delay
+        self.window = window
+        self.max_keys = max_keys
+        self.clock = clock
+        # key -> (failures, last failure, blocked until)
+        self._records = OrderedDict()
+        # key -> attempts acquired and not yet released
+        self._in_flight = {}
+
+    @staticmethod
+    def keys(username: str, address: str):
+        return ("user:" + username.lower(), "addr:" + address)
+
+    def _record(self, key: str, now: float):
+        record = self._records.get(key)
+        if record is not None and now - record[1] > self.window:
+            del self._records[key]
+            return None
+        return record
+
+    def retry_after(self, username: str, address: str) -> float:
+        """Seconds until an attempt for `username` from `address` is allowed again (0: allowed now)."""
+        now = self.clock()
+        wait = 0.0
+        for key in self.keys(username, address):
+            record = self._record(key, now)
+            if record is not None:
+                wait = max(wait, record[2] - now)
+        if wait > 0:
+            metrics.incr("auth_throttled")
+        return wait
+
+    def acquire(self, username: str, address: str) -> float:
+        """Reserve an attempt for `username` from `address`; return 0, or the seconds to wait when refused.
+
+        Every 0 must be paired with a `release` once the verify is done.
+        """
+        now = self.clock()
+        keys = self.keys(username, address)
+        wait = 0.0
+        for key in keys:
+            record = self._record(key, now)
+            if record is not None:
+                wait = max(wait, record[2] - now)
+            budget = max(1, self.threshold - (record[0] if record else 0))
+            if self._in_flight.get(key, 0) >= budget:
+                # the budget is taken by attempts still being verified
+                wait = max(wait, self.base)
+        if wait > 0:
+            metrics.incr("auth_throttled")
+            return wait
+        for key in keys:
+            self._in_flight[key] = self._in_flight.get(key, 0) + 1
+        return 0.0
+
+    def release(self, username: str, address: str):
+        for key in self.keys(username, address):
+            count = self._in_flight.pop(key, 0) - 1
+            if count > 0:
+                self._in_flight[key] = count
+
+    def failure(self, username: str, address: str):
+        now = self.clock()
+        metrics.incr("auth_failures")
+        for key in self.keys(username, address):
+            record = self._record(key, now)
+            failures = (record[0] if record else 0) + 1
+            blocked_until = now
+            if failures >= self.threshold:
+                blocked_until = now + min(self.max_delay, self.base * 2 ** (failures - self.threshold))
+            self._records.pop(key, None)
+            self._records[key] = (failures, now, blocked_until)
+        while len(self._records) > self.max_keys:
+            self._records.popitem(last=False)
+
+    def success(self, username: str):
+        # the address record stays: one valid account must not reset a stuffing run
+        self._records.pop(self.keys(username, "")[0], None)
+
+    def reset(self):
+        self._records.clear()
+        self._in_flight.clear()
+
+    def stats(self) -> dict:
+        now = self.clock()
+        return {
+            "tracked": len(self._records),
+            "blocked": sum(1 for _, _, until in self._records.values() if until > now),
+            # each attempt holds a username key and an address key: count it once
+            "in_flight": sum(count for key, count in self._in_flight.items() if key.startswith("user:")),
+            "max_keys": self.max_keys,
+        }
+
+
+auth_throttle = AuthThrottle()
+metrics.register_source("auth_throttle", auth_throttle.stats)
@@ -0,0 +1,147 @@
+"""Bulkheads: separate thread pools per class of blocking work.
+
+Blocking calls used to share anyio's single default threadpool, so a slow
+dependency (OpenLibrary during book creation) could hold every thread and
+stall unrelated reads. Each bulkhead has its own thread limit and a bounded
+wait queue:
+
+- `read`        DB work for GET requests
+- `write`       DB work for other requests
+- `enrichment`  OpenLibrary lookups on book creation
+- `auth`        credential checks (user lookup + bcrypt verify)
+
+`await get_bulkhead("read").run(fn, *args)` runs `fn` in a thread counted
+against that bulkhead only. When its queue is full the call fails fast with
+`BulkheadFull` (answered as 503) instead of waiting behind the backlog.
+`async with bulkhead.slot()` bounds async work (the async DB mode) the same
+way. Limiters are per event loop, like anyio's default one.
+"""
+import functools
+from contextlib import asynccontextmanager
+
+import anyio.to_thread
+from anyio import CapacityLimiter, WouldBlock
+from anyio.lowlevel import RunVar
+
+from app.core import metrics
+from app.core.config import (
+    BULKHEAD_AUTH_LIMIT,
+    BULKHEAD_AUTH_QUEUE,
+    BULKHEAD_ENRICHMENT_LIMIT,
+    BULKHEAD_ENRICHMENT_QUEUE,
+    BULKHEAD_READ_LIMIT,
+    BULKHEAD_READ_QUEUE,
+    BULKHEAD_WRITE_LIMIT,
+    BULKHEAD_WRITE_QUEUE,
+)
+
+
+class BulkheadFull(Exception):
+    def __init__(self, name: str):
+        super().__init__(f"Bulkhead {name!r} is full")
+        self.name = name
+
+
+class Bulkhead:
+    def __init__(self, name: str, limit: int, max_queue: int):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.waiting = 0
+        self.active = 0
+        self.completed = 0
+        self.rejected = 0
+        self._limiter = RunVar(f"bulkhead_{name}")
+
+    def limiter(self) -> CapacityLimiter:
+        try:
+            return self._limiter.get()
+        except LookupError:
+            limiter = CapacityLimiter(self.limit)
+            self._limiter.set(limiter)
+            return limiter
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one of the bulkhead's slots for the duration of the block."""
+        limiter = self.limiter()
+        try:
+            limiter.acquire_nowait()
+        except WouldBlock:
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                metrics.incr(f"bulkhead_{self.name}_rejected")
+                raise BulkheadFull(self.name)
+            self.waiting += 1
+            try:
+                await limiter.acquire()
+            finally:
+                self.waiting -= 1
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self.completed += 1
+            limiter.release()
+
+    async def run(self, fn, *args, **kwargs):
+        """Run blocking `fn(*args, **kwargs)` in a thread taken from this bulkhead."""
+        async with self.slot():
+            return await anyio.to_thread.run_sync(functools.partial(fn, *args, **kwargs), limiter=_thread_limiter())
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def reset(self):
+        self.completed = 0
+        self.rejected = 0
+
+
+_threads = RunVar("bulkhead_threads")
+
+
+def _thread_limiter() -> CapacityLimiter:
+    # bulkhead slots do the limiting; this one only has to be large enough never to block
+    try:
+        return _threads.get()
+    except LookupError:
+        limiter = CapacityLimiter(sum(b.limit for b in _bulkheads.values()))
+        _threads.set(limiter)
+        return limiter
+
+
+_bulkheads = {
+    "read": Bulkhead("read", BULKHEAD_READ_LIMIT, BULKHEAD_READ_QUEUE),
+    "write": Bulkhead("write", BULKHEAD_WRITE_LIMIT, BULKHEAD_WRITE_QUEUE),
+    "enrichment": Bulkhead("enrichment", BULKHEAD_ENRICHMENT_LIMIT, BULKHEAD_ENRICHMENT_QUEUE),
+    "auth": Bulkhead("auth", BULKHEAD_AUTH_LIMIT, BULKHEAD_AUTH_QUEUE),
+}
+
+
+def get_bulkhead(name: str) -> Bulkhead:
+    return _bulkheads[name]
+
+
+def waiting() -> int:
+    """Calls queued across all bulkheads (a load-shedding signal)."""
+    return sum(b.waiting for b in _bulkheads.values())
+
+
+def stats() -> dict:
+    return {name: bulkhead.stats() for name, bulkhead in _bulkheads.items()}
+
+
+def reset_bulkheads():
+    for bulkhead in _bulkheads.values():
+        bulkhead.reset()
+
+
+metrics.register_source("bulkheads", stats)
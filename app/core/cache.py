@@ -0,0 +1,97 @@
+"""Per-worker in-process caches.
+
+`TTLCache` is a small thread-safe LRU whose entries also expire after `ttl`
+seconds. Read-through callers take a `generation()` token before loading from
+the database and hand it back to `set()`; if anything was invalidated in the
+meantime the load may have raced with a write, so the value is dropped instead
+of caching stale data.
+
+Every cache registers itself by name so tests and the metrics endpoint can
+reach all of them.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+_registry = {}
+
+
+class TTLCache:
+    """Thread-safe LRU with per-entry expiry and generation-guarded sets."""
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl: float = 60.0, clock=time.monotonic):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._generation = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        _registry[name] = self
+
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                expires, value = item
+                if expires > self.clock():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, generation: int = None) -> bool:
+        """Store `value`; skipped (False) when disabled or invalidated since `generation`."""
+        if self.maxsize <= 0:
+            return False
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return False
+            self._data[key] = (self.clock() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+            return True
+
+    def invalidate(self, *keys):
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+def get_cache(name: str) -> TTLCache:
+    return _registry[name]
+
+
+def all_caches() -> dict:
+    return dict(_registry)
+
+
+def reset_caches():
+    """Empty every registered cache and zero its counters."""
+    for cache in _registry.values():
+        cache.clear()
+        cache.hits = cache.misses = 0
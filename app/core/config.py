@@ -9,8 +9,184 @@ MYSQL_HOST = os.getenv("MYSQL_HOST", "localhost")
 MYSQL_PORT = os.getenv("MYSQL_PORT", "3306")
 MYSQL_DB = os.getenv("MYSQL_DB", "digital_library")
 
-DATABASE_URL = (
+# DATABASE_URL overrides the MySQL settings above when set
+DATABASE_URL = os.getenv("DATABASE_URL") or (
     f"mysql+mysqlconnector://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DB}"
 )
 
-__all__ = ["DATABASE_URL", "MYSQL_HOST", "MYSQL_PORT", "MYSQL_DB"]
+# Connection pool per worker process; app.server sizes the worker count so
+# that workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) stays within
+# DB_CONNECTION_BUDGET (our share of the server's max_connections).
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_CONNECTION_BUDGET = int(os.getenv("DB_CONNECTION_BUDGET", "150"))
+
+# Worker startup (app.db.startup): DB_CREATE_SCHEMA=1 runs app.db.migrate in the
+# lifespan (development only); DB_PREWARM_CONNECTIONS pool connections are
+# opened before serving.
+DB_CREATE_SCHEMA = os.getenv("DB_CREATE_SCHEMA", "0").lower() in ("1", "true", "yes")
+DB_PREWARM_CONNECTIONS = int(os.getenv("DB_PREWARM_CONNECTIONS", str(DB_POOL_SIZE)))
+
+# DB_ASYNC=1 serves requests through an AsyncSession on ASYNC_DATABASE_URL
+# (default: DATABASE_URL with its async driver, e.g. mysql+aiomysql).
+DB_ASYNC = os.getenv("DB_ASYNC", "0").lower() in ("1", "true", "yes")
+ASYNC_DRIVERS = {
+    "mysql+mysqlconnector://": "mysql+aiomysql://",
+    "sqlite://": "sqlite+aiosqlite://",
+}
+
+
+def async_database_url(url: str) -> str:
+    for sync_prefix, async_prefix in ASYNC_DRIVERS.items():
+        if url.startswith(sync_prefix):
+            return async_prefix + url[len(sync_prefix):]
+    return url
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or async_database_url(DATABASE_URL)
+
+# Response compression: bodies below COMPRESSION_MIN_SIZE bytes are sent as-is;
+# up to COMPRESSION_CACHE_SIZE compressed bodies are kept for reuse.
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_CACHE_SIZE = int(os.getenv("COMPRESSION_CACHE_SIZE", "256"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+
+# Per-worker cache of published material detail payloads
+MATERIAL_CACHE_SIZE = int(os.getenv("MATERIAL_CACHE_SIZE", "1024"))
+MATERIAL_CACHE_TTL = float(os.getenv("MATERIAL_CACHE_TTL", "60"))
+
+# Per-worker cache of anonymous search results (page ids + total)
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "512"))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "30"))
+
+# Per-worker cache of authors (detail reads and author_id pre-checks)
+AUTHOR_CACHE_SIZE = int(os.getenv("AUTHOR_CACHE_SIZE", "4096"))
+AUTHOR_CACHE_TTL = float(os.getenv("AUTHOR_CACHE_TTL", "300"))
+
+# Cross-worker invalidation: each worker applies other workers' writes from the
+# cache_changes table at most CACHE_SYNC_INTERVAL seconds late; only the newest
+# CACHE_CHANGES_RETENTION rows are kept.
+CACHE_SYNC_INTERVAL = float(os.getenv("CACHE_SYNC_INTERVAL", "1"))
+CACHE_CHANGES_RETENTION = int(os.getenv("CACHE_CHANGES_RETENTION", "10000"))
+
+# Load shedding (app.middleware.load_shedding): a worker rejects requests with
+# 503 once in-flight requests, event-loop delay (seconds) or threadpool
+# backlog approach these limits; expensive request classes are shed first.
+SHED_MAX_IN_FLIGHT = int(os.getenv("SHED_MAX_IN_FLIGHT", "256"))
+SHED_MAX_QUEUE_DELAY = float(os.getenv("SHED_MAX_QUEUE_DELAY", "0.5"))
+SHED_MAX_THREAD_QUEUE = int(os.getenv("SHED_MAX_THREAD_QUEUE", "200"))
+SHED_RETRY_AFTER = float(os.getenv("SHED_RETRY_AFTER", "1"))
+
+# Bulkheads (app.core.bulkheads): threads per class of blocking work and how
+# many calls may queue for them before new ones are rejected with 503. The
+# limits add up to the worker's thread count for these calls.
+BULKHEAD_READ_LIMIT = int(os.getenv("BULKHEAD_READ_LIMIT", "20"))
+BULKHEAD_READ_QUEUE = int(os.getenv("BULKHEAD_READ_QUEUE", "200"))
+BULKHEAD_WRITE_LIMIT = int(os.getenv("BULKHEAD_WRITE_LIMIT", "10"))
+BULKHEAD_WRITE_QUEUE = int(os.getenv("BULKHEAD_WRITE_QUEUE", "100"))
+BULKHEAD_ENRICHMENT_LIMIT = int(os.getenv("BULKHEAD_ENRICHMENT_LIMIT", "4"))
+BULKHEAD_ENRICHMENT_QUEUE = int(os.getenv("BULKHEAD_ENRICHMENT_QUEUE", "16"))
+BULKHEAD_AUTH_LIMIT = int(os.getenv("BULKHEAD_AUTH_LIMIT", "6"))
+BULKHEAD_AUTH_QUEUE = int(os.getenv("BULKHEAD_AUTH_QUEUE", "100"))
+
+# Failed Basic-auth throttling (app.core.auth_throttle): after
+# AUTH_FAILURE_THRESHOLD failures for a username or client address, attempts
+# are refused for AUTH_BACKOFF_BASE seconds, doubling per further failure up
+# to AUTH_BACKOFF_MAX. Records expire AUTH_FAILURE_WINDOW seconds after the
+# last failure; at most AUTH_THROTTLE_MAX_KEYS are kept.
+AUTH_FAILURE_THRESHOLD = int(os.getenv("AUTH_FAILURE_THRESHOLD", "5"))
+AUTH_BACKOFF_BASE = float(os.getenv("AUTH_BACKOFF_BASE", "1"))
+AUTH_BACKOFF_MAX = float(os.getenv("AUTH_BACKOFF_MAX", "300"))
+AUTH_FAILURE_WINDOW = float(os.getenv("AUTH_FAILURE_WINDOW", "900"))
+AUTH_THROTTLE_MAX_KEYS = int(os.getenv("AUTH_THROTTLE_MAX_KEYS", "100000"))
+
+# Rate limiting (app.middleware.rate_limit): token buckets per principal
+# (Basic-auth user once verified from that IP, else client IP) and route
+# class, as "rate/burst" where rate is tokens per second and burst the bucket
+# size; "0" turns a class off. At most RATE_LIMIT_MAX_KEYS buckets (and as
+# many verified user/IP pairs) are kept per worker (least recently used are
+# dropped).
+
+
+def rate_limit(value: str):
+    rate, _, burst = value.partition("/")
+    rate = float(rate)
+    return (rate, int(burst or max(1, rate))) if rate > 0 else None
+
+
+RATE_LIMIT_READ = rate_limit(os.getenv("RATE_LIMIT_READ", "50/200"))
+RATE_LIMIT_SEARCH = rate_limit(os.getenv("RATE_LIMIT_SEARCH", "10/50"))
+RATE_LIMIT_WRITE = rate_limit(os.getenv("RATE_LIMIT_WRITE", "20/100"))
+RATE_LIMIT_EXPORT = rate_limit(os.getenv("RATE_LIMIT_EXPORT", "1/5"))
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+# POST /batch: at most BATCH_MAX_OPERATIONS sub-requests per call; runs of
+# consecutive reads in a non-atomic batch execute BATCH_MAX_PARALLEL at a time.
+BATCH_MAX_OPERATIONS = int(os.getenv("BATCH_MAX_OPERATIONS", "50"))
+BATCH_MAX_PARALLEL = int(os.getenv("BATCH_MAX_PARALLEL", "4"))
+
+# Fuzzy search (trigram index): a match must contain at least FUZZY_MIN_SCORE
+# of the query's trigrams; at most FUZZY_MAX_CANDIDATES texts are scored per query.
+FUZZY_MIN_SCORE = float(os.getenv("FUZZY_MIN_SCORE", "0.5"))
+FUZZY_MAX_CANDIDATES = int(os.getenv("FUZZY_MAX_CANDIDATES", "1000"))
+
+# Similar materials (TF-IDF over hashed words): SIMILAR_FEATURES hash buckets;
+# the matrix is rebuilt in the background once changed materials exceed
+# SIMILAR_REBUILD_AFTER of its rows.
+SIMILAR_FEATURES = int(os.getenv("SIMILAR_FEATURES", str(2 ** 18)))
+SIMILAR_REBUILD_AFTER = float(os.getenv("SIMILAR_REBUILD_AFTER", "0.2"))
+
+__all__ = [
+    "DATABASE_URL",
+    "DB_POOL_SIZE",
+    "DB_MAX_OVERFLOW",
+    "DB_CONNECTION_BUDGET",
+    "DB_CREATE_SCHEMA",
+    "DB_PREWARM_CONNECTIONS",
+    "DB_ASYNC",
+    "ASYNC_DATABASE_URL",
+    "MYSQL_HOST",
+    "MYSQL_PORT",
+    "MYSQL_DB",
+    "COMPRESSION_MIN_SIZE",
+    "COMPRESSION_CACHE_SIZE",
+    "GZIP_LEVEL",
+    "BROTLI_QUALITY",
+    "MATERIAL_CACHE_SIZE",
+    "MATERIAL_CACHE_TTL",
+    "SEARCH_CACHE_SIZE",
+    "SEARCH_CACHE_TTL",
+    "AUTHOR_CACHE_SIZE",
+    "AUTHOR_CACHE_TTL",
+    "CACHE_SYNC_INTERVAL",
+    "CACHE_CHANGES_RETENTION",
+    "SHED_MAX_IN_FLIGHT",
+    "SHED_MAX_QUEUE_DELAY",
+    "SHED_MAX_THREAD_QUEUE",
+    "SHED_RETRY_AFTER",
+    "BULKHEAD_READ_LIMIT",
+    "BULKHEAD_READ_QUEUE",
+    "BULKHEAD_WRITE_LIMIT",
+    "BULKHEAD_WRITE_QUEUE",
+    "BULKHEAD_ENRICHMENT_LIMIT",
+    "BULKHEAD_ENRICHMENT_QUEUE",
+    "BULKHEAD_AUTH_LIMIT",
+    "BULKHEAD_AUTH_QUEUE",
+    "AUTH_FAILURE_THRESHOLD",
+    "AUTH_BACKOFF_BASE",
+    "AUTH_BACKOFF_MAX",
+    "AUTH_FAILURE_WINDOW",
+    "AUTH_THROTTLE_MAX_KEYS",
+    "RATE_LIMIT_READ",
+    "RATE_LIMIT_SEARCH",
+    "RATE_LIMIT_WRITE",
+    "RATE_LIMIT_EXPORT",
+    "RATE_LIMIT_MAX_KEYS",
+    "BATCH_MAX_OPERATIONS",
+    "BATCH_MAX_PARALLEL",
+    "FUZZY_MIN_SCORE",
+    "FUZZY_MAX_CANDIDATES",
+    "SIMILAR_FEATURES",
+    "SIMILAR_REBUILD_AFTER",
+]
@@ -0,0 +1,40 @@
+"""Process-local counters and cache statistics, served by GET /metrics.
+
+Counters are plain named integers (`incr("coalesced_requests")`). Anything
+else that keeps its own statistics registers a callable with
+`register_source`; caches built on `TTLCache` are included automatically.
+Every worker reports only its own numbers.
+"""
+import threading
+from collections import defaultdict
+
+from app.core.cache import all_caches
+
+_counters = defaultdict(int)
+_sources = {}
+_lock = threading.Lock()
+
+
+def incr(name: str, amount: int = 1):
+    with _lock:
+        _counters[name] += amount
+
+
+def register_source(name: str, stats):
+    """Include `stats()` under `name` in every snapshot."""
+    _sources[name] = stats
+
+
+def snapshot() -> dict:
+    with _lock:
+        counters = dict(_counters)
+    return {
+        "counters": counters,
+        "caches": {name: cache.stats() for name, cache in all_caches().items()},
+        **{name: stats() for name, stats in _sources.items()},
+    }
+
+
+def reset_counters():
+    with _lock:
+        _counters.clear()
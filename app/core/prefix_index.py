@@ -0,0 +1,135 @@
+"""Per-worker in-memory prefix indexes for autocomplete.
+
+A `PrefixIndex` maps ids to a display text and keeps a sorted array of
+normalized search terms: the text from each of its words onwards, so "gat"
+and "great gat" both complete "The Great Gatsby". A completion is one
+`bisect` into the array followed by a scan over the matching range, with no
+database round trip.
+
+The index is loaded in full once (at startup, or on first use) and then kept
+current by id: writes call `invalidate(id)`, and the next reader refreshes
+just those ids from the database (see `crud.autocomplete`). Like the caches,
+every index registers itself by name for tests and /metrics.
+"""
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+
+from app.core import metrics
+
+_registry = {}
+_separators = re.compile(r"[\W_]+")
+
+
+def normalize(text: str) -> str:
+    """Case-fold, drop accents and reduce punctuation and whitespace runs to one space."""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return _separators.sub(" ", text).strip()
+
+
+def _terms(text: str):
+    words = normalize(text).split(" ")
+    return {" ".join(words[i:]) for i in range(len(words)) if words[i]}
+
+
+class PrefixIndex:
+    """Thread-safe sorted-array index of (term, id) pairs, with the display value kept per id."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.loaded = False
+        self.lookups = 0
+        self._keys = []  # sorted (term, id)
+        self._entries = {}  # id -> (value, terms)
+        self._pending = set()
+        self._lock = threading.Lock()
+        _registry[name] = self
+
+    def load(self, items):
+        """Replace the contents with `items`, an iterable of (id, text, value)."""
+        entries = {item_id: (value, _terms(text)) for item_id, text, value in items}
+        keys = sorted((term, item_id) for item_id, (_, terms) in entries.items() for term in terms)
+        with self._lock:
+            self._entries = entries
+            self._keys = keys
+            self.loaded = True
+
+    def _remove(self, item_id):
+        entry = self._entries.pop(item_id, None)
+        if entry is not None:
+            for term in entry[1]:
+                i = bisect_left(self._keys, (term, item_id))
+                del self._keys[i]
+
+    def refresh(self, ids, items):
+        """Drop `ids`, then add back those present in `items` (the current rows for them)."""
+        with self._lock:
+            for item_id in ids:
+                self._remove(item_id)
+            for item_id, text, value in items:
+                self._remove(item_id)
+                terms = _terms(text)
+                self._entries[item_id] = (value, terms)
+                for term in terms:
+                    insort(self._keys, (term, item_id))
+
+    def invalidate(self, item_id):
+        with self._lock:
+            self._pending.add(item_id)
+
+    def take_pending(self) -> set:
+        with self._lock:
+            pending, self._pending = self._pending, set()
+            return pending
+
+    def complete(self, prefix: str, limit: int = 10) -> list:
+        """Values of up to `limit` entries with a term starting with `prefix`, in term order."""
+        prefix = normalize(prefix)
+        found = {}
+        with self._lock:
+            self.lookups += 1
+            i = bisect_left(self._keys, (prefix,))
+            while i < len(self._keys) and len(found) < limit:
+                term, item_id = self._keys[i]
+                if not term.startswith(prefix):
+                    break
+                if item_id not in found:
+                    found[item_id] = self._entries[item_id][0]
+                i += 1
+        return list(found.values())
+
+    def clear(self):
+        """Forget everything; the next reader reloads the index in full."""
+        with self._lock:
+            self._entries = {}
+            self._keys = []
+            self._pending = set()
+            self.loaded = False
+
+    def stats(self) -> dict:
+        return {
+            "loaded": self.loaded,
+            "entries": len(self._entries),
+            "terms": len(self._keys),
+            "pending": len(self._pending),
+            "lookups": self.lookups,
+        }
+
+
+def all_indexes() -> dict:
+    return dict(_registry)
+
+
+def reset_indexes():
+    for index in _registry.values():
+        index.clear()
+        index.lookups = 0
+
+
+def stats() -> dict:
+    return {name: index.stats() for name, index in _registry.items()}
+
+
+metrics.register_source("prefix_indexes", stats)
@@ -0,0 +1,283 @@
+"""Per-worker TF-IDF index for "more like this" recommendations.
+
+Each document (a material's title and description) is a hashed bag of words:
+tokens are normalized like the search indexes and hashed with CRC-32 into
+`n_features` columns, so there is no vocabulary to maintain and a new
+document never changes the matrix's shape. Weights are sublinear TF times
+smoothed IDF, rows are L2-normalized, so the cosine similarity of two
+documents is the dot product of their rows.
+
+The matrix is a SciPy sparse matrix, kept in CSR (to read one document's
+vector) and CSC (to score every document against it using only the columns
+the query actually has). A lookup is one sparse matrix-vector product plus an
+`argpartition` for the top k.
+
+Updates are incremental: a changed or deleted document's row is masked out
+and its new version goes into a small side table weighted with the current
+IDF. IDF drifts as documents change, so once the changes exceed
+`rebuild_after` of the rows (plus a small floor) the owner rebuilds the whole
+matrix in the background and swaps it in (see `crud.similar_materials`). The
+first build goes the same way: lookups are only answered once a matrix is
+loaded, and are never served a half-built one.
+
+NumPy and SciPy are optional: they are imported on first use, and without
+them `available()` is False and no index is built.
+"""
+import math
+import threading
+import zlib
+from collections import Counter
+
+from app.core import metrics
+from app.core.config import SIMILAR_FEATURES, SIMILAR_REBUILD_AFTER
+from app.core.prefix_index import normalize
+
+np = sparse = None
+_registry = {}
+# below this many changes a rebuild is not worth it, whatever the index size
+REBUILD_FLOOR = 100
+
+
+def available() -> bool:
+    """Whether NumPy and SciPy can be imported (imported here on first call: they are slow to load)."""
+    global np, sparse
+    if sparse is None:
+        try:
+            import numpy
+            from scipy import sparse as scipy_sparse
+        except ImportError:
+            return False
+        np, sparse = numpy, scipy_sparse
+    return True
+
+
+class SimilarityIndex:
+    def __init__(self, name: str, n_features: int = SIMILAR_FEATURES, rebuild_after: float = SIMILAR_REBUILD_AFTER):
+        self.name = name
+        self.n_features = n_features
+        self.rebuild_after = rebuild_after
+        self.loaded = False
+        self.rebuilding = False
+        self.lookups = 0
+        # bumped by clear(): a build started before it is not swapped in
+        self.generation = 0
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._since_rebuild = None
+        self._state = None
+        _registry[name] = self
+
+    def _features(self, text: str) -> Counter:
+        return Counter(zlib.crc32(token.encode()) % self.n_features for token in normalize(text).split())
+
+    def _build(self, items) -> dict:
+        if not available():
+            raise RuntimeError("Similarity indexes need NumPy and SciPy")
+        ids, values, rows, cols, counts = [], [], [], [], []
+        for item_id, text, value in items:
+            features = self._features(text)
+            rows.extend([len(ids)] * len(features))
+            cols.extend(features)
+            counts.extend(features.values())
+            ids.append(item_id)
+            values.append(value)
+        matrix = sparse.csr_matrix(
+            (np.asarray(counts, dtype=np.float32), (np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64))),
+            shape=(len(ids), self.n_features),
+        )
+        df = np.bincount(matrix.indices, minlength=self.n_features).astype(np.int64)
+        idf = np.log((1 + len(ids)) / (1 + df)) + 1
+        matrix.data = ((1 + np.log(matrix.data)) * idf[matrix.indices]).astype(np.float32)
+        if ids:
+            norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+            norms[norms == 0] = 1
+            matrix = sparse.csr_matrix(sparse.diags(1 / norms) @ matrix, dtype=np.float32)
+        return {
+            "ids": np.asarray(ids, dtype=np.int64),
+            "values": values,
+            "rows": matrix,
+            "cols": matrix.tocsc(),
+            "alive": np.ones(len(ids), dtype=bool),
+            "row_of": {item_id: row for row, item_id in enumerate(ids)},
+            "extra": {},  # id -> (columns, weights, value)
+            "df": df,
+            "docs": len(ids),
+            "changes": 0,
+        }
+
+    def _vector(self, features: Counter):
+        """(columns, weights) of a document, L2-normalized with the current IDF."""
+        state = self._state
+        cols = np.fromiter(features.keys(), dtype=np.int64, count=len(features))
+        counts = np.fromiter(features.values(), dtype=np.float64, count=len(features))
+        weights = (1 + np.log(counts)) * (np.log((1 + state["docs"]) / (1 + state["df"][cols])) + 1)
+        norm = math.sqrt(float(weights @ weights)) or 1.0
+        return cols, (weights / norm).astype(np.float32)
+
+    def load(self, items):
+        """Replace the contents with `items`, an iterable of (id, text, value)."""
+        state = self._build(items)
+        with self._lock:
+            self._state = state
+            self.loaded = True
+
+    def start_rebuild(self, force: bool = False) -> bool:
+        """True (and marked as rebuilding) when the caller should build a fresh matrix now.
+
+        That is when enough changed since the last build, or with `force` (the
+        first build, or a matrix that may have missed changes) unless a build
+        is already running.
+        """
+        with self._lock:
+            state = self._state
+            if self.rebuilding or (state is None and not force):
+                return False
+            if not force and state["changes"] <= REBUILD_FLOOR + self.rebuild_after * len(state["ids"]):
+                return False
+            self.rebuilding = True
+            self._since_rebuild = set()
+            return True
+
+    def rebuild(self, items, generation: int = None):
+        """Build a fresh matrix from `items` (read after `start_rebuild`) and swap it in.
+
+        With `generation`, the matrix is dropped if the index was cleared since.
+        """
+        try:
+            state = self._build(items)
+        except BaseException:
+            with self._lock:
+                if generation is None or generation == self.generation:
+                    self.rebuilding = False
+                    self._since_rebuild = None
+            raise
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._state = state
+            self.loaded = True
+            # refreshed while the rows were read: those may predate the new matrix
+            self._pending |= self._since_rebuild
+            self._since_rebuild = None
+            self.rebuilding = False
+
+    def _drop(self, item_id):
+        state = self._state
+        row = state["row_of"].pop(item_id, None)
+        if row is not None:
+            state["alive"][row] = False
+            start, end = state["rows"].indptr[row], state["rows"].indptr[row + 1]
+            cols = state["rows"].indices[start:end]
+        elif item_id in state["extra"]:
+            cols = state["extra"].pop(item_id)[0]
+        else:
+            return
+        state["df"][cols] -= 1
+        state["docs"] -= 1
+
+    def refresh(self, ids, items):
+        """Drop `ids`, then add back those present in `items` (the current rows for them)."""
+        with self._lock:
+            state = self._state
+            for item_id in ids:
+                self._drop(item_id)
+            for item_id, text, value in items:
+                self._drop(item_id)
+                features = self._features(text)
+                cols = np.fromiter(features.keys(), dtype=np.int64, count=len(features))
+                state["df"][cols] += 1
+                state["docs"] += 1
+                state["extra"][item_id] = (*self._vector(features), value)
+            state["changes"] += len(ids)
+            if self._since_rebuild is not None:
+                self._since_rebuild |= set(ids)
+
+    def invalidate(self, item_id):
+        with self._lock:
+            self._pending.add(item_id)
+
+    def take_pending(self) -> set:
+        with self._lock:
+            pending, self._pending = self._pending, set()
+            return pending
+
+    def similar(self, item_id, limit: int = 10):
+        """(value, score) of up to `limit` documents most similar to `item_id`; None when it is not indexed."""
+        with self._lock:
+            state = self._state
+            row = state["row_of"].get(item_id)
+            if row is not None:
+                start, end = state["rows"].indptr[row], state["rows"].indptr[row + 1]
+                cols, weights = state["rows"].indices[start:end], state["rows"].data[start:end]
+            elif item_id in state["extra"]:
+                cols, weights, _ = state["extra"][item_id]
+            else:
+                return None
+            return self._top(cols, weights, limit, item_id)
+
+    def similar_to_text(self, text: str, limit: int = 10, exclude=None) -> list:
+        """Like `similar`, for a document that is not in the index."""
+        with self._lock:
+            return self._top(*self._vector(self._features(text)), limit, exclude)
+
+    def _top(self, cols, weights, limit, exclude) -> list:
+        state = self._state
+        self.lookups += 1
+        matches = []
+        if len(state["ids"]) and len(cols):
+            scores = state["cols"][:, cols] @ weights
+            scores[~state["alive"]] = 0
+            if exclude in state["row_of"]:
+                scores[state["row_of"][exclude]] = 0
+            k = min(limit, len(scores))
+            for row in np.argpartition(-scores, k - 1)[:k]:
+                if scores[row] > 0:
+                    matches.append((float(scores[row]), int(state["ids"][row]), state["values"][row]))
+        query = dict(zip(cols.tolist(), weights.tolist()))
+        for item_id, (extra_cols, extra_weights, value) in state["extra"].items():
+            if item_id == exclude:
+                continue
+            score = sum(query.get(col, 0.0) * weight for col, weight in zip(extra_cols.tolist(), extra_weights.tolist()))
+            if score > 0:
+                matches.append((score, item_id, value))
+        matches.sort(key=lambda match: (-match[0], match[1]))
+        return [(value, min(score, 1.0)) for score, _, value in matches[:limit]]
+
+    def clear(self):
+        """Forget everything; the next reader has the index rebuilt in full."""
+        with self._lock:
+            self._state = None
+            self._pending = set()
+            self._since_rebuild = None
+            self.loaded = False
+            self.rebuilding = False
+            self.generation += 1
+
+    def stats(self) -> dict:
+        state = self._state
+        if state is None:
+            return {"loaded": False, "rebuilding": self.rebuilding, "lookups": self.lookups}
+        return {
+            "loaded": self.loaded,
+            "rows": len(state["ids"]),
+            "masked": int((~state["alive"]).sum()),
+            "extra": len(state["extra"]),
+            "nonzeros": int(state["rows"].nnz),
+            "changes": state["changes"],
+            "rebuilding": self.rebuilding,
+            "pending": len(self._pending),
+            "lookups": self.lookups,
+        }
+
+
+def reset_similarity_indexes():
+    for index in _registry.values():
+        index.clear()
+        index.lookups = 0
+
+
+def stats() -> dict:
+    return {name: index.stats() for name, index in _registry.items()}
+
+
+metrics.register_source("similarity_indexes", stats)
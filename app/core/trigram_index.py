@@ -0,0 +1,165 @@
+"""Per-worker trigram indexes for typo-tolerant (fuzzy) search.
+
+Texts are normalized like the prefix indexes and split into trigrams, each
+word padded as in pg_trgm ("  gatsby " -> "  g", " ga", "gat", ..., "by ").
+The inverted index maps every trigram to a sorted `array` of ids (4 bytes per
+posting), so a million titles fit in tens of megabytes.
+
+A query's score against a text is the share of the query's trigrams the text
+contains, so a short, misspelled query still matches a long title ("gatsbi"
+shares 5 of its 7 trigrams with "The Great Gatsby"). To reach `min_score` a
+text must hold at least one of the query's `n - need + 1` rarest trigrams, so
+only those posting lists are scanned to find candidates; the
+`max_candidates` with the most hits are then checked against the remaining
+(long) lists by binary search. Ties are ranked by Jaccard similarity, so
+texts closer in length to the query come first.
+
+Loading and incremental refreshes work as in `PrefixIndex`. Searches hold the
+index lock: they are CPU-bound, so under the GIL nothing is lost by it.
+"""
+import heapq
+import math
+import threading
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+from operator import itemgetter
+
+from app.core import metrics
+from app.core.config import FUZZY_MAX_CANDIDATES, FUZZY_MIN_SCORE
+from app.core.prefix_index import normalize
+
+_registry = {}
+_EMPTY = array("I")
+
+
+def trigrams(text: str) -> set:
+    grams = set()
+    for word in normalize(text).split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _contains(posting, item_id) -> bool:
+    i = bisect_left(posting, item_id)
+    return i < len(posting) and posting[i] == item_id
+
+
+class TrigramIndex:
+    def __init__(self, name: str, min_score: float = FUZZY_MIN_SCORE, max_candidates: int = FUZZY_MAX_CANDIDATES):
+        self.name = name
+        self.min_score = min_score
+        self.max_candidates = max_candidates
+        self.loaded = False
+        self.searches = 0
+        self._postings = {}  # trigram -> sorted array of ids
+        self._entries = {}  # id -> (value, text, number of trigrams)
+        self._pending = set()
+        self._lock = threading.Lock()
+        _registry[name] = self
+
+    def load(self, items):
+        """Replace the contents with `items`, an iterable of (id, text, value)."""
+        entries, postings = {}, defaultdict(list)
+        for item_id, text, value in sorted(items, key=itemgetter(0)):
+            grams = trigrams(text)
+            entries[item_id] = (value, text, len(grams))
+            for gram in grams:
+                postings[gram].append(item_id)
+        postings = {gram: array("I", ids) for gram, ids in postings.items()}
+        with self._lock:
+            self._entries = entries
+            self._postings = postings
+            self.loaded = True
+
+    def _remove(self, item_id):
+        entry = self._entries.pop(item_id, None)
+        if entry is None:
+            return
+        for gram in trigrams(entry[1]):
+            posting = self._postings[gram]
+            del posting[bisect_left(posting, item_id)]
+            if not posting:
+                del self._postings[gram]
+
+    def refresh(self, ids, items):
+        """Drop `ids`, then add back those present in `items` (the current rows for them)."""
+        with self._lock:
+            for item_id in ids:
+                self._remove(item_id)
+            for item_id, text, value in items:
+                self._remove(item_id)
+                grams = trigrams(text)
+                self._entries[item_id] = (value, text, len(grams))
+                for gram in grams:
+                    insort(self._postings.setdefault(gram, array("I")), item_id)
+
+    def invalidate(self, item_id):
+        with self._lock:
+            self._pending.add(item_id)
+
+    def take_pending(self) -> set:
+        with self._lock:
+            pending, self._pending = self._pending, set()
+            return pending
+
+    def search(self, query: str, limit: int = 10) -> list:
+        """Return up to `limit` (value, score) pairs, best first, with score >= `min_score`."""
+        grams = trigrams(query)
+        if not grams:
+            return []
+        n = len(grams)
+        need = max(1, math.ceil(self.min_score * n))
+        with self._lock:
+            self.searches += 1
+            postings = sorted((self._postings.get(gram, _EMPTY) for gram in grams), key=len)
+            probe = n - need + 1
+            hits = Counter()
+            for posting in postings[:probe]:
+                hits.update(posting)
+            if len(hits) > self.max_candidates:
+                hits = dict(heapq.nlargest(self.max_candidates, hits.items(), key=itemgetter(1)))
+            for posting in postings[probe:]:
+                for item_id in hits:
+                    if _contains(posting, item_id):
+                        hits[item_id] += 1
+            ranked = []
+            for item_id, shared in hits.items():
+                if shared < need:
+                    continue
+                value, _, size = self._entries[item_id]
+                ranked.append((shared / n, shared / (n + size - shared), item_id, value))
+        ranked.sort(key=lambda match: (-match[0], -match[1], match[2]))
+        return [(value, score) for score, _, _, value in ranked[:limit]]
+
+    def clear(self):
+        """Forget everything; the next reader reloads the index in full."""
+        with self._lock:
+            self._entries = {}
+            self._postings = {}
+            self._pending = set()
+            self.loaded = False
+
+    def stats(self) -> dict:
+        return {
+            "loaded": self.loaded,
+            "entries": len(self._entries),
+            "trigrams": len(self._postings),
+            "postings": sum(len(posting) for posting in self._postings.values()),
+            "pending": len(self._pending),
+            "searches": self.searches,
+        }
+
+
+def reset_trigram_indexes():
+    for index in _registry.values():
+        index.clear()
+        index.searches = 0
+
+
+def stats() -> dict:
+    return {name: index.stats() for name, index in _registry.items()}
+
+
+metrics.register_source("trigram_indexes", stats)
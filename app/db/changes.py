@@ -0,0 +1,137 @@
+"""Cross-worker cache invalidation through the database.
+
+Writes that evict cached entries also append the evicted key to the
+`cache_changes` table in the same transaction, so the log entry commits (or
+rolls back) together with the data. Each worker remembers which change ids it
+has applied and, on a cached read, polls for newer rows at most once every
+`interval` seconds, handing each key to the caches subscribed to its prefix.
+A worker that did not handle a write therefore drops the affected entries
+within one interval, without a broker.
+
+Autoincrement ids can commit out of order, so every poll rescans the last
+`window` ids and skips the ones already applied. A worker idle for longer
+than `resync_after` clears its subscribed caches instead of trusting a log
+that may have been pruned in the meantime.
+"""
+import threading
+import time
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+
+from app.core.config import CACHE_CHANGES_RETENTION, CACHE_SYNC_INTERVAL
+from app.db.models import CacheChange
+
+changes_table = CacheChange.__table__
+# session.info key: the keys published on that session, for `ChangeFeed.replay`
+PUBLISHED_KEYS = "published_change_keys"
+
+
+class ChangeFeed:
+    def __init__(
+        self,
+        interval: float = CACHE_SYNC_INTERVAL,
+        retention: int = CACHE_CHANGES_RETENTION,
+        window: int = 1000,
+        resync_after: float = 300.0,
+        clock=time.monotonic,
+    ):
+        self.interval = interval
+        self.retention = retention
+        self.window = window
+        self.resync_after = resync_after
+        self.clock = clock
+        self.applied = 0
+        self._listeners = []
+        self._last_id = None
+        self._seen = set()
+        self._last_poll = None
+        self._published = 0
+        self._lock = threading.Lock()
+
+    def subscribe(self, prefix: str, callback):
+        """Call `callback(key)` for every change whose key starts with `prefix`.
+
+        `callback(None)` means "drop everything": the worker lost track of the log.
+        """
+        self._listeners.append((prefix, callback))
+
+    def publish(self, db: Session, key: str):
+        """Append `key` to the log inside the caller's transaction (no commit)."""
+        db.execute(changes_table.insert().values(key=key))
+        db.info.setdefault(PUBLISHED_KEYS, []).append(key)
+        self._published += 1
+        if self.retention > 0 and self._published % 1000 == 0:
+            newest = db.execute(select(func.max(changes_table.c.id))).scalar_one()
+            db.execute(delete(changes_table).where(changes_table.c.id <= newest - self.retention))
+
+    def poll(self, db: Session, force: bool = False) -> int:
+        """Apply changes committed since the last poll; returns how many were applied."""
+        now = self.clock()
+        if not force and self._last_poll is not None and now - self._last_poll < self.interval:
+            return 0
+        # one poller per worker at a time; concurrent readers just use the cache
+        if not self._lock.acquire(blocking=False):
+            return 0
+        try:
+            idle = self._last_poll is not None and now - self._last_poll > self.resync_after
+            self._last_poll = now
+            if self._last_id is None or idle:
+                self._start(db, resync=idle)
+                return 0
+            floor = self._last_id - self.window
+            rows = db.execute(
+                select(changes_table.c.id, changes_table.c.key)
+                .where(changes_table.c.id > floor)
+                .order_by(changes_table.c.id)
+            ).all()
+            applied = 0
+            for change_id, key in rows:
+                if change_id in self._seen:
+                    continue
+                self._seen.add(change_id)
+                self._dispatch(key)
+                applied += 1
+            if rows:
+                self._last_id = max(self._last_id, rows[-1][0])
+            floor = self._last_id - self.window
+            self._seen = {change_id for change_id in self._seen if change_id > floor}
+            self.applied += applied
+            return applied
+        finally:
+            self._lock.release()
+
+    def _start(self, db: Session, resync: bool):
+        newest = db.execute(select(func.coalesce(func.max(changes_table.c.id), 0))).scalar_one()
+        rows = db.execute(select(changes_table.c.id).where(changes_table.c.id > newest - self.window)).scalars()
+        self._last_id = newest
+        self._seen = set(rows)
+        if resync:
+            self._dispatch(None)
+
+    def replay(self, keys):
+        """Apply `keys` on this worker now, as if polled.
+
+        For writes whose transaction ended after their own evictions ran (an
+        atomic POST /batch): anything cached in between may hold rows that
+        were never committed, or predate the commit.
+        """
+        for key in keys:
+            self._dispatch(key)
+
+    def _dispatch(self, key):
+        for prefix, callback in self._listeners:
+            if key is None or key.startswith(prefix):
+                callback(key)
+
+    def reset(self):
+        """Forget the log position; the next poll starts from the newest change."""
+        with self._lock:
+            self._last_id = None
+            self._seen = set()
+            self._last_poll = None
+            self.applied = 0
+
+
+# One feed per worker process, shared by all caches
+change_feed = ChangeFeed()
@@ -1,25 +1,343 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import or_
-from app.db.models import User, Book, Article, Video, AuthorPerson, AuthorInstitution, Material, Author
+import logging
+import threading
+from datetime import date
+from typing import NamedTuple, Optional
+
+from sqlalchemy.orm import Session, load_only
+from sqlalchemy import or_, select, func, true
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from app.db.models import User, Book, Article, Video, AuthorPerson, AuthorInstitution, Material, Author, MaterialAuthorCount, MaterialTypeCount
 from app.schemas import UserCreate, BookCreate, ArticleCreate, VideoCreate, AuthorPersonCreate, AuthorInstitutionCreate
+from app.schemas import MaterialAdapter, BookAdapter, ArticleAdapter, VideoAdapter
+from app.core.cache import TTLCache
+from app.core.prefix_index import PrefixIndex
+from app.core.trigram_index import TrigramIndex
+from app.core.similarity import SimilarityIndex
+import app.db.database as database
+from app.core.config import (
+    AUTHOR_CACHE_SIZE,
+    AUTHOR_CACHE_TTL,
+    MATERIAL_CACHE_SIZE,
+    MATERIAL_CACHE_TTL,
+    SEARCH_CACHE_SIZE,
+    SEARCH_CACHE_TTL,
+)
+from app.db.changes import change_feed
 from app.core.security import pwd_context
 
+#########################################
+# Row-based list reads
+# List endpoints only dump a handful of columns, so they select those columns
+# straight from the tables with Core instead of materializing ORM instances
+# (identity map, attribute instrumentation, relationship proxies). Each item is
+# a lightweight `Row` that the read schemas consume via attribute access.
+materials_table = Material.__table__
+books_table = Book.__table__
+articles_table = Article.__table__
+videos_table = Video.__table__
+authors_table = Author.__table__
+person_authors_table = AuthorPerson.__table__
+institution_authors_table = AuthorInstitution.__table__
+
+MATERIAL_COLUMNS = (
+    materials_table.c.id,
+    materials_table.c.title,
+    materials_table.c.description,
+    materials_table.c.status,
+    materials_table.c.author_id,
+    materials_table.c.user_id,
+)
+
+# kind -> (FROM clause, type-specific columns)
+MATERIAL_LISTINGS = {
+    "material": (materials_table, (materials_table.c.type,)),
+    "book": (
+        materials_table.join(books_table, books_table.c.id == materials_table.c.id),
+        (books_table.c.isbn, books_table.c.page_count),
+    ),
+    "article": (
+        materials_table.join(articles_table, articles_table.c.id == materials_table.c.id),
+        (articles_table.c.doi,),
+    ),
+    "video": (
+        materials_table.join(videos_table, videos_table.c.id == materials_table.c.id),
+        (videos_table.c.duration,),
+    ),
+}
+
+AUTHOR_LISTINGS = {
+    "author": (
+        authors_table.outerjoin(person_authors_table, person_authors_table.c.id == authors_table.c.id).outerjoin(
+            institution_authors_table, institution_authors_table.c.id == authors_table.c.id
+        ),
+        (
+            authors_table.c.id,
+            authors_table.c.type,
+            func.coalesce(person_authors_table.c.name, institution_authors_table.c.name).label("name"),
+        ),
+    ),
+    "person": (
+        person_authors_table.join(authors_table, authors_table.c.id == person_authors_table.c.id),
+        (person_authors_table.c.id, person_authors_table.c.name, person_authors_table.c.birth_date),
+    ),
+    "institution": (
+        institution_authors_table.join(authors_table, authors_table.c.id == institution_authors_table.c.id),
+        (institution_authors_table.c.id, institution_authors_table.c.name, institution_authors_table.c.city),
+    ),
+}
+
+
+# Columns detail reads always load, even under a sparse fieldset, because the
+# routers check them to enforce draft/owner visibility and to build ETags.
+DETAIL_COLUMNS = ("status", "user_id", "version")
+# `viewer` default of the detail lookups: no visibility restriction (None means anonymous)
+_UNRESTRICTED = object()
+
+
+def _project(columns, fields=None, required=()):
+    """Keep only the columns named in `fields` (plus `required`); all of them when `fields` is None."""
+    if not fields:
+        return columns
+    return tuple(c for c in columns if c.key in fields or c.key in required)
+
+
+def _load_only(model, fields=None):
+    """Query options restricting an ORM detail load to `fields` plus the detail columns."""
+    if not fields:
+        return ()
+    names = [name for name in (*fields, *DETAIL_COLUMNS) if hasattr(model, name)]
+    return (load_only(*(getattr(model, name) for name in dict.fromkeys(names))),)
+
+
+def _visible_to(user):
+    """Detail visibility as a query condition: published, or owned by `user`, or any row for root."""
+    if user is None:
+        return materials_table.c.status == "published"
+    if getattr(user, "is_root", False):
+        return true()
+    return (materials_table.c.status == "published") | (materials_table.c.user_id == user.id)
+
+
+def _material_filters(from_clause, user=None, title: str = None, author_name: str = None, description: str = None):
+    """Return (from_clause, conditions) applying the visibility rules and optional filters."""
+    conditions = []
+
+    # filter by author name across person/institution authors
+    if author_name:
+        from_clause = from_clause.outerjoin(
+            person_authors_table, person_authors_table.c.id == materials_table.c.author_id
+        ).outerjoin(institution_authors_table, institution_authors_table.c.id == materials_table.c.author_id)
+        conditions.append(
+            or_(
+                person_authors_table.c.name.ilike(f"%{author_name}%"),
+                institution_authors_table.c.name.ilike(f"%{author_name}%"),
+            )
+        )
+
+    if title:
+        conditions.append(materials_table.c.title.ilike(f"%{title}%"))
+
+    if description:
+        conditions.append(materials_table.c.description.ilike(f"%{description}%"))
+
+    if user is None:
+        conditions.append(materials_table.c.status == "published")
+    else:
+        conditions.append((materials_table.c.status == "published") | (materials_table.c.user_id == user.id))
+
+    return from_clause, conditions
+
+
+#########################################
+# Search result cache
+# A handful of title/author/description searches dominate the anonymous list
+# traffic. Anonymous callers all see the same published-only result, so the
+# page's ids and the total are cached per normalized filter set; a hit costs
+# one primary-key lookup instead of the filtered scan plus count. Any material
+# write clears the whole cache (see `_evict_material`): a write can move an
+# item in or out of any search, and the hot keys repopulate quickly.
+search_cache = TTLCache("searches", maxsize=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL)
+
+
+def _normalize_filter(value):
+    # the filters are case-insensitive substring matches, so case never changes the result
+    return value.lower() if value else None
+
+
+def _search_key(kind, title, author_name, description, page, page_size):
+    return (kind, _normalize_filter(title), _normalize_filter(author_name), _normalize_filter(description), page, page_size)
+
+
+def _list_materials(db: Session, kind: str, user=None, title: str = None, author_name: str = None, description: str = None, page: int = 1, page_size: int = 10, fields=None, versions_only: bool = False):
+    """Return (rows, total) for one page. Rows always carry `id` and `version` (for ETags).
+
+    With `versions_only` the rows hold nothing else: the cheap lookup used to
+    answer conditional requests.
+    """
+    listing_from, extra_columns = MATERIAL_LISTINGS[kind]
+
+    if versions_only:
+        columns = (materials_table.c.id, materials_table.c.version)
+    else:
+        columns = (*_project((*MATERIAL_COLUMNS, *extra_columns), fields, ("id",)), materials_table.c.version)
+
+    # anonymous searches see the same published-only result: reuse its ids
+    key = _search_key(kind, title, author_name, description, page, page_size) if user is None else None
+    if key is not None:
+        change_feed.poll(db)
+        cached = search_cache.get(key)
+        if cached is not None:
+            ids, total = cached
+            if not ids:
+                return [], total
+            stmt = select(*columns).select_from(listing_from).where(materials_table.c.id.in_(ids)).order_by(materials_table.c.id)
+            return db.execute(stmt).all(), total
+        generation = search_cache.generation()
+
+    from_clause, conditions = _material_filters(listing_from, user, title, author_name, description)
+    total = db.execute(select(func.count()).select_from(from_clause).where(*conditions)).scalar_one()
+    offset = (page - 1) * page_size
+    stmt = (
+        select(*columns)
+        .select_from(from_clause)
+        .where(*conditions)
+        .order_by(materials_table.c.id)
+        .limit(page_size)
+        .offset(offset)
+    )
+    rows = db.execute(stmt).all()
+    if key is not None:
+        search_cache.set(key, (tuple(row.id for row in rows), total), generation)
+    return rows, total
+
+
+class ExportPage(NamedTuple):
+    keys: list
+    rows: list
+    after: Optional[int]  # id to continue from; None on the last page
+
+
+def export_materials(db: Session, kind: str = "material", user=None, title: str = None, author_name: str = None, description: str = None, fields=None, after: int = 0, batch_size: int = 1000) -> ExportPage:
+    """Return one page of the full (unpaginated) listing for `kind`: up to `batch_size` rows with id > `after`.
+
+    Applies the same visibility rules and filters as `get_materials`. Callers
+    page through by id (keyset), so each page is one short indexed query and
+    memory stays bounded: the MySQL driver buffers a whole result client-side,
+    so a single streamed statement would load the full catalogue first.
+    """
+    from_clause, extra_columns = MATERIAL_LISTINGS[kind]
+    from_clause, conditions = _material_filters(from_clause, user, title, author_name, description)
+    stmt = (
+        select(*_project((*MATERIAL_COLUMNS, *extra_columns), fields), materials_table.c.id.label("export_after"))
+        .select_from(from_clause)
+        .where(*conditions, materials_table.c.id > after)
+        .order_by(materials_table.c.id)
+        .limit(batch_size)
+    )
+    result = db.execute(stmt)
+    keys = list(result.keys())[:-1]
+    rows = result.all()
+    return ExportPage(keys, [row[:-1] for row in rows], rows[-1][-1] if len(rows) == batch_size else None)
+
+
+def _list_authors(db: Session, kind: str, page: int = 1, page_size: int = 10, fields=None, versions_only: bool = False):
+    """Return (rows, total) for one page; like `_list_materials`, rows always carry `id` and `version`."""
+    from_clause, columns = AUTHOR_LISTINGS[kind]
+    if versions_only:
+        selected = (columns[0], authors_table.c.version)
+    else:
+        selected = (*_project(columns, fields, ("id",)), authors_table.c.version)
+    total = db.execute(select(func.count()).select_from(from_clause)).scalar_one()
+    offset = (page - 1) * page_size
+    stmt = select(*selected).select_from(from_clause).order_by(columns[0]).limit(page_size).offset(offset)
+    return db.execute(stmt).all(), total
+
+
 def get_users(db: Session):
     return db.query(User).all()
 
 
+def get_users_page(db: Session, page: int = 1, page_size: int = 10):
+    """Return (users, total) for one page ordered by id."""
+    q = db.query(User)
+    total = q.count()
+    offset = (page - 1) * page_size
+    return q.order_by(User.id).limit(page_size).offset(offset).all(), total
+
+
 def get_user(db: Session, user_id: int):
     return db.query(User).filter(User.id == user_id).first()
 
 
-def get_material(db: Session, material_id: int):
-    return db.query(Material).filter(Material.id == material_id).first()
+def get_material(db: Session, material_id: int, fields=None, viewer=_UNRESTRICTED):
+    """Return the material's base columns as a row (no subtype joins), or None.
+
+    With `viewer` (a user or None for anonymous) only a row that viewer may
+    see is returned.
+    """
+    from_clause, extra_columns = MATERIAL_LISTINGS["material"]
+    columns = (*_project((*MATERIAL_COLUMNS, *extra_columns), fields, DETAIL_COLUMNS), materials_table.c.version)
+    stmt = select(*columns).select_from(from_clause).where(materials_table.c.id == material_id)
+    if viewer is not _UNRESTRICTED:
+        stmt = stmt.where(_visible_to(viewer))
+    return db.execute(stmt).first()
+
+
+def get_material_state(db: Session, material_id: int, kind: str = "material"):
+    """Return (status, user_id, version) of a material of `kind`, or None.
+
+    Enough to check visibility and answer a conditional GET without loading the row.
+    """
+    from_clause, _ = MATERIAL_LISTINGS[kind]
+    stmt = (
+        select(materials_table.c.status, materials_table.c.user_id, materials_table.c.version)
+        .select_from(from_clause)
+        .where(materials_table.c.id == material_id)
+    )
+    return db.execute(stmt).first()
+
+
+# kind -> {lookup key -> unique indexed column} for batch reads
+MATERIAL_KEYS = {
+    "material": {"id": materials_table.c.id},
+    "book": {"id": materials_table.c.id, "isbn": books_table.c.isbn},
+    "article": {"id": materials_table.c.id, "doi": articles_table.c.doi},
+    "video": {"id": materials_table.c.id},
+}
+
+
+def get_materials_by_keys(db: Session, kind: str, key: str, values, fields=None):
+    """Return the materials of `kind` whose `key` column is in `values`, with one `IN` query.
+
+    Rows carry the detail columns and the key column whatever `fields` is, so
+    the caller can check visibility per item and report unmatched keys.
+    Visibility is not applied here.
+    """
+    if not values:
+        return []
+    from_clause, extra_columns = MATERIAL_LISTINGS[kind]
+    key_column = MATERIAL_KEYS[kind][key]
+    columns = (*_project((*MATERIAL_COLUMNS, *extra_columns), fields, (*DETAIL_COLUMNS, "id", key)), materials_table.c.version)
+    stmt = select(*columns).select_from(from_clause).where(key_column.in_(values))
+    return db.execute(stmt).all()
+
+
+def get_material_versions(db: Session, kind: str = "material", user=None, title: str = None, author_name: str = None, description: str = None, page: int = 1, page_size: int = 10):
+    """Return ([(id, version), ...], total) for the page the matching list call would return."""
+    return _list_materials(db, kind, user, title, author_name, description, page, page_size, versions_only=True)
+
+def create_user(db: Session, user: UserCreate, password_hash: str = None):
+    """Create a new user and store a hashed password.
 
-def create_user(db: Session, user: UserCreate):
-    """Create a new user and store a hashed password."""
+    Routes hash off the session (see deps.hash_password) and pass
+    `password_hash`; without it the password is hashed here.
+    """
     data = user.model_dump()
+    if password_hash is not None:
+        data["password"] = password_hash
     # Hash the plaintext password before storing
-    if "password" in data and data["password"]:
+    elif "password" in data and data["password"]:
         data["password"] = pwd_context.hash(data["password"])
     db_user = User(**data)
     try:
@@ -31,316 +349,280 @@ def create_user(db: Session, user: UserCreate):
         db.rollback()
         raise
 
-def get_materials(db: Session, user=None, title: str = None, author_name: str = None, description: str = None, page: int = 1, page_size: int = 10):
+def get_materials(db: Session, user=None, title: str = None, author_name: str = None, description: str = None, page: int = 1, page_size: int = 10, fields=None):
     """Return materials that are published or belong to the given user.
 
     Optional filters: title, author_name, description (case-insensitive substring).
+    `fields` restricts the selected columns (sparse fieldsets).
+    Items are plain result rows (see `_list_materials`).
     """
-    q = db.query(Material)
-
-    # filter by author name across person/institution authors
-    if author_name:
-        q = q.outerjoin(AuthorPerson, Material.author_id == AuthorPerson.id).outerjoin(
-            AuthorInstitution, Material.author_id == AuthorInstitution.id
-        ).filter(
-            or_(AuthorPerson.name.ilike(f"%{author_name}%"), AuthorInstitution.name.ilike(f"%{author_name}%"))
-        )
-
-    if title:
-        q = q.filter(Material.title.ilike(f"%{title}%"))
-
-    if description:
-        q = q.filter(Material.description.ilike(f"%{description}%"))
-
-    if user is None:
-        q = q.filter(Material.status == "published")
-    else:
-        q = q.filter((Material.status == "published") | (Material.user_id == user.id))
-
-    total = q.count()
-    offset = (page - 1) * page_size
-    items = q.order_by(Material.id).limit(page_size).offset(offset).all()
-    return items, total
-
-
-def get_books(db: Session, user=None, title: str = None, author_name: str = None, description: str = None, page: int = 1, page_size: int = 10):
-    q = db.query(Book)
-
-    if author_name:
-        q = q.outerjoin(AuthorPerson, Book.author_id == AuthorPerson.id).outerjoin(
-            AuthorInstitution, Book.author_id == AuthorInstitution.id
-        ).filter(
-            or_(AuthorPerson.name.ilike(f"%{author_name}%"), AuthorInstitution.name.ilike(f"%{author_name}%"))
-        )
+    return _list_materials(db, "material", user, title, author_name, description, page, page_size, fields)
 
-    if title:
-        q = q.filter(Book.title.ilike(f"%{title}%"))
-
-    if description:
-        q = q.filter(Book.description.ilike(f"%{description}%"))
 
-    if user is None:
-        q = q.filter(Book.status == "published")
-    else:
-        q = q.filter((Book.status == "published") | (Book.user_id == user.id))
-    total = q.count()
-    offset = (page - 1) * page_size
-    items = q.order_by(Book.id).limit(page_size).offset(offset).all()
-    return items, total
+def get_books(db: Session, user=None, title: str = None, author_name: str = None, description: str = None, page: int = 1, page_size: int = 10, fields=None):
+    return _list_materials(db, "book", user, title, author_name, description, page, page_size, fields)
 
 def create_book(db: Session, book: BookCreate, user_id: int):
     db_book = Book(**book.model_dump(), user_id=user_id)
     try:
         db.add(db_book)
+        db.flush()
+        _count_material(db, None, _facet_key(db_book))
+        _publish_material(db, db_book.id)
         db.commit()
         db.refresh(db_book)
+        _evict_material(db_book.id)
         return db_book
     except Exception:
         db.rollback()
         raise
 
-def get_articles(db: Session, user=None, title: str = None, author_name: str = None, description: str = None, page: int = 1, page_size: int = 10):
-    q = db.query(Article)
-
-    if author_name:
-        q = q.outerjoin(AuthorPerson, Article.author_id == AuthorPerson.id).outerjoin(
-            AuthorInstitution, Article.author_id == AuthorInstitution.id
-        ).filter(
-            or_(AuthorPerson.name.ilike(f"%{author_name}%"), AuthorInstitution.name.ilike(f"%{author_name}%"))
-        )
-
-    if title:
-        q = q.filter(Article.title.ilike(f"%{title}%"))
-
-    if description:
-        q = q.filter(Article.description.ilike(f"%{description}%"))
-
-    if user is None:
-        q = q.filter(Article.status == "published")
-    else:
-        q = q.filter((Article.status == "published") | (Article.user_id == user.id))
-    total = q.count()
-    offset = (page - 1) * page_size
-    items = q.order_by(Article.id).limit(page_size).offset(offset).all()
-    return items, total
+def get_articles(db: Session, user=None, title: str = None, author_name: str = None, description: str = None, page: int = 1, page_size: int = 10, fields=None):
+    return _list_materials(db, "article", user, title, author_name, description, page, page_size, fields)
 
 def create_article(db: Session, article: ArticleCreate, user_id: int):
     db_article = Article(**article.model_dump(), user_id=user_id)
     try:
         db.add(db_article)
+        db.flush()
+        _count_material(db, None, _facet_key(db_article))
+        _publish_material(db, db_article.id)
         db.commit()
         db.refresh(db_article)
+        _evict_material(db_article.id)
         return db_article
     except Exception:
         db.rollback()
         raise
 
-def get_videos(db: Session, user=None, title: str = None, author_name: str = None, description: str = None, page: int = 1, page_size: int = 10):
-    q = db.query(Video)
-
-    if author_name:
-        q = q.outerjoin(AuthorPerson, Video.author_id == AuthorPerson.id).outerjoin(
-            AuthorInstitution, Video.author_id == AuthorInstitution.id
-        ).filter(
-            or_(AuthorPerson.name.ilike(f"%{author_name}%"), AuthorInstitution.name.ilike(f"%{author_name}%"))
-        )
-
-    if title:
-        q = q.filter(Video.title.ilike(f"%{title}%"))
-
-    if description:
-        q = q.filter(Video.description.ilike(f"%{description}%"))
-
-    if user is None:
-        q = q.filter(Video.status == "published")
-    else:
-        q = q.filter((Video.status == "published") | (Video.user_id == user.id))
-
-    total = q.count()
-    offset = (page - 1) * page_size
-    items = q.order_by(Video.id).limit(page_size).offset(offset).all()
-    return items, total
+def get_videos(db: Session, user=None, title: str = None, author_name: str = None, description: str = None, page: int = 1, page_size: int = 10, fields=None):
+    return _list_materials(db, "video", user, title, author_name, description, page, page_size, fields)
 
 def create_video(db: Session, video: VideoCreate, user_id: int):
     db_video = Video(**video.model_dump(), user_id=user_id)
     try:
         db.add(db_video)
+        db.flush()
+        _count_material(db, None, _facet_key(db_video))
+        _publish_material(db, db_video.id)
         db.commit()
         db.refresh(db_video)
+        _evict_material(db_video.id)
         return db_video
     except Exception:
         db.rollback()
         raise
 
-def get_authors(db: Session, page: int = 1, page_size: int = 10):
-    q = db.query(Author)
-    total = q.count()
-    offset = (page - 1) * page_size
-    items = q.order_by(Author.id).limit(page_size).offset(offset).all()
-    return items, total
+def get_authors(db: Session, page: int = 1, page_size: int = 10, fields=None):
+    return _list_authors(db, "author", page, page_size, fields)
 
-def get_person_authors(db: Session, page: int = 1, page_size: int = 10):
-    q = db.query(AuthorPerson)
-    total = q.count()
-    offset = (page - 1) * page_size
-    items = q.order_by(AuthorPerson.id).limit(page_size).offset(offset).all()
-    return items, total
+def get_person_authors(db: Session, page: int = 1, page_size: int = 10, fields=None):
+    return _list_authors(db, "person", page, page_size, fields)
 
 def create_person_author(db: Session, author: AuthorPersonCreate):
     db_author = AuthorPerson(**author.model_dump())
     try:
         db.add(db_author)
+        db.flush()
+        change_feed.publish(db, f"author:{db_author.id}")
         db.commit()
         db.refresh(db_author)
+        author_cache.invalidate(db_author.id)
+        name_index.invalidate(db_author.id)
+        name_trigrams.invalidate(db_author.id)
         return db_author
     except Exception:
         db.rollback()
         raise
 
-def get_institution_authors(db: Session, page: int = 1, page_size: int = 10):
-    q = db.query(AuthorInstitution)
-    total = q.count()
-    offset = (page - 1) * page_size
-    items = q.order_by(AuthorInstitution.id).limit(page_size).offset(offset).all()
-    return items, total
+def get_institution_authors(db: Session, page: int = 1, page_size: int = 10, fields=None):
+    return _list_authors(db, "institution", page, page_size, fields)
 
 def create_institution_author(db: Session, author: AuthorInstitutionCreate):
     db_author = AuthorInstitution(**author.model_dump())
     try:
         db.add(db_author)
+        db.flush()
+        change_feed.publish(db, f"author:{db_author.id}")
         db.commit()
         db.refresh(db_author)
+        author_cache.invalidate(db_author.id)
+        name_index.invalidate(db_author.id)
+        name_trigrams.invalidate(db_author.id)
         return db_author
     except Exception:
         db.rollback()
         raise
 
 
-def get_book(db: Session, book_id: int):
-    return db.query(Book).filter(Book.id == book_id).first()
+def get_book(db: Session, book_id: int, fields=None, viewer=_UNRESTRICTED, owner_id: int = None):
+    """Return the book, or None; restricted to rows `viewer` may see and/or `owner_id` owns when given."""
+    query = db.query(Book).options(*_load_only(Book, fields)).filter(Book.id == book_id)
+    if viewer is not _UNRESTRICTED:
+        query = query.filter(_visible_to(viewer))
+    if owner_id is not None:
+        query = query.filter(Book.user_id == owner_id)
+    return query.first()
 
 
-def get_article(db: Session, article_id: int):
-    return db.query(Article).filter(Article.id == article_id).first()
-
-
-def update_book(db: Session, book_id: int, data: dict):
-    db_book = get_book(db, book_id)
-    if db_book is None:
-        return None
+def update_book(db: Session, db_book: Book, data: dict):
+    """Apply `data` to `db_book`, loaded on `db` (see deps.require_owner), and commit."""
+    book_id = db_book.id
+    before = _facet_key(db_book)
     for key, value in data.items():
         if hasattr(db_book, key):
             setattr(db_book, key, value)
     try:
         db.add(db_book)
+        _count_material(db, before, _facet_key(db_book))
+        _publish_material(db, book_id)
         db.commit()
         db.refresh(db_book)
+        _evict_material(db_book.id)
         return db_book
     except Exception:
         db.rollback()
         raise
 
 
-def delete_book(db: Session, book_id: int):
-    db_book = get_book(db, book_id)
-    if db_book is None:
-        return None
+def delete_book(db: Session, db_book: Book):
+    """Delete `db_book`, loaded on `db` (see deps.require_owner), and commit."""
+    book_id = db_book.id
     try:
         db.delete(db_book)
+        _count_material(db, _facet_key(db_book), None)
+        _publish_material(db, book_id)
         db.commit()
+        _evict_material(book_id)
         return db_book
     except Exception:
         db.rollback()
         raise
 
 
-def get_article(db: Session, article_id: int):
-    return db.query(Article).filter(Article.id == article_id).first()
+def get_article(db: Session, article_id: int, fields=None, viewer=_UNRESTRICTED, owner_id: int = None):
+    """Return the article, or None; restricted to rows `viewer` may see and/or `owner_id` owns when given."""
+    query = db.query(Article).options(*_load_only(Article, fields)).filter(Article.id == article_id)
+    if viewer is not _UNRESTRICTED:
+        query = query.filter(_visible_to(viewer))
+    if owner_id is not None:
+        query = query.filter(Article.user_id == owner_id)
+    return query.first()
 
 
-def update_article(db: Session, article_id: int, data: dict):
-    db_article = get_article(db, article_id)
-    if db_article is None:
-        return None
+def update_article(db: Session, db_article: Article, data: dict):
+    """Apply `data` to `db_article`, loaded on `db` (see deps.require_owner), and commit."""
+    article_id = db_article.id
+    before = _facet_key(db_article)
     for key, value in data.items():
         if hasattr(db_article, key):
             setattr(db_article, key, value)
     try:
         db.add(db_article)
+        _count_material(db, before, _facet_key(db_article))
+        _publish_material(db, article_id)
         db.commit()
         db.refresh(db_article)
+        _evict_material(db_article.id)
         return db_article
     except Exception:
         db.rollback()
         raise
 
 
-def delete_article(db: Session, article_id: int):
-    db_article = get_article(db, article_id)
-    if db_article is None:
-        return None
+def delete_article(db: Session, db_article: Article):
+    """Delete `db_article`, loaded on `db` (see deps.require_owner), and commit."""
+    article_id = db_article.id
     try:
         db.delete(db_article)
+        _count_material(db, _facet_key(db_article), None)
+        _publish_material(db, article_id)
         db.commit()
+        _evict_material(article_id)
         return db_article
     except Exception:
         db.rollback()
         raise
 
 
-def get_video(db: Session, video_id: int):
-    return db.query(Video).filter(Video.id == video_id).first()
+def get_video(db: Session, video_id: int, fields=None, viewer=_UNRESTRICTED, owner_id: int = None):
+    """Return the video, or None; restricted to rows `viewer` may see and/or `owner_id` owns when given."""
+    query = db.query(Video).options(*_load_only(Video, fields)).filter(Video.id == video_id)
+    if viewer is not _UNRESTRICTED:
+        query = query.filter(_visible_to(viewer))
+    if owner_id is not None:
+        query = query.filter(Video.user_id == owner_id)
+    return query.first()
 
 
-def get_author(db: Session, author_id: int):
-    return db.query(Author).filter(Author.id == author_id).first()
+def get_author(db: Session, author_id: int, fields=None):
+    """Return the author's id/type/name as a row (name resolved from the subtype table), or None."""
+    from_clause, columns = AUTHOR_LISTINGS["author"]
+    stmt = (
+        select(*_project(columns, fields), authors_table.c.version)
+        .select_from(from_clause)
+        .where(authors_table.c.id == author_id)
+    )
+    return db.execute(stmt).first()
 
 
-def get_person_author(db: Session, person_id: int):
-    return db.query(AuthorPerson).filter(AuthorPerson.id == person_id).first()
+def get_author_versions(db: Session, kind: str = "author", page: int = 1, page_size: int = 10):
+    """Return ([(id, version), ...], total) for the page the matching author list call would return."""
+    return _list_authors(db, kind, page, page_size, versions_only=True)
 
 
-def get_institution_author(db: Session, inst_id: int):
-    return db.query(AuthorInstitution).filter(AuthorInstitution.id == inst_id).first()
+def get_person_author(db: Session, person_id: int, fields=None):
+    return db.query(AuthorPerson).options(*_load_only(AuthorPerson, fields)).filter(AuthorPerson.id == person_id).first()
 
 
-def update_video(db: Session, video_id: int, data: dict):
-    db_video = get_video(db, video_id)
-    if db_video is None:
-        return None
+def get_institution_author(db: Session, inst_id: int, fields=None):
+    return db.query(AuthorInstitution).options(*_load_only(AuthorInstitution, fields)).filter(AuthorInstitution.id == inst_id).first()
+
+
+def update_video(db: Session, db_video: Video, data: dict):
+    """Apply `data` to `db_video`, loaded on `db` (see deps.require_owner), and commit."""
+    video_id = db_video.id
+    before = _facet_key(db_video)
     for key, value in data.items():
         if hasattr(db_video, key):
             setattr(db_video, key, value)
     try:
         db.add(db_video)
+        _count_material(db, before, _facet_key(db_video))
+        _publish_material(db, video_id)
         db.commit()
         db.refresh(db_video)
+        _evict_material(db_video.id)
         return db_video
     except Exception:
         db.rollback()
         raise
 
 
-def delete_video(db: Session, video_id: int):
-    db_video = get_video(db, video_id)
-    if db_video is None:
-        return None
+def delete_video(db: Session, db_video: Video):
+    """Delete `db_video`, loaded on `db` (see deps.require_owner), and commit."""
+    video_id = db_video.id
     try:
         db.delete(db_video)
+        _count_material(db, _facet_key(db_video), None)
+        _publish_material(db, video_id)
         db.commit()
+        _evict_material(video_id)
         return db_video
     except Exception:
         db.rollback()
         raise
 
 
-def update_user(db: Session, user_id: int, data: dict):
-    """Update an existing user. If `password` is present it will be hashed."""
+def update_user(db: Session, user_id: int, data: dict, password_hash: str = None):
+    """Update an existing user. If `password` is present it will be hashed, unless `password_hash` is given."""
     db_user = get_user(db, user_id)
     if db_user is None:
         return None
+    if password_hash is not None:
+        data["password"] = password_hash
     # handle password hashing if supplied
-    if "password" in data and data.get("password"):
+    elif "password" in data and data.get("password"):
         data["password"] = pwd_context.hash(data["password"])
     for key, value in data.items():
         if hasattr(db_user, key) and key != "id":
@@ -366,3 +648,425 @@ def delete_user(db: Session, user_id: int):
     except Exception:
         db.rollback()
         raise
+
+
+#########################################
+# Facet counts
+# The catalogue shows counts by type, status and author next to results.
+# Filtered facets come from one GROUP BY over the listing's conditions.
+# Unfiltered ones are read from two summary tables, `material_type_counts`
+# (type, status) and `material_author_counts` (author, status), which every
+# material write above adjusts in its own transaction. The type and status
+# facets read a handful of rows, and the top authors come off an index on
+# (status, total), so neither grows with the catalogue. Signed-in users also
+# see their own unpublished materials, which are counted live on top.
+type_counts_table = MaterialTypeCount.__table__
+author_counts_table = MaterialAuthorCount.__table__
+FACET_COLUMNS = (materials_table.c.type, materials_table.c.status, materials_table.c.author_id)
+# dialect -> INSERT construct with an ON CONFLICT clause; others use `_add_count`'s fallback
+_UPSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+def _facet_key(material):
+    return (material.type, material.status, material.author_id)
+
+
+def _add_count(db: Session, table, key: dict, delta: int):
+    """Add `delta` to the `total` of `table`'s row for `key`, creating the row if needed."""
+    dialect = db.get_bind().dialect.name
+    increment = {"total": table.c.total + delta}
+    if dialect == "mysql":
+        db.execute(mysql.insert(table).values(**key, total=delta).on_duplicate_key_update(**increment))
+    elif dialect in _UPSERTS:
+        db.execute(_UPSERTS[dialect](table).values(**key, total=delta).on_conflict_do_update(index_elements=list(key), set_=increment))
+    else:
+        update = table.update().where(*(table.c[name] == value for name, value in key.items())).values(**increment)
+        if db.execute(update).rowcount:
+            return
+        try:
+            # a concurrent writer may create the row first: then add to theirs
+            with db.begin_nested():
+                db.execute(table.insert().values(**key, total=delta))
+        except IntegrityError:
+            db.execute(update)
+
+
+def _count_material(db: Session, before, after):
+    """Move one material between count buckets; `before`/`after` are None on create/delete."""
+    if before == after:
+        return
+    for key, delta in ((before, -1), (after, 1)):
+        if key is not None:
+            type_, status, author_id = key
+            _add_count(db, type_counts_table, {"type": type_, "status": status}, delta)
+            _add_count(db, author_counts_table, {"author_id": author_id, "status": status}, delta)
+
+
+def rebuild_material_counts(db: Session):
+    """Recompute the count tables from the materials table (after bulk loads or on first deploy)."""
+    for table, columns in ((type_counts_table, ("type", "status")), (author_counts_table, ("author_id", "status"))):
+        db.execute(table.delete())
+        grouped = select(*(materials_table.c[name] for name in columns), func.count()).group_by(*(materials_table.c[name] for name in columns))
+        db.execute(table.insert().from_select([*columns, "total"], grouped))
+    db.commit()
+
+
+def _author_names(db: Session, author_ids) -> dict:
+    if not author_ids:
+        return {}
+    from_clause, (id_column, _, name_column) = AUTHOR_LISTINGS["author"]
+    return dict(db.execute(select(id_column, name_column).select_from(from_clause).where(id_column.in_(author_ids))).all())
+
+
+def _top_authors(by_author: dict, authors: int):
+    return sorted(by_author.items(), key=lambda item: (-item[1], item[0]))[:authors]
+
+
+def _sum_facets(rows):
+    """(types, statuses, by_author) totals of (type, status, author_id, count) rows."""
+    types, statuses, by_author = {}, {}, {}
+    for type_, status, author_id, count in rows:
+        types[type_] = types.get(type_, 0) + count
+        statuses[status] = statuses.get(status, 0) + count
+        by_author[author_id] = by_author.get(author_id, 0) + count
+    return types, statuses, by_author
+
+
+def get_material_facets(db: Session, user=None, title: str = None, author_name: str = None, description: str = None, authors: int = 10):
+    """Counts per type, status and author over the materials `get_materials` would list.
+
+    Returns a dict shaped like `MaterialFacets`; the author facet keeps the
+    `authors` authors with the most materials.
+    """
+    if title or author_name or description:
+        from_clause, conditions = _material_filters(materials_table, user, title, author_name, description)
+        stmt = select(*FACET_COLUMNS, func.count()).select_from(from_clause).where(*conditions).group_by(*FACET_COLUMNS)
+        types, statuses, by_author = _sum_facets(db.execute(stmt).all())
+    else:
+        own = []
+        if user is not None:
+            stmt = (
+                select(*FACET_COLUMNS, func.count())
+                .where(materials_table.c.user_id == user.id, materials_table.c.status != "published")
+                .group_by(*FACET_COLUMNS)
+            )
+            own = db.execute(stmt).all()
+        types, statuses, by_author = _sum_facets(own)
+        stmt = select(type_counts_table.c.type, type_counts_table.c.total).where(
+            type_counts_table.c.status == "published", type_counts_table.c.total > 0
+        )
+        for type_, count in db.execute(stmt):
+            types[type_] = types.get(type_, 0) + count
+            statuses["published"] = statuses.get("published", 0) + count
+        if authors:
+            published = author_counts_table.c.status == "published"
+            stmt = (
+                select(author_counts_table.c.author_id, author_counts_table.c.total)
+                .where(published, author_counts_table.c.total > 0)
+                .order_by(author_counts_table.c.total.desc(), author_counts_table.c.author_id)
+                .limit(authors)
+            )
+            top_published = db.execute(stmt).all()
+            if by_author:
+                # an author outside the published top may get in with the caller's own materials
+                stmt = select(author_counts_table.c.author_id, author_counts_table.c.total).where(
+                    published, author_counts_table.c.author_id.in_(list(by_author))
+                )
+                top_published += db.execute(stmt).all()
+            for author_id, count in set(top_published):
+                by_author[author_id] = by_author.get(author_id, 0) + count
+    top = _top_authors(by_author, authors)
+    names = _author_names(db, [author_id for author_id, _ in top])
+    return {
+        "total": sum(types.values()),
+        "type": types,
+        "status": statuses,
+        "author": [{"id": author_id, "name": names.get(author_id, ""), "count": count} for author_id, count in top],
+    }
+
+
+#########################################
+# Published material cache
+# Published materials are read far more often than they change, so detail
+# reads keep their dumped read-schema payload (and version, for the ETag) in a
+# per-worker cache. Drafts and filed materials are never cached: their
+# visibility depends on the caller, so they always go to the database. Every
+# create/update/delete above logs "material:<id>" to the change feed in its
+# transaction and evicts the id under all kinds after committing; other
+# workers evict it when they next poll the feed.
+material_cache = TTLCache("materials", maxsize=MATERIAL_CACHE_SIZE, ttl=MATERIAL_CACHE_TTL)
+
+
+class CachedMaterial(NamedTuple):
+    version: int
+    payload: dict
+
+
+# kind -> (full detail loader, read adapter)
+_CACHED_READS = {
+    "material": (get_material, MaterialAdapter),
+    "book": (get_book, BookAdapter),
+    "article": (get_article, ArticleAdapter),
+    "video": (get_video, VideoAdapter),
+}
+
+
+def _evict_material(material_id: int):
+    material_cache.invalidate(*((kind, material_id) for kind in _CACHED_READS))
+    search_cache.clear()
+    title_index.invalidate(material_id)
+    title_trigrams.invalidate(material_id)
+    similar_index.invalidate(material_id)
+
+
+def _publish_material(db: Session, material_id: int):
+    change_feed.publish(db, f"material:{material_id}")
+
+
+def _on_material_change(key):
+    if key is None:
+        material_cache.clear()
+        search_cache.clear()
+        title_index.clear()
+        title_trigrams.clear()
+        # changes may have been missed: rebuild, serving the current matrix meanwhile
+        if similar_index.loaded:
+            start_similar_index_build()
+    else:
+        _evict_material(int(key.partition(":")[2]))
+
+
+change_feed.subscribe("material:", _on_material_change)
+
+
+def get_published_material(db: Session, material_id: int, kind: str = "material"):
+    """Return a CachedMaterial for a published material of `kind`, or None.
+
+    None means missing or not published; callers then fall back to the
+    uncached read and its visibility checks.
+    """
+    change_feed.poll(db)
+    key = (kind, material_id)
+    entry = material_cache.get(key)
+    if entry is not None:
+        return entry
+    generation = material_cache.generation()
+    loader, adapter = _CACHED_READS[kind]
+    # anonymous visibility: drafts are never loaded here
+    obj = loader(db, material_id, viewer=None)
+    if obj is None:
+        return None
+    entry = CachedMaterial(obj.version, adapter.dump_python(adapter.validate_python(obj, from_attributes=True)))
+    material_cache.set(key, entry, generation)
+    return entry
+
+
+#########################################
+# Author cache
+# Authors are created once and practically never change, but every author
+# detail read and every material write needs one. Entries (id -> type, name,
+# subtype fields, version) are loaded lazily on first use and serve all three
+# author detail routes and the author_id pre-check on material writes. Only
+# existing authors are cached, so a freshly created author is never rejected
+# by a stale "missing" answer. Author creation evicts its id here and, through
+# the change feed, on the other workers.
+author_cache = TTLCache("authors", maxsize=AUTHOR_CACHE_SIZE, ttl=AUTHOR_CACHE_TTL)
+
+
+class CachedAuthor(NamedTuple):
+    id: int
+    type: str
+    name: str
+    version: int
+    birth_date: Optional[date]
+    city: Optional[str]
+
+
+def get_cached_author(db: Session, author_id: int):
+    """Return the CachedAuthor for `author_id`, or None when there is no such author."""
+    change_feed.poll(db)
+    entry = author_cache.get(author_id)
+    if entry is not None:
+        return entry
+    generation = author_cache.generation()
+    from_clause, (id_column, type_column, name_column) = AUTHOR_LISTINGS["author"]
+    stmt = (
+        select(
+            id_column,
+            type_column,
+            name_column,
+            authors_table.c.version,
+            person_authors_table.c.birth_date,
+            institution_authors_table.c.city,
+        )
+        .select_from(from_clause)
+        .where(authors_table.c.id == author_id)
+    )
+    row = db.execute(stmt).first()
+    if row is None:
+        return None
+    entry = CachedAuthor(*row)
+    author_cache.set(author_id, entry, generation)
+    return entry
+
+
+def _on_author_change(key):
+    if key is None:
+        author_cache.clear()
+        name_index.clear()
+        name_trigrams.clear()
+    else:
+        author_id = int(key.partition(":")[2])
+        author_cache.invalidate(author_id)
+        name_index.invalidate(author_id)
+        name_trigrams.invalidate(author_id)
+
+
+change_feed.subscribe("author:", _on_author_change)
+
+
+#########################################
+# Autocomplete
+# The search box completes published titles and author names from two
+# per-worker prefix indexes instead of an `ilike` scan per keystroke. Only
+# published materials are indexed, so completions are the same for every
+# caller and never reveal a draft. Writes invalidate their id here (and, via
+# the change feed, on the other workers); the next completion reloads just the
+# invalidated ids, so a warm index answers without touching the database.
+title_index = PrefixIndex("titles")
+name_index = PrefixIndex("author_names")
+
+
+def _title_rows(db: Session, ids=None):
+    stmt = select(materials_table.c.id, materials_table.c.title, materials_table.c.type).where(materials_table.c.status == "published")
+    if ids is not None:
+        stmt = stmt.where(materials_table.c.id.in_(ids))
+    return [(row.id, row.title, {"id": row.id, "text": row.title, "type": row.type}) for row in db.execute(stmt)]
+
+
+def _name_rows(db: Session, ids=None):
+    from_clause, (id_column, type_column, name_column) = AUTHOR_LISTINGS["author"]
+    stmt = select(id_column, type_column, name_column).select_from(from_clause)
+    if ids is not None:
+        stmt = stmt.where(id_column.in_(ids))
+    return [(row.id, row.name, {"id": row.id, "text": row.name, "type": row.type}) for row in db.execute(stmt)]
+
+
+def _sync_index(db: Session, index, rows):
+    # ids invalidated while the rows are read stay pending for the next call
+    pending = index.take_pending()
+    if not index.loaded:
+        index.load(rows(db))
+    elif pending:
+        index.refresh(pending, rows(db, pending))
+
+
+def autocomplete(db: Session, prefix: str, limit: int = 10) -> dict:
+    """Return {"titles": [...], "authors": [...]}, up to `limit` completions each for `prefix`.
+
+    Prefixes match the start of any word onwards ("gat" completes "The Great
+    Gatsby"), ignoring case, accents and punctuation.
+    """
+    change_feed.poll(db)
+    _sync_index(db, title_index, _title_rows)
+    _sync_index(db, name_index, _name_rows)
+    return {"titles": title_index.complete(prefix, limit), "authors": name_index.complete(prefix, limit)}
+
+
+#########################################
+# Fuzzy search
+# Misspelled titles and author names find nothing with `ilike`. Trigram
+# indexes over the same published titles and author names score texts by
+# shared trigrams instead; they are kept current exactly like the prefix
+# indexes above.
+title_trigrams = TrigramIndex("titles")
+name_trigrams = TrigramIndex("author_names")
+
+
+def fuzzy_search(db: Session, query: str, limit: int = 10) -> dict:
+    """Return {"titles": [...], "authors": [...]}, up to `limit` best matches each with their score."""
+    change_feed.poll(db)
+    _sync_index(db, title_trigrams, _title_rows)
+    _sync_index(db, name_trigrams, _name_rows)
+    return {
+        group: [{**value, "score": round(score, 4)} for value, score in index.search(query, limit)]
+        for group, index in (("titles", title_trigrams), ("authors", name_trigrams))
+    }
+
+
+#########################################
+# Similar materials
+# "More like this" for a material comes from a TF-IDF matrix over the
+# published materials' titles and descriptions (see app.core.similarity),
+# kept current by id like the search indexes. Every full build runs in a
+# background thread on its own session (at startup, on the first lookup, after
+# enough changes, and when a change feed resync may have missed some) and is
+# swapped in when done; lookups keep using the current matrix meanwhile, and
+# are refused until there is one. Nothing builds on the request path.
+logger = logging.getLogger(__name__)
+similar_index = SimilarityIndex("materials")
+
+
+def similarity_text(title: str, description: Optional[str]) -> str:
+    # the title counts twice: it says more about a material than its description
+    return f"{title} {title} {description or ''}"
+
+
+def _document_rows(db: Session, ids=None):
+    stmt = select(materials_table.c.id, materials_table.c.title, materials_table.c.description, materials_table.c.type).where(
+        materials_table.c.status == "published"
+    )
+    if ids is not None:
+        stmt = stmt.where(materials_table.c.id.in_(ids))
+    return [
+        (row.id, similarity_text(row.title, row.description), {"id": row.id, "text": row.title, "type": row.type})
+        for row in db.execute(stmt)
+    ]
+
+
+def start_similar_index_build(force: bool = True) -> bool:
+    """Build the similarity index in a background thread, unless a build is running (or, without `force`, due)."""
+    if not similar_index.start_rebuild(force):
+        return False
+    threading.Thread(target=_build_similar_index, args=(similar_index.generation,), name="similarity-build", daemon=True).start()
+    return True
+
+
+def _build_similar_index(generation: int):
+    db = database.SessionLocal()
+    try:
+        similar_index.rebuild(_document_rows(db), generation)
+    except Exception:
+        logger.warning("Building the similarity index failed", exc_info=True)
+    finally:
+        db.close()
+
+
+def similar_index_ready() -> bool:
+    """Whether a similarity matrix is loaded; if not, make sure one is being built."""
+    if similar_index.loaded:
+        return True
+    start_similar_index_build()
+    return False
+
+
+def similar_materials(db: Session, material_id: int, limit: int = 10):
+    """Up to `limit` published materials most similar to `material_id`, best first, with their cosine score.
+
+    None when `material_id` is not a published material (the caller may then
+    use `similar_to_text`). Callers check `similar_index_ready` first.
+    """
+    change_feed.poll(db)
+    pending = similar_index.take_pending()
+    if pending:
+        similar_index.refresh(pending, _document_rows(db, pending))
+    start_similar_index_build(force=False)
+    matches = similar_index.similar(material_id, limit)
+    if matches is None:
+        return None
+    return [{**value, "score": round(score, 4)} for value, score in matches]
+
+
+def similar_to_text(db: Session, text: str, limit: int = 10, exclude: int = None) -> list:
+    """Like `similar_materials`, for a material that is not indexed (a draft shown to its owner)."""
+    return [{**value, "score": round(score, 4)} for value, score in similar_index.similar_to_text(text, limit, exclude)]
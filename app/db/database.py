@@ -1,11 +1,148 @@
+from contextlib import asynccontextmanager
+from typing import Union
+
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from app.core.config import DATABASE_URL
+from app.core.bulkheads import Bulkhead, get_bulkhead
+from app.core.config import ASYNC_DATABASE_URL, DATABASE_URL, DB_ASYNC, DB_MAX_OVERFLOW, DB_POOL_SIZE
+
+
+def _pool_options(url: str) -> dict:
+    # SQLite (tests, benchmarks) uses its own pool classes without these knobs
+    if url.startswith("sqlite"):
+        return {}
+    return {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW}
+
 
 # Use pool_pre_ping to help with MySQL connections that may be closed by the server
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+engine = create_engine(DATABASE_URL, pool_pre_ping=True, **_pool_options(DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
-__all__ = ["engine", "SessionLocal", "Base"]
+
+#########################################
+# Database handles for async route handlers
+# Handlers receive a handle from `get_database` and call `await db.run(fn,
+# *args)`, where `fn(session, *args)` is one of the plain (sync) crud
+# functions. With DB_ASYNC off the call runs on a blocking Session in the
+# threadpool, as before. With DB_ASYNC on it runs on an AsyncSession through
+# `run_sync`: the same crud code, but the driver awaits I/O on the event loop
+# instead of holding a thread, so a worker can keep many more requests
+# waiting on the database than it has threads.
+# Either way the call counts against the request's bulkhead (`read` for GET
+# and HEAD, `write` otherwise), so a burst of writes cannot take every thread
+# or connection away from reads.
+def make_async_engine(url: str = ASYNC_DATABASE_URL, **kwargs):
+    """Return (async_engine, AsyncSessionLocal) for `url` (needs an async driver such as aiomysql/aiosqlite)."""
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    options = {} if "poolclass" in kwargs else _pool_options(url)
+    async_engine = create_async_engine(url, pool_pre_ping=True, **options, **kwargs)
+    # objects are serialized after the session call returns, so they must not expire on commit
+    return async_engine, async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+async_engine, AsyncSessionLocal = make_async_engine() if DB_ASYNC else (None, None)
+
+
+class SyncDatabase:
+    def __init__(self, session, bulkhead: Bulkhead):
+        self.session = session
+        self.bulkhead = bulkhead
+
+    async def run(self, fn, *args, **kwargs):
+        return await self.bulkhead.run(fn, self.session, *args, **kwargs)
+
+
+class AsyncDatabase:
+    def __init__(self, session, bulkhead: Bulkhead):
+        self.session = session
+        self.bulkhead = bulkhead
+
+    async def run(self, fn, *args, **kwargs):
+        async with self.bulkhead.slot():
+            return await self.session.run_sync(fn, *args, **kwargs)
+
+
+Database = Union[SyncDatabase, AsyncDatabase]
+
+
+# Scope key under which POST /batch hands its shared handle to the sub-requests
+SHARED_DATABASE = "app.shared_database"
+
+
+async def get_database(request: Request):
+    """Dependency yielding a SyncDatabase or, when an async engine is configured, an AsyncDatabase."""
+    shared = request.scope.get(SHARED_DATABASE)
+    if shared is not None:
+        # owned (and closed) by the batch that set it
+        yield shared
+        return
+    bulkhead = get_bulkhead("read" if request.method in ("GET", "HEAD") else "write")
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as session:
+            yield AsyncDatabase(session, bulkhead)
+        return
+    session = SessionLocal()
+    try:
+        yield SyncDatabase(session, bulkhead)
+    finally:
+        await run_in_threadpool(session.close)
+
+
+@asynccontextmanager
+async def shared_database(bulkhead: Bulkhead, atomic: bool = False):
+    """Yield one Database for a series of operations (POST /batch).
+
+    With `atomic` the session joins an outer transaction in "rollback_only"
+    mode: the commits inside crud functions only flush, and the outer
+    transaction is committed when the block exits normally, rolled back when
+    it raises (or when a crud function rolled back on an error).
+    """
+    if not atomic:
+        if AsyncSessionLocal is not None:
+            async with AsyncSessionLocal() as session:
+                yield AsyncDatabase(session, bulkhead)
+            return
+        session = SessionLocal()
+        try:
+            yield SyncDatabase(session, bulkhead)
+        finally:
+            await run_in_threadpool(session.close)
+        return
+
+    if AsyncSessionLocal is not None:
+        async with async_engine.connect() as conn:
+            transaction = await conn.begin()
+            async with AsyncSessionLocal(bind=conn, join_transaction_mode="rollback_only") as session:
+                try:
+                    yield AsyncDatabase(session, bulkhead)
+                except BaseException:
+                    if transaction.is_active:
+                        await transaction.rollback()
+                    raise
+            if transaction.is_active:
+                await transaction.commit()
+        return
+
+    conn = await run_in_threadpool(engine.connect)
+    transaction = conn.begin()
+    session = SessionLocal(bind=conn, join_transaction_mode="rollback_only")
+    try:
+        yield SyncDatabase(session, bulkhead)
+    except BaseException:
+        if transaction.is_active:
+            await run_in_threadpool(transaction.rollback)
+        raise
+    else:
+        if transaction.is_active:
+            await run_in_threadpool(transaction.commit)
+    finally:
+        await run_in_threadpool(session.close)
+        await run_in_threadpool(conn.close)
+
+
+__all__ = ["engine", "SessionLocal", "Base", "async_engine", "AsyncSessionLocal", "Database", "get_database", "shared_database"]
@@ -5,7 +5,7 @@ from datetime import date
 from sqlalchemy import text
 from sqlalchemy.exc import OperationalError, ProgrammingError
 from app.db.database import engine, SessionLocal
-from app.db import models
+from app.db import migrate, models
 from app import schemas
 import app.db.crud as crud
 from app.schemas import (
@@ -151,9 +151,10 @@ def main():
     if not wait_for_mysql(MYSQL_HOST, MYSQL_PORT, RETRY_SECONDS, MAX_RETRIES):
         sys.exit(1)
 
-    # Create tables
+    # Create tables, and bring tables created by older releases up to date
     print("Creating database tables (if not exists)...")
-    models.Base.metadata.create_all(bind=engine)
+    for step in migrate.upgrade(engine):
+        print(step)
     print("Database initialization complete.")
 
     # Seed example data (idempotent)
@@ -183,6 +184,11 @@ def main():
 
     print("Seeding complete.")
 
+    # Seeded (or pre-existing) materials did not go through the crud writes
+    with SessionLocal() as db:
+        crud.rebuild_material_counts(db)
+    print("Material counts rebuilt.")
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
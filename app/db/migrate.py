@@ -0,0 +1,60 @@
+"""Bring an existing database up to the current schema.
+
+`create_all` creates missing tables but never alters existing ones, so a
+database created by an older release lacks the columns added since (the row
+`version` of materials and authors, which backs ETags and optimistic
+locking) and fails on the first query. `upgrade` creates the missing tables
+(`material_type_counts`, `material_author_counts`, `cache_changes`) and adds
+the missing columns. Count tables created next to existing materials are
+filled from them, so the facets are right from the first request. Every step
+checks the live schema first, so running it again changes nothing.
+
+Run `python -m app.db.migrate` once after upgrading, before starting the new
+workers; `python -m app.db.initialize_db` runs it too.
+"""
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import Session
+
+import app.db.database as database
+from app.db.models import Base
+
+# table -> columns added after the table first shipped, as (name, column DDL)
+ADDED_COLUMNS = {
+    "materials": [("version", "INTEGER NOT NULL DEFAULT 1")],
+    "authors": [("version", "INTEGER NOT NULL DEFAULT 1")],
+}
+# summary tables the material writes keep current (see crud.rebuild_material_counts)
+COUNT_TABLES = ("material_type_counts", "material_author_counts")
+
+
+def upgrade(engine=None) -> list:
+    """Create missing tables and add missing columns; return a description of each step taken."""
+    engine = engine or database.engine
+    existing = set(inspect(engine).get_table_names())
+    Base.metadata.create_all(bind=engine)
+    steps = [f"created table {name}" for name in Base.metadata.tables if name not in existing]
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table, columns in ADDED_COLUMNS.items():
+            present = {column["name"] for column in inspector.get_columns(table)}
+            for name, ddl in columns:
+                if name not in present:
+                    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+                    steps.append(f"added column {table}.{name}")
+    if "materials" in existing and any(name not in existing for name in COUNT_TABLES):
+        import app.db.crud as crud
+
+        with Session(bind=engine) as db:
+            crud.rebuild_material_counts(db)
+        steps.append("rebuilt material counts")
+    return steps
+
+
+def main():
+    for step in upgrade():
+        print(step)
+    print("Schema is up to date.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 from app.db.database import Base
-from sqlalchemy import Column, Integer, String, ForeignKey, Date, Boolean
+from sqlalchemy import Column, Integer, String, ForeignKey, Date, Boolean, Index, text
 from sqlalchemy.orm import relationship
 
 class User(Base):
@@ -20,6 +20,8 @@ class Material(Base):
     author_id = Column(Integer, ForeignKey("authors.id"), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     type = Column(String(50), nullable=False) # discriminator column for polymorphic identity
+    # row version, bumped by the ORM on every update (also of subtype columns); backs the ETags
+    version = Column(Integer, nullable=False, server_default=text("1"))
     user = relationship("User", back_populates="materials")
     author = relationship("Author", back_populates="materials")
 
@@ -27,6 +29,7 @@ class Material(Base):
         "polymorphic_on": type,
         "polymorphic_identity": "material",
         "with_polymorphic": "*",
+        "version_id_col": version,
     }
 
 class Book(Material):
@@ -62,12 +65,15 @@ class Author(Base):
     id = Column(Integer, primary_key=True, index=True)
     # discriminator for joined inheritance
     type = Column(String(50), nullable=False)
+    # row version, bumped by the ORM on every update; backs the ETags
+    version = Column(Integer, nullable=False, server_default=text("1"))
     materials = relationship("Material", back_populates="author")
 
     __mapper_args__ = {
         "polymorphic_on": type,
         "polymorphic_identity": "author",
         "with_polymorphic": "*",
+        "version_id_col": version,
     }
 
 class AuthorPerson(Author):
@@ -89,3 +95,26 @@ class AuthorInstitution(Author):
     __mapper_args__ = {
         "polymorphic_identity": "institution",
     }
+
+class MaterialTypeCount(Base):
+    """Materials per (type, status), kept current by the crud writes; backs the unfiltered facets."""
+    __tablename__ = "material_type_counts"
+    type = Column(String(50), primary_key=True)
+    status = Column(String(9), primary_key=True)
+    total = Column(Integer, nullable=False, default=0)
+
+class MaterialAuthorCount(Base):
+    """Materials per (author, status), kept current by the crud writes; backs the unfiltered author facet."""
+    __tablename__ = "material_author_counts"
+    author_id = Column(Integer, primary_key=True)
+    status = Column(String(9), primary_key=True)
+    total = Column(Integer, nullable=False, default=0)
+
+    # the top authors of a status are read off the index, without scanning every author
+    __table_args__ = (Index("ix_material_author_counts_top", "status", total.desc(), "author_id"),)
+
+class CacheChange(Base):
+    """Append-only log of cache keys invalidated by writes, read by every worker."""
+    __tablename__ = "cache_changes"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    key = Column(String(120), nullable=False)
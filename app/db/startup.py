@@ -0,0 +1,109 @@
+"""Database work done once per worker at startup (from the app lifespan).
+
+Importing the app never touches the database. When a worker starts serving:
+
+- the schema is created only if DB_CREATE_SCHEMA is set (development;
+  otherwise `python -m app.db.initialize_db` manages it),
+- DB_PREWARM_CONNECTIONS pool connections are opened up front, so the first
+  requests do not pay for connecting and authenticating,
+- the hot read statements are executed once, so their SQL is already in the
+  engine's compiled-statement cache (and the autocomplete and fuzzy search indexes are built),
+- the similar-materials matrix is built from the rows read here, in a
+  background thread (it takes seconds on a large catalogue), if NumPy and
+  SciPy are installed.
+
+Warm-up failures are logged and ignored: a database that is briefly
+unavailable must not keep the worker from starting.
+"""
+import logging
+import time
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
+
+import app.db.database as database
+from app.core.config import DB_CREATE_SCHEMA, DB_PREWARM_CONNECTIONS
+
+logger = logging.getLogger(__name__)
+
+
+def create_schema(engine=None):
+    from app.db.migrate import upgrade
+
+    upgrade(engine or database.engine)
+
+
+def prewarm_pool(engine=None, connections: int = DB_PREWARM_CONNECTIONS) -> int:
+    """Open `connections` pooled connections at once, then return them to the pool."""
+    engine = engine or database.engine
+    opened = []
+    try:
+        for _ in range(connections):
+            conn = engine.connect()
+            opened.append(conn)
+            conn.execute(text("SELECT 1"))
+    finally:
+        for conn in opened:
+            conn.close()
+    return len(opened)
+
+
+def warm_statements(db):
+    """Run each hot read once on `db` so its compiled form is cached by the engine."""
+    import app.core.similarity as similarity
+    import app.db.crud as crud
+
+    for kind in crud.MATERIAL_LISTINGS:
+        crud.get_material_versions(db, kind, page_size=1)
+        crud.get_material_state(db, 0, kind)
+    crud.get_authors(db, page_size=1)
+    crud.get_person_authors(db, page_size=1)
+    crud.get_institution_authors(db, page_size=1)
+    crud.get_cached_author(db, 0)
+    # also loads the autocomplete and fuzzy search indexes
+    crud.autocomplete(db, "", 1)
+    crud.fuzzy_search(db, "", 1)
+    if similarity.available():
+        crud.start_similar_index_build()
+
+
+def _warm_sync() -> int:
+    opened = prewarm_pool() if DB_PREWARM_CONNECTIONS > 0 else 0
+    db = database.SessionLocal()
+    try:
+        warm_statements(db)
+    finally:
+        db.close()
+    return opened
+
+
+async def _warm_async() -> int:
+    async_engine = database.async_engine
+    opened = []
+    try:
+        for _ in range(DB_PREWARM_CONNECTIONS):
+            conn = await async_engine.connect()
+            opened.append(conn)
+            await conn.execute(text("SELECT 1"))
+    finally:
+        for conn in opened:
+            await conn.close()
+    async with database.AsyncSessionLocal() as session:
+        await session.run_sync(warm_statements)
+    return len(opened)
+
+
+async def startup():
+    """Lifespan startup step: optional schema creation, then pool and statement warm-up."""
+    started = time.perf_counter()
+    if DB_CREATE_SCHEMA:
+        await run_in_threadpool(create_schema)
+    try:
+        if database.AsyncSessionLocal is not None:
+            opened = await _warm_async()
+        else:
+            opened = await run_in_threadpool(_warm_sync)
+    except Exception:
+        logger.warning("Database warm-up failed; continuing without it", exc_info=True)
+        return
+    logger.info("Database warm-up done in %.1f ms (%d connections)", (time.perf_counter() - started) * 1000, opened)
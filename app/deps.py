@@ -1,34 +1,34 @@
-from typing import Optional
-from fastapi import Depends, HTTPException, status
+import math
+from typing import List, NamedTuple, Optional, Tuple
+from fastapi import Depends, HTTPException, Path, Query, Request, status
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
 
-from app.db.database import SessionLocal
+import app.db.crud as crud
+from app.core.auth_throttle import auth_throttle
+from app.core.bulkheads import get_bulkhead
+from app.db.database import Database, SessionLocal, get_database
 from app.db.models import User
+from app.middleware.rate_limit import rate_limiter
 from app.core.security import pwd_context
+from app.responses import collection_tag, serialize
+from app.schemas import multi_get_adapter, read_adapters
+from app.utils import _to_http_validation_error
 
 security = HTTPBasic()
 # optional security dependency (does not auto-error) so Swagger shows the field but it's optional
 security_optional = HTTPBasic(auto_error=False)
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
-def get_current_user(credentials: HTTPBasicCredentials = Depends(security), db: Session = Depends(get_db)):
+async def get_current_user(request: Request, credentials: HTTPBasicCredentials = Depends(security)):
     """Validate basic auth credentials against the users table.
 
-    This performs a simple lookup by email==username and plaintext password comparison.
-    Password hashing is recommended for production.
+    The lookup and bcrypt verify run in the `auth` bulkhead, so a burst of
+    logins cannot take the threads that serve reads and writes.
     """
-    user = db.query(User).filter(User.email == credentials.username).first()
-    # verify password against stored hash
-    if user is None or not pwd_context.verify(credentials.password, user.password):
+    user = await _check_credentials(request, credentials)
+    if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid authentication",
@@ -37,19 +37,274 @@ def get_current_user(credentials: HTTPBasicCredentials = Depends(security), db:
     return user
 
 
-def get_current_user_optional(
+async def get_current_user_optional(
+    request: Request,
     credentials: Optional[HTTPBasicCredentials] = Depends(security_optional),
-    db: Session = Depends(get_db),
 ) -> Optional[User]:
     """Optional Basic auth: return User when valid credentials are supplied, else None.
 
     Uses the HTTPBasic security dependency with auto_error=False so OpenAPI/Swagger
     shows the Authorization input but the dependency does not force authentication.
+    Anonymous requests return straight away on the event loop; only a credential
+    check (DB lookup + password hash) goes to the `auth` bulkhead.
     """
     if credentials is None:
         return None
+    return await _check_credentials(request, credentials)
+
+
+# Scope key under which POST /batch passes the user it authenticated to its sub-requests
+AUTHENTICATED_USER = "app.authenticated_user"
+
+
+async def _check_credentials(request: Request, credentials: HTTPBasicCredentials) -> Optional[User]:
+    """Authenticate unless recent failures for this username or address are being throttled (429)."""
+    if AUTHENTICATED_USER in request.scope:
+        return request.scope[AUTHENTICATED_USER]
+    address = request.client.host if request.client else "unknown"
+    # reserved before hashing, so a parallel burst cannot outrun the failure count
+    wait = auth_throttle.acquire(credentials.username, address)
+    if wait:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many failed authentication attempts, retry later",
+            headers={"Retry-After": str(math.ceil(wait))},
+        )
+    try:
+        user = await get_bulkhead("auth").run(_authenticate, credentials)
+    finally:
+        auth_throttle.release(credentials.username, address)
+    if user is None:
+        auth_throttle.failure(credentials.username, address)
+        rate_limiter.rejected(credentials.username, address)
+    else:
+        auth_throttle.success(credentials.username)
+        rate_limiter.verified(credentials.username, address)
+    return user
 
-    user = db.query(User).filter(User.email == credentials.username).first()
-    if user is None or not pwd_context.verify(credentials.password, user.password):
+
+def _authenticate(credentials: HTTPBasicCredentials) -> Optional[User]:
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.email == credentials.username).first()
+    finally:
+        db.close()
+    if user is None:
+        # same bcrypt cost as a wrong password, so timing does not reveal unknown users
+        pwd_context.dummy_verify()
+        return None
+    if not pwd_context.verify(credentials.password, user.password):
         return None
     return user
+
+
+async def hash_password(password: str) -> str:
+    """Hash a new password in the `auth` bulkhead's threads.
+
+    Never inside `db.run`: under DB_ASYNC that runs on the event loop, which
+    a bcrypt round would block for every request on the worker.
+    """
+    return await get_bulkhead("auth").run(pwd_context.hash, password)
+
+
+class FieldSelection(NamedTuple):
+    """Resolved `fields=` parameter: the selected field names and matching adapters."""
+    fields: Optional[Tuple[str, ...]]
+    item: TypeAdapter
+    page: TypeAdapter
+
+
+def sparse_fields(model):
+    """Build a dependency parsing the `fields=` sparse-fieldset query parameter for `model`.
+
+    `fields` is a comma-separated list of the read schema's field names. Unknown
+    names are rejected with a 400 validation-style error. The resolved names are
+    passed to crud so only those columns are selected, and the adapters
+    serialize only those keys.
+    """
+    allowed = tuple(model.model_fields)
+
+    async def _sparse_fields(
+        fields: Optional[str] = Query(None, description=f"Comma-separated fields to return ({', '.join(allowed)})"),
+    ) -> FieldSelection:
+        if not fields:
+            return FieldSelection(None, *read_adapters(model))
+        requested = {name.strip() for name in fields.split(",") if name.strip()}
+        unknown = requested.difference(allowed)
+        if unknown or not requested:
+            msg = f"Unknown fields: {', '.join(sorted(unknown))}" if unknown else "No fields requested"
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=_to_http_validation_error(msg, loc=["query", "fields"], type_="value_error"),
+            )
+        selected = tuple(name for name in allowed if name in requested)
+        return FieldSelection(selected, *read_adapters(model, selected))
+
+    return _sparse_fields
+
+
+def require_root(detail: str):
+    """Build a dependency returning the authenticated user, or 403 unless root, before any route DB work."""
+
+    async def _require_root(current_user=Depends(get_current_user)):
+        if not getattr(current_user, "is_root", False):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=detail)
+        return current_user
+
+    return _require_root
+
+
+def require_self_or_root(detail: str):
+    """Like `require_root`, but also lets users act on their own `user_id` path parameter."""
+
+    async def _require_self_or_root(user_id: int, current_user=Depends(get_current_user)):
+        if not getattr(current_user, "is_root", False) and user_id != current_user.id:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=detail)
+        return current_user
+
+    return _require_self_or_root
+
+
+def deny_access(db: Session, kind: str, material_id: int, not_found: str, forbidden: str):
+    """Raise 404 or 403 after a visibility- or owner-restricted lookup found nothing.
+
+    The restricted lookup is the authorization check; this only tells a
+    missing material from one the caller may not touch, with a small
+    (status, owner, version) query on the failure path.
+    """
+    if crud.get_material_state(db, material_id, kind) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=not_found)
+    raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=forbidden)
+
+
+def require_owner(kind: str, param: str, not_found: str, forbidden: str):
+    """Build a dependency resolving the `kind` material named by path parameter `param`, owned by the caller.
+
+    Ownership is part of the lookup: only the caller's own row is loaded, and
+    the handler works on it without a second query. When nothing is found,
+    `deny_access` tells 404 from 403. As a dependency it runs before the
+    handler's own checks, so a non-owner gets 403 and cannot probe, say,
+    which author ids exist.
+    """
+    load = getattr(crud, f"get_{kind}")
+
+    async def _require_owner(
+        material_id: int = Path(alias=param),
+        db: Database = Depends(get_database),
+        current_user=Depends(get_current_user),
+    ):
+        material = await db.run(load, material_id, owner_id=current_user.id)
+        if material is None:
+            await db.run(deny_access, kind, material_id, not_found, forbidden)
+        return material
+
+    return _require_owner
+
+
+def is_visible(material, current_user) -> bool:
+    """True when `material` is published or `current_user` owns it or is root."""
+    if material.status == "published":
+        return True
+    return current_user is not None and (material.user_id == current_user.id or getattr(current_user, "is_root", False))
+
+
+def ensure_visible(material, current_user, detail: str):
+    """Raise 403 unless `material` is published or `current_user` owns it or is root."""
+    if not is_visible(material, current_user):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=detail)
+
+
+MAX_LOOKUP_KEYS = 100
+
+
+def lookup_keys(name: str, description: str, convert=str):
+    """Build a dependency parsing a batch-lookup query parameter (`?ids=1,2&ids=3`).
+
+    Returns None when the parameter is absent, else the distinct keys in
+    request order, converted with `convert`. More than MAX_LOOKUP_KEYS keys,
+    or a key `convert` rejects, is a 400.
+    """
+
+    async def _lookup_keys(values: Optional[List[str]] = Query(None, alias=name, description=description)) -> Optional[list]:
+        if values is None:
+            return None
+        try:
+            keys = list(dict.fromkeys(convert(key.strip()) for value in values for key in value.split(",") if key.strip()))
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=_to_http_validation_error(f"Invalid {name} value", loc=["query", name], type_="value_error"),
+            )
+        if not keys or len(keys) > MAX_LOOKUP_KEYS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=_to_http_validation_error(f"Between 1 and {MAX_LOOKUP_KEYS} {name} values are required", loc=["query", name], type_="value_error"),
+            )
+        return keys
+
+    return _lookup_keys
+
+
+# lookup key -> how a requested value and a stored one are compared. DOIs are
+# case-insensitive (and so is MySQL's default collation, which the IN query
+# already follows), so a DOI sent in another case must still count as found.
+KEY_MATCH = {"doi": str.casefold}
+
+
+async def read_many(request: Request, db, kind: str, key: str, keys: list, model, view: FieldSelection, current_user):
+    """Answer a batch lookup: all `keys` resolved with one `IN` query on the unique `key` column.
+
+    Visibility is the same as for a detail read, checked per item: items the
+    caller may not see are listed under `forbidden`, unknown keys under
+    `missing`; items keep the order of `keys`. Keys naming the same row
+    (see KEY_MATCH) are answered once.
+    """
+    match = KEY_MATCH.get(key, lambda value: value)
+    rows = await db.run(crud.get_materials_by_keys, kind, key, keys, fields=view.fields)
+    found = {match(getattr(row, key)): row for row in rows}
+    items, missing, forbidden, seen = [], [], [], set()
+    for value in keys:
+        if match(value) in seen:
+            continue
+        seen.add(match(value))
+        row = found.get(match(value))
+        if row is None:
+            missing.append(value)
+        elif is_visible(row, current_user):
+            items.append(row)
+        else:
+            forbidden.append(value)
+    # a change in any of the three lists is a new representation
+    tagged = [(item.id, item.version) for item in items] + [("missing", value) for value in missing] + [("forbidden", value) for value in forbidden]
+    etag = collection_tag(request, tagged, len(keys))
+    result = {"items": items, "missing": missing, "forbidden": forbidden}
+    return serialize(multi_get_adapter(model, view.fields), result, etag=etag)
+
+
+async def export_pages(db, kind: str, current_user, **filters):
+    """Yield the pages of an export (crud.ExportPage), each read with its own `db.run` call.
+
+    Every page goes through the request's bulkhead like any other database
+    call, and holds a connection only while it is read.
+    """
+    after = 0
+    while after is not None:
+        page = await db.run(crud.export_materials, kind, current_user, after=after, **filters)
+        yield page
+        after = page.after
+
+
+def ensure_author_exists(db: Session, author_id: Optional[int]):
+    """Raise 400 unless `author_id` (when given) names an existing author.
+
+    Checked against the author cache before a material insert/update, so a bad
+    id is rejected without the round trip into a foreign-key IntegrityError.
+    The error has the same shape `parse_integrity_error` produces.
+    """
+    if author_id is not None and crud.get_cached_author(db, author_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=_to_http_validation_error(
+                f"Author {author_id} not found", loc=["body", "author_id"], type_="value_error.foreign_key"
+            ),
+        )
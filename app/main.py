@@ -1,12 +1,53 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+
+import math
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from app.db.database import engine
-import app.db.models as models
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm.exc import StaleDataError
+from app.core.bulkheads import BulkheadFull
+from app.core.config import SHED_RETRY_AFTER
+from app.db import startup
+from app.middleware import CoalescingMiddleware, CompressionMiddleware, LoadSheddingMiddleware, RateLimitMiddleware
+from app.responses import NegotiatedResponse
+
+
+# Importing the app has no side effects: schema creation (opt-in) and the
+# connection/statement warm-up run here, once per worker, before serving.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await startup.startup()
+    yield
+
+
+app = FastAPI(
+    title="Digital Library API",
+    description="REST API for managing a digital library.",
+    version="1.0.0",
+    default_response_class=NegotiatedResponse,
+    lifespan=lifespan,
+)
+
+
+@app.exception_handler(BulkheadFull)
+async def bulkhead_full(request: Request, exc: BulkheadFull):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Service overloaded, retry later"},
+        headers={"Retry-After": str(max(1, math.ceil(SHED_RETRY_AFTER)))},
+    )
+
 
-models.Base.metadata.create_all(bind=engine)
+# The row's version changed between reading and writing it: another request
+# updated it concurrently, and the client should re-read before retrying.
+@app.exception_handler(StaleDataError)
+async def concurrent_update(request: Request, exc: StaleDataError):
+    return JSONResponse(status_code=409, content={"detail": "Modified concurrently, retry with the current version"})
 
-app = FastAPI(title="Digital Library API", description="REST API for managing a digital library.", version="1.0.0")
 
+# Innermost: coalesced responses are recorded before compression and CORS
+app.add_middleware(CoalescingMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -14,6 +55,11 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware)
+# Overloaded workers reject before doing any work for the request
+app.add_middleware(LoadSheddingMiddleware)
+# Outermost: clients over their rate limit are not even counted as load
+app.add_middleware(RateLimitMiddleware)
 
 from app.routers import (
     users_router,
@@ -22,6 +68,8 @@ from app.routers import (
     articles_router,
     videos_router,
     authors_router,
+    metrics_router,
+    batch_router,
 )
 
 app.include_router(users_router)
@@ -31,3 +79,5 @@ app.include_router(articles_router)
 app.include_router(videos_router)
 app.include_router(materials_router)
 app.include_router(authors_router)
+app.include_router(metrics_router)
+app.include_router(batch_router)
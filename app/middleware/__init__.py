@@ -0,0 +1,7 @@
+"""ASGI middleware used by the application (see `app.main`)."""
+from app.middleware.coalescing import CoalescingMiddleware
+from app.middleware.compression import CompressionMiddleware
+from app.middleware.load_shedding import LoadSheddingMiddleware
+from app.middleware.rate_limit import RateLimitMiddleware
+
+__all__ = ["CoalescingMiddleware", "CompressionMiddleware", "LoadSheddingMiddleware", "RateLimitMiddleware"]
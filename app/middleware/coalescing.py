@@ -0,0 +1,89 @@
+"""Single-flight coalescing of identical concurrent anonymous GETs.
+
+While a GET is in flight, identical requests arriving on the same worker wait
+for it instead of running the handler (and its queries) again, then replay its
+recorded response. Requests count as identical when path, query string and
+the headers that select the representation (Accept, If-None-Match) match.
+Only requests without an Authorization header are coalesced, so every sharer
+has the same (anonymous) visibility; streaming exports and the metrics
+endpoint are never coalesced.
+
+If the leading request fails or is cancelled, the waiters run their own
+requests instead of sharing the failure.
+"""
+import asyncio
+
+from starlette.datastructures import Headers
+
+from app.core import metrics
+
+SKIP_PREFIXES = ("/metrics",)
+SKIP_SUFFIXES = ("/export",)
+# key -> future of the leading request's messages, shared by every instance on
+# the worker (the app's middleware and POST /batch's reads)
+INFLIGHT = {}
+
+
+def _copy(message: dict) -> dict:
+    # outer middleware (compression) rewrites the start message's headers in place
+    message = dict(message)
+    if "headers" in message:
+        message["headers"] = list(message["headers"])
+    return message
+
+
+class CoalescingMiddleware:
+    def __init__(self, app, skip_prefixes=SKIP_PREFIXES, skip_suffixes=SKIP_SUFFIXES, inflight: dict = INFLIGHT):
+        self.app = app
+        self.skip_prefixes = skip_prefixes
+        self.skip_suffixes = skip_suffixes
+        self._inflight = inflight
+
+    def _key(self, scope):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            return None
+        path = scope["path"]
+        if path.startswith(self.skip_prefixes) or path.endswith(self.skip_suffixes):
+            return None
+        headers = Headers(scope=scope)
+        if "authorization" in headers:
+            return None
+        return (path, scope["query_string"], headers.get("accept", ""), headers.get("if-none-match", ""))
+
+    async def __call__(self, scope, receive, send):
+        key = self._key(scope)
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+
+        leader = self._inflight.get(key)
+        if leader is not None:
+            try:
+                messages = await asyncio.shield(leader)
+            except asyncio.CancelledError:
+                if not leader.cancelled():
+                    raise
+                await self.app(scope, receive, send)
+                return
+            metrics.incr("coalesced_requests")
+            for message in messages:
+                await send(_copy(message))
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        messages = []
+
+        async def record(message):
+            messages.append(_copy(message))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, record)
+        except BaseException:
+            future.cancel()
+            raise
+        else:
+            future.set_result(messages)
+        finally:
+            del self._inflight[key]
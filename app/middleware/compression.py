@@ -0,0 +1,207 @@
+"""Response compression (brotli/gzip) with a cache of precompressed bodies.
+
+Bodies smaller than `minimum_size`, already-encoded responses and
+non-compressible content types pass through untouched. Complete bodies are
+compressed in one go and the result is kept in a small LRU keyed by the body
+digest, so hot responses (the same page served over and over) are compressed
+once. Streaming responses such as the exports are compressed chunk by chunk.
+"""
+import gzip
+import hashlib
+import zlib
+from collections import OrderedDict
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from app.core import metrics
+from app.core.config import BROTLI_QUALITY, COMPRESSION_CACHE_SIZE, COMPRESSION_MIN_SIZE, GZIP_LEVEL
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip is offered
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "application/msgpack",
+    "text/",
+)
+
+
+def choose_encoding(accept_encoding: str):
+    """Pick "br" or "gzip" from an Accept-Encoding header (br preferred on ties), or None."""
+    offered = {}
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        key, _, value = params.strip().partition("=")
+        if key == "q":
+            try:
+                q = float(value)
+            except ValueError:
+                q = 0.0
+        offered[coding.strip()] = q
+    candidates = (["br"] if brotli is not None else []) + ["gzip"]
+    best = None
+    for coding in candidates:
+        q = offered.get(coding, offered.get("*", 0.0))
+        if q > 0 and (best is None or q > best[1]):
+            best = (coding, q)
+    return best[0] if best else None
+
+
+class PrecompressedCache:
+    """LRU of compressed bodies keyed by (encoding, body digest)."""
+
+    def __init__(self, maxsize: int = 256, max_body_size: int = 1024 * 1024):
+        self.maxsize = maxsize
+        self.max_body_size = max_body_size
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def compress(self, encoding: str, body: bytes, compress) -> bytes:
+        if self.maxsize <= 0 or len(body) > self.max_body_size:
+            return compress(body)
+        key = (encoding, hashlib.blake2b(body, digest_size=16).digest())
+        cached = self._data.get(key)
+        if cached is not None:
+            self._data.move_to_end(key)
+            self.hits += 1
+            return cached
+        self.misses += 1
+        compressed = compress(body)
+        self._data[key] = compressed
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+        return compressed
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self) -> dict:
+        return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+# Shared by the application's middleware instance
+precompressed_cache = PrecompressedCache(maxsize=COMPRESSION_CACHE_SIZE)
+metrics.register_source("compression", precompressed_cache.stats)
+
+
+class _GzipStream:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def chunk(self, data: bytes, final: bool) -> bytes:
+        flush_mode = zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH
+        return self._compressor.compress(data) + self._compressor.flush(flush_mode)
+
+
+class _BrotliStream:
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def chunk(self, data: bytes, final: bool) -> bytes:
+        out = self._compressor.process(data)
+        return out + (self._compressor.finish() if final else self._compressor.flush())
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app,
+        minimum_size: int = COMPRESSION_MIN_SIZE,
+        gzip_level: int = GZIP_LEVEL,
+        brotli_quality: int = BROTLI_QUALITY,
+        cache: PrecompressedCache = precompressed_cache,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.cache = cache
+
+    def _compress(self, encoding: str, body: bytes) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        # mtime=0 keeps the output deterministic for identical bodies
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+
+    def _stream(self, encoding: str):
+        if encoding == "br":
+            return _BrotliStream(self.brotli_quality)
+        return _GzipStream(self.gzip_level)
+
+    @staticmethod
+    def _compressible(status: int, headers: Headers) -> bool:
+        if status < 200 or status in (204, 304) or "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "")
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        mode = None  # "identity" or "stream" once decided
+        stream = None
+
+        async def send_compressed(message):
+            nonlocal start, mode, stream
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if mode == "identity":
+                await send(message)
+                return
+            if mode == "stream":
+                await send({"type": "http.response.body", "body": stream.chunk(body, not more_body), "more_body": more_body})
+                return
+
+            headers = MutableHeaders(raw=list(start["headers"]))
+            start["headers"] = headers.raw
+            if not self._compressible(start["status"], headers):
+                mode = "identity"
+                await send(start)
+                await send(message)
+                return
+            headers.add_vary_header("Accept-Encoding")
+            if not more_body and len(body) < self.minimum_size:
+                mode = "identity"
+                await send(start)
+                await send(message)
+                return
+
+            headers["Content-Encoding"] = encoding
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                # a compressed body is a different representation than the identity one
+                headers["ETag"] = f'{etag[:-1]}-{encoding}"'
+            if not more_body:
+                compressed = self.cache.compress(encoding, body, lambda b: self._compress(encoding, b))
+                headers["Content-Length"] = str(len(compressed))
+                await send(start)
+                await send({"type": "http.response.body", "body": compressed})
+                return
+
+            if "content-length" in headers:
+                del headers["Content-Length"]
+            mode = "stream"
+            stream = self._stream(encoding)
+            await send(start)
+            await send({"type": "http.response.body", "body": stream.chunk(body, False), "more_body": True})
+
+        await self.app(scope, receive, send_compressed)
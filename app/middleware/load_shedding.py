@@ -0,0 +1,154 @@
+"""Adaptive load shedding: answer 503 early instead of queueing until timeout.
+
+Every request is classified (cheap read, write, export, or book creation,
+which may call OpenLibrary) and admitted only while the worker's pressure is
+below that class's threshold. Pressure is the highest of:
+
+- in-flight requests / `max_in_flight`,
+- event-loop delay / `max_queue_delay` (how long a callback scheduled now
+  waits before it runs, smoothed),
+- threadpool backlog / `max_thread_queue` (blocking calls waiting for a
+  thread, in the default pool or any bulkhead).
+
+Thresholds are lower for expensive classes, so as load grows enrichment is
+shed first, then writes and exports, and cheap reads last. Rejected requests
+get `503` with `Retry-After` before any work is done for them. /metrics is
+never shed so the state stays observable.
+"""
+import asyncio
+import math
+import time
+
+import anyio.to_thread
+import orjson
+
+from app.core import bulkheads, metrics
+from app.core.config import (
+    SHED_MAX_IN_FLIGHT,
+    SHED_MAX_QUEUE_DELAY,
+    SHED_MAX_THREAD_QUEUE,
+    SHED_RETRY_AFTER,
+)
+
+# class -> pressure at which its requests start being rejected
+THRESHOLDS = {
+    "enrichment": 0.5,
+    "write": 0.8,
+    "export": 0.8,
+    "read": 1.0,
+}
+EXEMPT_PREFIXES = ("/metrics",)
+
+
+def classify(method: str, path: str) -> str:
+    if method in ("GET", "HEAD", "OPTIONS"):
+        return "export" if path.endswith("/export") else "read"
+    if method == "POST" and path.rstrip("/") == "/materials/books":
+        return "enrichment"
+    return "write"
+
+
+class LoadShedder:
+    """Pressure bookkeeping shared by the middleware and /metrics."""
+
+    def __init__(
+        self,
+        max_in_flight: int = SHED_MAX_IN_FLIGHT,
+        max_queue_delay: float = SHED_MAX_QUEUE_DELAY,
+        max_thread_queue: int = SHED_MAX_THREAD_QUEUE,
+        thresholds: dict = THRESHOLDS,
+        smoothing: float = 0.2,
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_queue_delay = max_queue_delay
+        self.max_thread_queue = max_thread_queue
+        self.thresholds = dict(thresholds)
+        self.smoothing = smoothing
+        self.in_flight = 0
+        self.queue_delay = 0.0
+        self.shed = {name: 0 for name in self.thresholds}
+
+    async def sample_queue_delay(self):
+        loop = asyncio.get_running_loop()
+        scheduled = time.perf_counter()
+        ran = loop.create_future()
+        loop.call_soon(ran.set_result, None)
+        await ran
+        delay = time.perf_counter() - scheduled
+        self.queue_delay += self.smoothing * (delay - self.queue_delay)
+
+    @staticmethod
+    def thread_queue() -> int:
+        try:
+            default = anyio.to_thread.current_default_thread_limiter().statistics().tasks_waiting
+        except RuntimeError:  # no running async backend
+            default = 0
+        return default + bulkheads.waiting()
+
+    def pressure(self) -> float:
+        signals = [self.in_flight / self.max_in_flight if self.max_in_flight else 0.0]
+        if self.max_queue_delay:
+            signals.append(self.queue_delay / self.max_queue_delay)
+        if self.max_thread_queue:
+            signals.append(self.thread_queue() / self.max_thread_queue)
+        return max(signals)
+
+    def admit(self, kind: str) -> bool:
+        if self.pressure() >= self.thresholds[kind]:
+            self.shed[kind] += 1
+            metrics.incr(f"shed_{kind}_requests")
+            return False
+        return True
+
+    def reset(self):
+        self.queue_delay = 0.0
+        self.shed = {name: 0 for name in self.thresholds}
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queue_delay_ms": round(self.queue_delay * 1000, 3),
+            "thread_queue": self.thread_queue(),
+            "pressure": round(self.pressure(), 4),
+            "thresholds": self.thresholds,
+            "shed": dict(self.shed),
+        }
+
+
+load_shedder = LoadShedder()
+metrics.register_source("load_shedding", load_shedder.stats)
+
+
+class LoadSheddingMiddleware:
+    def __init__(self, app, shedder: LoadShedder = load_shedder, retry_after: float = SHED_RETRY_AFTER):
+        self.app = app
+        self.shedder = shedder
+        self.retry_after = str(max(1, math.ceil(retry_after)))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(EXEMPT_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+        await self.shedder.sample_queue_delay()
+        if not self.shedder.admit(classify(scope["method"], scope["path"])):
+            await self._reject(send)
+            return
+        self.shedder.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.shedder.in_flight -= 1
+
+    async def _reject(self, send):
+        body = orjson.dumps({"detail": "Service overloaded, retry later"})
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", self.retry_after.encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
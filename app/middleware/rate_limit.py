@@ -0,0 +1,206 @@
+"""Per-principal token-bucket rate limiting.
+
+Each request is charged one token from the bucket of its principal and route
+class. The principal is the client IP, or the Basic-auth username once that
+username's password has been verified from that IP. Credentials are not
+checked here (that costs a bcrypt hash); `app.deps` reports each check to the
+limiter instead. So a made-up or someone else's username is charged to the
+sender's address: it neither gets a fresh bucket nor drains the victim's.
+Route classes:
+
+- `search`  list GETs filtered by title, author_name or description, and
+            fuzzy searches
+- `export`  streaming exports
+- `write`   anything but GET/HEAD/OPTIONS
+- `read`    every other GET
+
+A request whose bucket is empty gets `429` with `Retry-After` (seconds until
+a token is back) without reaching the app. Buckets live in a backend; the
+default `MemoryBackend` is per worker and bounded to `max_keys` buckets. A
+shared store (Redis and the like) can be plugged in by implementing
+`RateLimitBackend.consume`, which is async for that reason.
+"""
+import abc
+import base64
+import binascii
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qsl
+
+import orjson
+from starlette.datastructures import Headers
+
+from app.core import metrics
+from app.core.config import (
+    RATE_LIMIT_EXPORT,
+    RATE_LIMIT_MAX_KEYS,
+    RATE_LIMIT_READ,
+    RATE_LIMIT_SEARCH,
+    RATE_LIMIT_WRITE,
+)
+
+# class -> (tokens per second, burst), None for unlimited
+Limit = Optional[Tuple[float, int]]
+LIMITS: Dict[str, Limit] = {
+    "read": RATE_LIMIT_READ,
+    "search": RATE_LIMIT_SEARCH,
+    "write": RATE_LIMIT_WRITE,
+    "export": RATE_LIMIT_EXPORT,
+}
+SEARCH_PARAMS = (b"title", b"author_name", b"description")
+EXEMPT_PREFIXES = ("/metrics",)
+
+
+def classify(method: str, path: str, query_string: bytes) -> str:
+    if method not in ("GET", "HEAD", "OPTIONS"):
+        return "write"
+    if path.endswith("/export"):
+        return "export"
+    if path.endswith("/fuzzy"):
+        return "search"
+    # list endpoints are /materials, /materials/<kind> and /authors...; details end in an id
+    if not path.rstrip("/").rpartition("/")[2].isdigit() and any(
+        key in SEARCH_PARAMS and value for key, value in parse_qsl(query_string)
+    ):
+        return "search"
+    return "read"
+
+
+def principal(scope, verified=()) -> str:
+    """The bucket owner: "user:<name>" when (name, address) is in `verified`, else "ip:<address>"."""
+    client = scope.get("client")
+    address = client[0] if client else "unknown"
+    authorization = Headers(scope=scope).get("authorization", "")
+    scheme, _, encoded = authorization.partition(" ")
+    if scheme.lower() == "basic" and encoded:
+        try:
+            username = base64.b64decode(encoded).decode().partition(":")[0].lower()
+        except (binascii.Error, UnicodeDecodeError):
+            username = ""
+        if username and (username, address) in verified:
+            return "user:" + username
+    return "ip:" + address
+
+
+class RateLimitBackend(abc.ABC):
+    @abc.abstractmethod
+    async def consume(self, key: str, rate: float, burst: int) -> float:
+        """Take one token from `key`'s bucket; return 0 if granted, else seconds until one is available."""
+
+    def reset(self):
+        pass
+
+    def stats(self) -> dict:
+        return {}
+
+
+class MemoryBackend(RateLimitBackend):
+    """Buckets in a dict on this worker, as (tokens, last refill) per key."""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS, clock=time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets = OrderedDict()
+
+    async def consume(self, key: str, rate: float, burst: int) -> float:
+        now = self.clock()
+        tokens, updated = self._buckets.pop(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            # a dropped bucket comes back full, which only errs towards allowing
+            self._buckets.popitem(last=False)
+        return wait
+
+    def reset(self):
+        self._buckets.clear()
+
+    def stats(self) -> dict:
+        return {"buckets": len(self._buckets), "max_keys": self.max_keys}
+
+
+class RateLimiter:
+    def __init__(self, limits: Dict[str, Limit] = LIMITS, backend: RateLimitBackend = None):
+        self.limits = dict(limits)
+        self.backend = backend or MemoryBackend()
+        self.limited = {name: 0 for name in self.limits}
+        self.max_verified = RATE_LIMIT_MAX_KEYS
+        # (username, address) pairs whose credentials checked out, least recently used first
+        self._verified = OrderedDict()
+
+    def verified(self, username: str, address: str):
+        """Charge `username`'s requests from `address` to the user from now on."""
+        key = (username.lower(), address)
+        self._verified.pop(key, None)
+        self._verified[key] = True
+        if len(self._verified) > self.max_verified:
+            self._verified.popitem(last=False)
+
+    def rejected(self, username: str, address: str):
+        """Charge `username`'s requests from `address` to the address again."""
+        self._verified.pop((username.lower(), address), None)
+
+    async def check(self, scope) -> float:
+        """Charge the request's bucket; 0 when allowed, else the Retry-After delay."""
+        kind = classify(scope["method"], scope["path"], scope["query_string"])
+        limit = self.limits.get(kind)
+        if limit is None:
+            return 0.0
+        wait = await self.backend.consume(f"{kind}:{principal(scope, self._verified)}", *limit)
+        if wait:
+            self.limited[kind] += 1
+            metrics.incr(f"rate_limited_{kind}_requests")
+        return wait
+
+    def reset(self):
+        self.backend.reset()
+        self.limited = {name: 0 for name in self.limits}
+        self._verified.clear()
+
+    def stats(self) -> dict:
+        return {
+            "limits": {name: list(limit) if limit else None for name, limit in self.limits.items()},
+            "limited": dict(self.limited),
+            "verified_principals": len(self._verified),
+            **self.backend.stats(),
+        }
+
+
+rate_limiter = RateLimiter()
+metrics.register_source("rate_limits", rate_limiter.stats)
+
+
+class RateLimitMiddleware:
+    def __init__(self, app, limiter: RateLimiter = rate_limiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(EXEMPT_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+        wait = await self.limiter.check(scope)
+        if wait:
+            await self._reject(send, wait)
+            return
+        await self.app(scope, receive, send)
+
+    async def _reject(self, send, wait: float):
+        body = orjson.dumps({"detail": "Too many requests, retry later"})
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(wait))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,194 @@
+"""Response rendering helpers.
+
+Routers hand ORM objects, rows or plain dicts to `serialize` together with one
+of the pre-built adapters in `app.schemas`. The data is read into the
+validator-free read schema once and returned as a `NegotiatedResponse`, which
+encodes it when it is sent: JSON straight from the adapter's serializer
+(`dump_json`, no intermediate dicts), or msgpack when the client's Accept header
+asks for it. Because a Response is returned directly,
+FastAPI skips its own `response_model` pass; the `response_model` declared on
+each route is kept for the OpenAPI docs.
+"""
+import csv
+import hashlib
+import io
+from datetime import date, datetime
+
+import orjson
+from fastapi.responses import Response, StreamingResponse
+from pydantic import TypeAdapter
+from starlette.datastructures import Headers
+
+try:
+    import msgpack
+except ImportError:  # optional: without it every client gets JSON
+    msgpack = None
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _accept_quality(accept: str, media_types) -> float:
+    """Return the highest q-value the Accept header gives any of `media_types`."""
+    best = 0.0
+    for part in accept.split(","):
+        media_type, _, params = part.strip().partition(";")
+        if media_type.strip().lower() not in media_types:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        best = max(best, q)
+    return best
+
+
+def wants_msgpack(accept: str) -> bool:
+    """True when msgpack is available and the client ranks it at least as high as JSON."""
+    if msgpack is None or "msgpack" not in accept:
+        return False
+    msgpack_q = _accept_quality(accept, MSGPACK_MEDIA_TYPES)
+    json_q = _accept_quality(accept, (JSON_MEDIA_TYPE, "application/*", "*/*"))
+    return msgpack_q > 0 and msgpack_q >= json_q
+
+
+def _msgpack_default(obj):
+    if isinstance(obj, (date, datetime)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not msgpack serializable")
+
+
+class NegotiatedResponse(Response):
+    """Response holding plain data that is encoded when sent, per the Accept header.
+
+    JSON is the default; `Accept: application/msgpack` gets msgpack. With an
+    `adapter`, `content` is an instance of its type and is encoded by the
+    adapter; otherwise it is plain data encoded with orjson. Usable as
+    FastAPI's `default_response_class`.
+    """
+    media_type = JSON_MEDIA_TYPE
+
+    def __init__(self, content=None, status_code: int = 200, headers=None, media_type=None, background=None, adapter: TypeAdapter = None):
+        self.content = content
+        self.adapter = adapter
+        super().__init__(None, status_code, headers, media_type, background)
+
+    def encode(self, accept: str = ""):
+        """Return (body, media_type) for the given Accept header."""
+        if wants_msgpack(accept):
+            content = self.content if self.adapter is None else self.adapter.dump_python(self.content)
+            return msgpack.packb(content, default=_msgpack_default), MSGPACK_MEDIA_TYPES[0]
+        if self.adapter is not None:
+            return self.adapter.dump_json(self.content), JSON_MEDIA_TYPE
+        return orjson.dumps(self.content, option=orjson.OPT_NON_STR_KEYS), JSON_MEDIA_TYPE
+
+    async def __call__(self, scope, receive, send):
+        self.body, media_type = self.encode(Headers(scope=scope).get("accept", ""))
+        self.headers["content-length"] = str(len(self.body))
+        self.headers["content-type"] = media_type
+        self.headers.add_vary_header("Accept")
+        await super().__call__(scope, receive, send)
+
+
+def serialize(adapter: TypeAdapter, data, status_code: int = 200, etag: str = None) -> NegotiatedResponse:
+    """Read `data` into `adapter`'s type and return it as a content-negotiated response.
+
+    The JSON body is written by the adapter's serializer when the response is
+    sent, so the data is walked once to read it and once to encode it.
+    """
+    obj = adapter.validate_python(data, from_attributes=True)
+    headers = {"ETag": etag} if etag else None
+    return NegotiatedResponse(obj, status_code=status_code, headers=headers, adapter=adapter)
+
+
+#########################################
+# Conditional GET
+# Detail responses get strong ETags built from the row version; list responses
+# get weak ETags hashed from the page's (id, version) pairs and total. The
+# negotiated format is part of the tag because JSON and msgpack bodies of the
+# same URL are different representations, and so is a sparse `fields=`
+# selection. The compression middleware appends "-gzip"/"-br" to strong tags
+# it compresses, which comparison ignores.
+def _negotiated_format(request) -> str:
+    fmt = "msgpack" if wants_msgpack(request.headers.get("accept", "")) else "json"
+    fields = request.query_params.get("fields")
+    if fields:
+        fmt += "-" + hashlib.blake2b(fields.encode(), digest_size=4).hexdigest()
+    return fmt
+
+
+def entity_tag(request, *parts) -> str:
+    """Strong ETag for a single resource, e.g. entity_tag(request, "book", 12, version)."""
+    return '"' + "-".join(str(part) for part in (*parts, _negotiated_format(request))) + '"'
+
+
+def collection_tag(request, versions, total: int) -> str:
+    """Weak ETag for a list page given its [(id, version), ...] pairs and total."""
+    key = repr((tuple(tuple(pair) for pair in versions), total)).encode()
+    return f'W/"{hashlib.blake2b(key, digest_size=12).hexdigest()}-{_negotiated_format(request)}"'
+
+
+def _opaque_tag(tag: str) -> str:
+    tag = tag.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    tag = tag.strip('"')
+    for suffix in ("-gzip", "-br"):
+        if tag.endswith(suffix):
+            return tag[: -len(suffix)]
+    return tag
+
+
+def etag_matches(request, etag: str) -> bool:
+    """Weak comparison of `etag` against the request's If-None-Match header."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    wanted = _opaque_tag(etag)
+    return any(_opaque_tag(tag) == wanted for tag in header.split(","))
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Vary": "Accept"})
+
+
+async def _ndjson_chunks(pages):
+    async for keys, rows, _ in pages:
+        if rows:
+            yield b"".join(orjson.dumps(dict(zip(keys, row))) + b"\n" for row in rows)
+
+
+async def _csv_chunks(pages):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    header = True
+    async for keys, rows, _ in pages:
+        if header:
+            # written with the first page, so there is one even when nothing matches
+            writer.writerow(keys)
+            header = False
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def stream_export(pages, filename: str, fmt: str = "ndjson") -> StreamingResponse:
+    """Stream export pages (an async iterator of crud.ExportPage) as NDJSON or CSV, one chunk per page."""
+    chunks = _csv_chunks(pages) if fmt == "csv" else _ndjson_chunks(pages)
+    return StreamingResponse(
+        chunks,
+        media_type=EXPORT_MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'},
+    )
@@ -4,6 +4,8 @@ from .books import router as books_router
 from .articles import router as articles_router
 from .videos import router as videos_router
 from .authors import router as authors_router
+from .metrics import router as metrics_router
+from .batch import router as batch_router
 
 __all__ = [
     "users_router",
@@ -12,4 +14,6 @@ __all__ = [
     "articles_router",
     "videos_router",
     "authors_router",
+    "metrics_router",
+    "batch_router",
 ]
@@ -1,102 +1,115 @@
-from typing import List
+from typing import List, Optional, Union
 
 from fastapi import APIRouter, Depends, status, HTTPException, Query, Response, Request
-from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
-from app.utils import parse_integrity_error
+from app.utils import parse_integrity_error, paginate
+from app.responses import serialize, stream_export, entity_tag, collection_tag, etag_matches, not_modified
 
 import app.db.crud as crud
 import app.schemas as schemas
-from app.db.database import SessionLocal
-from app.deps import get_current_user, get_current_user_optional
+from app.db.database import Database, get_database
+from app.deps import get_current_user, get_current_user_optional, sparse_fields, FieldSelection, deny_access, ensure_visible, lookup_keys, read_many, ensure_author_exists, require_owner, export_pages
 
 router = APIRouter(prefix="/materials/articles", tags=["Materials - Articles"])
+# the caller's own article, resolved (and 404/403 answered) before the handler runs
+owned_article = require_owner("article", "article_id", "Article not found", "Not allowed to modify this article")
+deletable_article = require_owner("article", "article_id", "Article not found", "Not allowed to delete this article")
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-@router.get("", response_model=schemas.Pagination[schemas.Article], responses=schemas.HTTP_ERROR_RESPONSES)
-def read_articles(
+@router.get("", response_model=Union[schemas.Pagination[schemas.ArticleRead], schemas.MultiGet[schemas.ArticleRead]], responses=schemas.HTTP_ERROR_RESPONSES)
+async def read_articles(
     response: Response,
     request: Request,
-    db: Session = Depends(get_db),
+    db: Database = Depends(get_database),
     current_user=Depends(get_current_user_optional),
     title: str = Query(None, description="Filter by title"),
     author_name: str = Query(None, description="Filter by author name"),
     description: str = Query(None, description="Filter by description"),
     page: int = Query(1, ge=1, description="Page number"),
     page_size: int = Query(10, ge=1, le=100, description="Page size"),
+    view: FieldSelection = Depends(sparse_fields(schemas.ArticleRead)),
+    doi: Optional[list] = Depends(lookup_keys("doi", "DOIs to fetch in one call (comma-separated or repeated)", str)),
+):
+    if doi is not None:
+        return await read_many(request, db, "article", "doi", doi, schemas.ArticleRead, view, current_user)
+    if request.headers.get("if-none-match"):
+        versions, total = await db.run(crud.get_material_versions, "article", current_user, title=title, author_name=author_name, description=description, page=page, page_size=page_size)
+        etag = collection_tag(request, versions, total)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+    items, total = await db.run(crud.get_articles, current_user, title=title, author_name=author_name, description=description, page=page, page_size=page_size, fields=view.fields)
+    etag = collection_tag(request, [(item.id, item.version) for item in items], total)
+    return serialize(view.page, paginate(request, items, total, page, page_size), etag=etag)
+
+
+@router.get("/export", responses=schemas.HTTP_ERROR_RESPONSES)
+async def export_articles(
+    db: Database = Depends(get_database),
+    current_user=Depends(get_current_user_optional),
+    title: str = Query(None, description="Filter by title"),
+    author_name: str = Query(None, description="Filter by author name"),
+    description: str = Query(None, description="Filter by description"),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="Export format: ndjson or csv"),
+    view: FieldSelection = Depends(sparse_fields(schemas.ArticleRead)),
 ):
-    items, total = crud.get_articles(db, current_user, title=title, author_name=author_name, description=description, page=page, page_size=page_size)
-    last_page = max(1, (total + page_size - 1) // page_size)
-    def _make_url(p: int):
-        return str(request.url.replace_query_params(page=p, page_size=page_size))
-    links = {
-        "first": _make_url(1),
-        "prev": _make_url(page - 1) if page > 1 else None,
-        "next": _make_url(page + 1) if page < last_page else None,
-        "last": _make_url(last_page),
-    }
-    return {
-        "items": items,
-        "total": total,
-        "page": page,
-        "page_size": page_size,
-        "links": links,
-    }
+    """Stream every visible article matching the filters, without pagination."""
+    pages = export_pages(db, "article", current_user, title=title, author_name=author_name, description=description, fields=view.fields)
+    return stream_export(pages, "articles", format)
 
 
-@router.get("/{article_id}", response_model=schemas.Article, responses=schemas.HTTP_ERROR_RESPONSES)
-def read_article(
+@router.get("/{article_id}", response_model=schemas.ArticleRead, responses=schemas.HTTP_ERROR_RESPONSES)
+async def read_article(
     article_id: int,
-    db: Session = Depends(get_db),
+    request: Request,
+    db: Database = Depends(get_database),
     current_user=Depends(get_current_user_optional),
+    view: FieldSelection = Depends(sparse_fields(schemas.ArticleRead)),
 ):
-    db_article = crud.get_article(db, article_id)
+    entry = await db.run(crud.get_published_material, article_id, "article")
+    if entry is not None:
+        # published, so visible to everyone: served from the per-worker cache
+        etag = entity_tag(request, "article", article_id, entry.version)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        return serialize(view.item, entry.payload, etag=etag)
+    if request.headers.get("if-none-match"):
+        state = await db.run(crud.get_material_state, article_id, "article")
+        if state is None:
+            raise HTTPException(status_code=404, detail="Article not found")
+        ensure_visible(state, current_user, "Not allowed to view this article")
+        etag = entity_tag(request, "article", article_id, state.version)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+    # visibility (published or owner/root) is part of the lookup
+    db_article = await db.run(crud.get_article, article_id, fields=view.fields, viewer=current_user)
     if db_article is None:
-        raise HTTPException(status_code=404, detail="Article not found")
-    if db_article.status != "published":
-        if current_user is None or (db_article.user_id != current_user.id and not getattr(current_user, "is_root", False)):
-            raise HTTPException(status_code=403, detail="Not allowed to view this article")
-    return db_article
+        await db.run(deny_access, "article", article_id, "Article not found", "Not allowed to view this article")
+    return serialize(view.item, db_article, etag=entity_tag(request, "article", article_id, db_article.version))
 
 
-@router.post("", response_model=schemas.Article, status_code=status.HTTP_201_CREATED, responses=schemas.HTTP_ERROR_RESPONSES)
-def create_article(article: schemas.ArticleCreate, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+@router.post("", response_model=schemas.ArticleRead, status_code=status.HTTP_201_CREATED, responses=schemas.HTTP_ERROR_RESPONSES)
+async def create_article(article: schemas.ArticleCreate, db: Database = Depends(get_database), current_user=Depends(get_current_user)):
+    await db.run(ensure_author_exists, article.author_id)
     try:
-        return crud.create_article(db, article, current_user.id)
+        return serialize(schemas.ArticleAdapter, await db.run(crud.create_article, article, current_user.id), status_code=status.HTTP_201_CREATED)
     except IntegrityError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=parse_integrity_error(e))
 
 
-@router.put("/{article_id}", response_model=schemas.Article, responses=schemas.HTTP_ERROR_RESPONSES)
-def update_article(article_id: int, article: schemas.ArticleCreate, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    db_article = crud.get_article(db, article_id)
-    if db_article is None:
-        raise HTTPException(status_code=404, detail="Article not found")
-    if db_article.user_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not allowed to modify this article")
+@router.put("/{article_id}", response_model=schemas.ArticleRead, responses=schemas.HTTP_ERROR_RESPONSES)
+async def update_article(article: schemas.ArticleCreate, db: Database = Depends(get_database), db_article=Depends(owned_article)):
+    await db.run(ensure_author_exists, article.author_id)
     try:
-        updated = crud.update_article(db, article_id, article.model_dump())
-        return updated
+        updated = await db.run(crud.update_article, db_article, article.model_dump())
     except IntegrityError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=parse_integrity_error(e))
+    return serialize(schemas.ArticleAdapter, updated)
 
 
-@router.delete("/{article_id}", response_model=schemas.Article, responses=schemas.HTTP_ERROR_RESPONSES)
-def delete_article(article_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    db_article = crud.get_article(db, article_id)
-    if db_article is None:
-        raise HTTPException(status_code=404, detail="Article not found")
-    if db_article.user_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not allowed to delete this article")
+@router.delete("/{article_id}", response_model=schemas.ArticleRead, responses=schemas.HTTP_ERROR_RESPONSES)
+async def delete_article(db: Database = Depends(get_database), db_article=Depends(deletable_article)):
     try:
-        deleted = crud.delete_article(db, article_id)
-        return deleted
+        deleted = await db.run(crud.delete_article, db_article)
     except IntegrityError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=parse_integrity_error(e))
+    return serialize(schemas.ArticleAdapter, deleted)
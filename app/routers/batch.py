@@ -0,0 +1,217 @@
+"""POST /batch: many /materials and /authors operations in one call.
+
+Sub-requests are dispatched in-process straight to the application's router
+(no HTTP parsing or per-request auth), with:
+
+- every operation charged to the rate limiter and admitted by the load
+  shedder as if it had been sent on its own, before any of them runs; the
+  first refusal rejects the whole batch (429 or 503 with Retry-After),
+- anonymous reads that do not share the batch's database handle coalesced
+  with identical in-flight GETs on the worker,
+- one credential check for the whole batch, reused by every sub-request,
+- one shared database handle for the operations that run in sequence,
+- `atomic=true`: the operations run in order inside one transaction; the
+  first failing one (status >= 400) rolls all writes back and the rest are
+  reported as 424 without being executed; once the transaction has
+  committed or rolled back, every key its writes published is evicted again
+  on this worker,
+- otherwise, runs of consecutive GETs execute concurrently (at most
+  BATCH_MAX_PARALLEL at a time, each on its own session since a session
+  cannot be shared between concurrent calls), and writes act as barriers.
+
+Results come back in request order.
+"""
+import asyncio
+import logging
+import math
+from typing import List, Optional
+
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.middleware.asyncexitstack import AsyncExitStackMiddleware
+from starlette.exceptions import HTTPException as StarletteHTTPException
+
+import app.schemas as schemas
+from app.core.bulkheads import get_bulkhead
+from app.core.config import BATCH_MAX_OPERATIONS, BATCH_MAX_PARALLEL, SHED_RETRY_AFTER
+from app.db.changes import PUBLISHED_KEYS, change_feed
+from app.db.database import SHARED_DATABASE, shared_database
+from app.deps import AUTHENTICATED_USER, get_current_user_optional
+from app.middleware.coalescing import CoalescingMiddleware
+from app.middleware.load_shedding import load_shedder
+from app.middleware.load_shedding import classify as shedding_class
+from app.middleware.rate_limit import rate_limiter
+from app.utils import _to_http_validation_error
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/batch", tags=["Batch"])
+
+ALLOWED_PREFIXES = ("/materials", "/authors")
+RESULT_HEADERS = (b"etag",)
+
+
+class _RollBack(Exception):
+    """Raised inside an atomic batch to roll its transaction back."""
+
+
+def _validate(operations: List[schemas.BatchOperation]):
+    if len(operations) > BATCH_MAX_OPERATIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=_to_http_validation_error(f"At most {BATCH_MAX_OPERATIONS} operations per batch", loc=["body", "operations"], type_="value_error"),
+        )
+    for i, op in enumerate(operations):
+        path = op.path.partition("?")[0]
+        # exports stream without bound, so they are not batchable
+        if not path.startswith(ALLOWED_PREFIXES) or path.rstrip("/").endswith("/export"):
+            raise HTTPException(
+                status_code=400,
+                detail=_to_http_validation_error(
+                    f"Path must be under {' or '.join(ALLOWED_PREFIXES)} and not an export", loc=["body", "operations", str(i), "path"], type_="value_error"
+                ),
+            )
+
+
+async def _admit(request: Request, operations: List[schemas.BatchOperation]):
+    for op in operations:
+        path, _, query = op.path.partition("?")
+        # the batch's own client and headers, so the same principal pays
+        wait = await rate_limiter.check({**request.scope, "method": op.method, "path": path, "query_string": query.encode()})
+        if wait:
+            raise HTTPException(status_code=429, detail="Too many requests, retry later", headers={"Retry-After": str(max(1, math.ceil(wait)))})
+        if not load_shedder.admit(shedding_class(op.method, path)):
+            raise HTTPException(
+                status_code=503, detail="Service overloaded, retry later", headers={"Retry-After": str(max(1, math.ceil(SHED_RETRY_AFTER)))}
+            )
+
+
+def _sub_scope(request: Request, op: schemas.BatchOperation, user, db) -> dict:
+    path, _, query = op.path.partition("?")
+    headers = [(b"accept", b"application/json")]
+    if op.body is not None:
+        headers.append((b"content-type", b"application/json"))
+    authorization = request.headers.get("authorization")
+    if user is not None and authorization:
+        # lets HTTPBasic pass; the credentials are not checked again
+        headers.append((b"authorization", authorization.encode("latin-1")))
+    scope = {
+        "type": "http",
+        "asgi": request.scope.get("asgi", {"version": "3.0"}),
+        "http_version": request.scope.get("http_version", "1.1"),
+        "method": op.method,
+        "scheme": request.scope.get("scheme", "http"),
+        "server": request.scope.get("server"),
+        "client": request.scope.get("client"),
+        "root_path": request.scope.get("root_path", ""),
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "headers": headers,
+        "app": request.scope["app"],
+        "state": {},
+        "starlette.exception_handlers": request.scope.get("starlette.exception_handlers"),
+    }
+    if user is not None:
+        scope[AUTHENTICATED_USER] = user
+    if db is not None:
+        scope[SHARED_DATABASE] = db
+    return scope
+
+
+async def _execute(request: Request, op: schemas.BatchOperation, user, db=None) -> schemas.BatchResult:
+    body = orjson.dumps(op.body) if op.body is not None else b""
+    received = False
+    start, chunks = {}, []
+
+    async def receive():
+        nonlocal received
+        if received:
+            return {"type": "http.disconnect"}
+        received = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            start.update(message)
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    # the stack FastAPI's own middleware would provide (closes uploaded files)
+    app = AsyncExitStackMiddleware(request.app.router)
+    if db is None:
+        # own session: sees only committed rows, like any other request
+        app = CoalescingMiddleware(app)
+    load_shedder.in_flight += 1
+    try:
+        await app(_sub_scope(request, op, user, db), receive, send)
+    except StarletteHTTPException as exc:
+        # raised by the router itself (unknown path, method not allowed)
+        return schemas.BatchResult(status=exc.status_code, body={"detail": exc.detail})
+    except Exception:
+        # what ServerErrorMiddleware would have answered; in atomic mode it also rolls back
+        logger.exception("Batch operation %s %s failed", op.method, op.path)
+        return schemas.BatchResult(status=500, body={"detail": "Internal Server Error"})
+    finally:
+        load_shedder.in_flight -= 1
+    headers = {name.decode(): value.decode() for name, value in start.get("headers", []) if name.lower() in RESULT_HEADERS}
+    content = b"".join(chunks)
+    try:
+        decoded = orjson.loads(content) if content else None
+    except orjson.JSONDecodeError:
+        decoded = content.decode(errors="replace")
+    return schemas.BatchResult(status=start["status"], headers=headers, body=decoded)
+
+
+async def _run_atomic(request, operations, user) -> schemas.BatchResponse:
+    results = []
+    db = None
+    try:
+        async with shared_database(get_bulkhead("write"), atomic=True) as db:
+            for i, op in enumerate(operations):
+                result = await _execute(request, op, user, db)
+                results.append(result)
+                if result.status >= 400:
+                    skipped = schemas.BatchResult(status=424, body={"detail": f"Not executed: operation {i} failed"})
+                    results.extend(skipped for _ in operations[i + 1:])
+                    raise _RollBack()
+    except _RollBack:
+        return schemas.BatchResponse(results=results, committed=False)
+    finally:
+        if db is not None:
+            # the writes evicted before the transaction ended, so reads in the
+            # batch (or elsewhere) may have cached uncommitted rows since
+            change_feed.replay(db.session.info.pop(PUBLISHED_KEYS, []))
+    return schemas.BatchResponse(results=results, committed=True)
+
+
+async def _run(request, operations, user) -> schemas.BatchResponse:
+    results: List[Optional[schemas.BatchResult]] = [None] * len(operations)
+    limit = asyncio.Semaphore(BATCH_MAX_PARALLEL)
+
+    async def read(i):
+        async with limit:
+            results[i] = await _execute(request, operations[i], user)
+
+    bulkhead = get_bulkhead("write" if any(op.method != "GET" for op in operations) else "read")
+    async with shared_database(bulkhead) as db:
+        reads = []
+        for i, op in enumerate(operations):
+            if op.method == "GET":
+                reads.append(i)
+                continue
+            await asyncio.gather(*(read(j) for j in reads))
+            reads = []
+            results[i] = await _execute(request, op, user, db)
+        await asyncio.gather(*(read(j) for j in reads))
+    return schemas.BatchResponse(results=results, committed=True)
+
+
+@router.post("", response_model=schemas.BatchResponse, responses=schemas.HTTP_ERROR_RESPONSES)
+async def run_batch(batch: schemas.BatchRequest, request: Request, current_user=Depends(get_current_user_optional)):
+    """Execute `operations` in-process and return one result per operation, in order."""
+    _validate(batch.operations)
+    await _admit(request, batch.operations)
+    if batch.atomic:
+        return await _run_atomic(request, batch.operations, current_user)
+    return await _run(request, batch.operations, current_user)
@@ -1,77 +1,96 @@
-from typing import List
+from typing import List, Union
 
 from fastapi import APIRouter, Depends, status, HTTPException, Query, Response, Request
-from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
-from app.utils import parse_integrity_error
-import requests
-from requests.exceptions import RequestException
+from app.utils import parse_integrity_error, paginate
+from app.responses import serialize, stream_export, entity_tag, collection_tag, etag_matches, not_modified
 from typing import Optional, Dict, Any
 
 import app.db.crud as crud
 import app.schemas as schemas
-from app.db.database import SessionLocal
-from app.deps import get_current_user, get_current_user_optional
+from app.core.bulkheads import BulkheadFull, get_bulkhead
+from app.db.database import Database, get_database
+from app.deps import get_current_user, get_current_user_optional, sparse_fields, FieldSelection, deny_access, ensure_visible, lookup_keys, read_many, ensure_author_exists, require_owner, export_pages
 
 router = APIRouter(prefix="/materials/books", tags=["Materials - Books"])
+# the caller's own book, resolved (and 404/403 answered) before the handler runs
+owned_book = require_owner("book", "book_id", "Book not found", "Not allowed to modify this book")
+deletable_book = require_owner("book", "book_id", "Book not found", "Not allowed to delete this book")
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-@router.get("", response_model=schemas.Pagination[schemas.Book], responses=schemas.HTTP_ERROR_RESPONSES)
-def read_books(
+@router.get("", response_model=Union[schemas.Pagination[schemas.BookRead], schemas.MultiGet[schemas.BookRead]], responses=schemas.HTTP_ERROR_RESPONSES)
+async def read_books(
     response: Response,
     request: Request,
-    db: Session = Depends(get_db),
+    db: Database = Depends(get_database),
     current_user=Depends(get_current_user_optional),
     title: str = Query(None, description="Filter by title"),
     author_name: str = Query(None, description="Filter by author name"),
     description: str = Query(None, description="Filter by description"),
     page: int = Query(1, ge=1, description="Page number"),
     page_size: int = Query(10, ge=1, le=100, description="Page size"),
+    view: FieldSelection = Depends(sparse_fields(schemas.BookRead)),
+    isbn: Optional[list] = Depends(lookup_keys("isbn", "ISBN-13s or ISBN-10s to fetch in one call, hyphens allowed (comma-separated or repeated)", schemas.normalize_isbn)),
+):
+    if isbn is not None:
+        return await read_many(request, db, "book", "isbn", isbn, schemas.BookRead, view, current_user)
+    if request.headers.get("if-none-match"):
+        versions, total = await db.run(crud.get_material_versions, "book", current_user, title=title, author_name=author_name, description=description, page=page, page_size=page_size)
+        etag = collection_tag(request, versions, total)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+    items, total = await db.run(crud.get_books, current_user, title=title, author_name=author_name, description=description, page=page, page_size=page_size, fields=view.fields)
+    etag = collection_tag(request, [(item.id, item.version) for item in items], total)
+    return serialize(view.page, paginate(request, items, total, page, page_size), etag=etag)
+
+
+@router.get("/export", responses=schemas.HTTP_ERROR_RESPONSES)
+async def export_books(
+    db: Database = Depends(get_database),
+    current_user=Depends(get_current_user_optional),
+    title: str = Query(None, description="Filter by title"),
+    author_name: str = Query(None, description="Filter by author name"),
+    description: str = Query(None, description="Filter by description"),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="Export format: ndjson or csv"),
+    view: FieldSelection = Depends(sparse_fields(schemas.BookRead)),
 ):
-    items, total = crud.get_books(db, current_user, title=title, author_name=author_name, description=description, page=page, page_size=page_size)
-    last_page = max(1, (total + page_size - 1) // page_size)
-    def _make_url(p: int):
-        return str(request.url.replace_query_params(page=p, page_size=page_size))
-    links = {
-        "first": _make_url(1),
-        "prev": _make_url(page - 1) if page > 1 else None,
-        "next": _make_url(page + 1) if page < last_page else None,
-        "last": _make_url(last_page),
-    }
-    return {
-        "items": items,
-        "total": total,
-        "page": page,
-        "page_size": page_size,
-        "links": links,
-    }
-
-
-@router.get("/{book_id}", response_model=schemas.Book, responses=schemas.HTTP_ERROR_RESPONSES)
-def read_book(
+    """Stream every visible book matching the filters, without pagination."""
+    pages = export_pages(db, "book", current_user, title=title, author_name=author_name, description=description, fields=view.fields)
+    return stream_export(pages, "books", format)
+
+
+@router.get("/{book_id}", response_model=schemas.BookRead, responses=schemas.HTTP_ERROR_RESPONSES)
+async def read_book(
     book_id: int,
-    db: Session = Depends(get_db),
+    request: Request,
+    db: Database = Depends(get_database),
     current_user=Depends(get_current_user_optional),
+    view: FieldSelection = Depends(sparse_fields(schemas.BookRead)),
 ):
-    db_book = crud.get_book(db, book_id)
+    entry = await db.run(crud.get_published_material, book_id, "book")
+    if entry is not None:
+        # published, so visible to everyone: served from the per-worker cache
+        etag = entity_tag(request, "book", book_id, entry.version)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        return serialize(view.item, entry.payload, etag=etag)
+    if request.headers.get("if-none-match"):
+        state = await db.run(crud.get_material_state, book_id, "book")
+        if state is None:
+            raise HTTPException(status_code=404, detail="Book not found")
+        ensure_visible(state, current_user, "Not allowed to view this book")
+        etag = entity_tag(request, "book", book_id, state.version)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+    # visibility (published or owner/root) is part of the lookup
+    db_book = await db.run(crud.get_book, book_id, fields=view.fields, viewer=current_user)
     if db_book is None:
-        raise HTTPException(status_code=404, detail="Book not found")
-    # enforce visibility: published or owner/root
-    if db_book.status != "published":
-        if current_user is None or (db_book.user_id != current_user.id and not getattr(current_user, "is_root", False)):
-            raise HTTPException(status_code=403, detail="Not allowed to view this book")
-    return db_book
+        await db.run(deny_access, "book", book_id, "Book not found", "Not allowed to view this book")
+    return serialize(view.item, db_book, etag=entity_tag(request, "book", book_id, db_book.version))
 
 
-@router.post("", response_model=schemas.Book, status_code=status.HTTP_201_CREATED, responses=schemas.HTTP_ERROR_RESPONSES)
-def create_book(book: schemas.BookCreate, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+@router.post("", response_model=schemas.BookRead, status_code=status.HTTP_201_CREATED, responses=schemas.HTTP_ERROR_RESPONSES)
+async def create_book(book: schemas.BookCreate, db: Database = Depends(get_database), current_user=Depends(get_current_user)):
     # Prefer incoming data: if caller provided both title and page_count, skip enrichment
     incoming = book.model_dump()
     has_title = bool(incoming.get("title"))
@@ -84,21 +103,26 @@ def create_book(book: schemas.BookCreate, db: Session = Depends(get_db), current
         isbn_val = incoming.get("isbn")
         if isbn_val:
             try:
-                meta = fetch_openlibrary_metadata(isbn_val)
+                # own bulkhead: a slow OpenLibrary only ties up enrichment threads
+                meta = await get_bulkhead("enrichment").run(fetch_openlibrary_metadata, isbn_val)
                 if meta:
                     # Only set fields that were not provided by caller
                     if not has_title and meta.get("title"):
                         book_data["title"] = meta.get("title")
                     if not has_page_count and meta.get("page_count") is not None:
                         book_data["page_count"] = int(meta.get("page_count"))
+            except BulkheadFull:
+                # too many lookups queued: answer 503 rather than create without enrichment
+                raise
             except Exception:
                 # enrichment failed; proceed with provided data
                 pass
 
     # Validate merged data and create
     book_obj = schemas.BookCreate.model_validate(book_data)
+    await db.run(ensure_author_exists, book_obj.author_id)
     try:
-        return crud.create_book(db, book_obj, current_user.id)
+        return serialize(schemas.BookAdapter, await db.run(crud.create_book, book_obj, current_user.id), status_code=status.HTTP_201_CREATED)
     except IntegrityError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=parse_integrity_error(e))
 
@@ -108,6 +132,10 @@ def fetch_openlibrary_metadata(isbn: str) -> Optional[Dict[str, Any]]:
 
     Returns None if no data found or on network error.
     """
+    # imported on first use: requests is only needed when a book gets enriched
+    import requests
+    from requests.exceptions import RequestException
+
     url = f"https://openlibrary.org/api/books?bibkeys=ISBN:{isbn}&jscmd=data&format=json"
     try:
         resp = requests.get(url, timeout=5)
@@ -128,29 +156,20 @@ def fetch_openlibrary_metadata(isbn: str) -> Optional[Dict[str, Any]]:
         return None
 
 
-@router.put("/{book_id}", response_model=schemas.Book, responses=schemas.HTTP_ERROR_RESPONSES)
-def update_book(book_id: int, book: schemas.BookUpdate, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    db_book = crud.get_book(db, book_id)
-    if db_book is None:
-        raise HTTPException(status_code=404, detail="Book not found")
-    if db_book.user_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not allowed to modify this book")
+@router.put("/{book_id}", response_model=schemas.BookRead, responses=schemas.HTTP_ERROR_RESPONSES)
+async def update_book(book: schemas.BookUpdate, db: Database = Depends(get_database), db_book=Depends(owned_book)):
+    await db.run(ensure_author_exists, book.author_id)
     try:
-        updated = crud.update_book(db, book_id, book.model_dump())
-        return updated
+        updated = await db.run(crud.update_book, db_book, book.model_dump())
     except IntegrityError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=parse_integrity_error(e))
+    return serialize(schemas.BookAdapter, updated)
 
 
-@router.delete("/{book_id}", response_model=schemas.Book, responses=schemas.HTTP_ERROR_RESPONSES)
-def delete_book(book_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    db_book = crud.get_book(db, book_id)
-    if db_book is None:
-        raise HTTPException(status_code=404, detail="Book not found")
-    if db_book.user_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not allowed to delete this book")
+@router.delete("/{book_id}", response_model=schemas.BookRead, responses=schemas.HTTP_ERROR_RESPONSES)
+async def delete_book(db: Database = Depends(get_database), db_book=Depends(deletable_book)):
     try:
-        deleted = crud.delete_book(db, book_id)
-        return deleted
+        deleted = await db.run(crud.delete_book, db_book)
     except IntegrityError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=parse_integrity_error(e))
+    return serialize(schemas.BookAdapter, deleted)
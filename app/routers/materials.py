@@ -1,67 +1,143 @@
-from typing import List
+from typing import List, Optional, Union
 
 from fastapi import APIRouter, Depends, HTTPException, status, Query, Response, Request
-from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 
 import app.db.crud as crud
+import app.core.similarity as similarity
 import app.schemas as schemas
-from app.utils import parse_integrity_error
-from app.db.database import SessionLocal
-from app.deps import get_current_user_optional
+from app.utils import parse_integrity_error, paginate
+from app.responses import serialize, stream_export, entity_tag, collection_tag, etag_matches, not_modified
+from app.db.database import Database, get_database
+from app.deps import get_current_user_optional, sparse_fields, FieldSelection, deny_access, ensure_visible, lookup_keys, read_many, export_pages
 
 router = APIRouter(prefix="/materials", tags=["Materials"])
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-@router.get("", response_model=schemas.Pagination[schemas.Material], responses=schemas.HTTP_ERROR_RESPONSES)
-def read_materials(
+@router.get("", response_model=Union[schemas.Pagination[schemas.MaterialRead], schemas.MultiGet[schemas.MaterialRead]], responses=schemas.HTTP_ERROR_RESPONSES)
+async def read_materials(
     response: Response,
     request: Request,
-    db: Session = Depends(get_db),
+    db: Database = Depends(get_database),
     current_user=Depends(get_current_user_optional),
     title: str = Query(None, description="Filter by title"),
     author_name: str = Query(None, description="Filter by author name"),
     description: str = Query(None, description="Filter by description"),
     page: int = Query(1, ge=1, description="Page number"),
     page_size: int = Query(10, ge=1, le=100, description="Page size"),
+    view: FieldSelection = Depends(sparse_fields(schemas.MaterialRead)),
+    ids: Optional[list] = Depends(lookup_keys("ids", "Material ids to fetch in one call (comma-separated or repeated)", int)),
+):
+    if ids is not None:
+        return await read_many(request, db, "material", "id", ids, schemas.MaterialRead, view, current_user)
+    if request.headers.get("if-none-match"):
+        versions, total = await db.run(crud.get_material_versions, "material", current_user, title=title, author_name=author_name, description=description, page=page, page_size=page_size)
+        etag = collection_tag(request, versions, total)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+    items, total = await db.run(crud.get_materials, current_user, title=title, author_name=author_name, description=description, page=page, page_size=page_size, fields=view.fields)
+    etag = collection_tag(request, [(item.id, item.version) for item in items], total)
+    return serialize(view.page, paginate(request, items, total, page, page_size), etag=etag)
+
+
+@router.get("/facets", response_model=schemas.MaterialFacets, responses=schemas.HTTP_ERROR_RESPONSES)
+async def read_material_facets(
+    db: Database = Depends(get_database),
+    current_user=Depends(get_current_user_optional),
+    title: str = Query(None, description="Filter by title"),
+    author_name: str = Query(None, description="Filter by author name"),
+    description: str = Query(None, description="Filter by description"),
+    authors: int = Query(10, ge=0, le=100, description="Number of authors in the author facet"),
 ):
-    items, total = crud.get_materials(db, current_user, title=title, author_name=author_name, description=description, page=page, page_size=page_size)
-    last_page = max(1, (total + page_size - 1) // page_size)
-    def _make_url(p: int):
-        return str(request.url.replace_query_params(page=p, page_size=page_size))
-    links = {
-        "first": _make_url(1),
-        "prev": _make_url(page - 1) if page > 1 else None,
-        "next": _make_url(page + 1) if page < last_page else None,
-        "last": _make_url(last_page),
-    }
-    return {
-        "items": items,
-        "total": total,
-        "page": page,
-        "page_size": page_size,
-        "links": links,
-    }
-
-
-@router.get("/{material_id}", response_model=schemas.Material, responses=schemas.HTTP_ERROR_RESPONSES)
-def read_material(
+    """Counts per type, status and author of the materials the same filters would list."""
+    facets = await db.run(crud.get_material_facets, current_user, title=title, author_name=author_name, description=description, authors=authors)
+    return serialize(schemas.MaterialFacetsAdapter, facets)
+
+
+@router.get("/autocomplete", response_model=schemas.Autocomplete, responses=schemas.HTTP_ERROR_RESPONSES)
+async def autocomplete(
+    db: Database = Depends(get_database),
+    q: str = Query(..., min_length=1, max_length=100, description="Prefix typed so far"),
+    limit: int = Query(10, ge=1, le=50, description="Completions per group"),
+):
+    """Complete published titles and author names from the in-memory prefix indexes."""
+    return serialize(schemas.AutocompleteAdapter, await db.run(crud.autocomplete, q, limit))
+
+
+@router.get("/fuzzy", response_model=schemas.FuzzySearch, responses=schemas.HTTP_ERROR_RESPONSES)
+async def fuzzy_search(
+    db: Database = Depends(get_database),
+    q: str = Query(..., min_length=1, max_length=100, description="Title or author name, possibly misspelled"),
+    limit: int = Query(10, ge=1, le=50, description="Matches per group"),
+):
+    """Typo-tolerant search over published titles and author names (trigram similarity)."""
+    return serialize(schemas.FuzzySearchAdapter, await db.run(crud.fuzzy_search, q, limit))
+
+
+@router.get("/export", responses=schemas.HTTP_ERROR_RESPONSES)
+async def export_materials(
+    db: Database = Depends(get_database),
+    current_user=Depends(get_current_user_optional),
+    title: str = Query(None, description="Filter by title"),
+    author_name: str = Query(None, description="Filter by author name"),
+    description: str = Query(None, description="Filter by description"),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="Export format: ndjson or csv"),
+    view: FieldSelection = Depends(sparse_fields(schemas.MaterialRead)),
+):
+    """Stream every visible material matching the filters, without pagination."""
+    pages = export_pages(db, "material", current_user, title=title, author_name=author_name, description=description, fields=view.fields)
+    return stream_export(pages, "materials", format)
+
+
+@router.get("/{material_id}", response_model=schemas.MaterialRead, responses=schemas.HTTP_ERROR_RESPONSES)
+async def read_material(
     material_id: int,
-    db: Session = Depends(get_db),
+    request: Request,
+    db: Database = Depends(get_database),
     current_user=Depends(get_current_user_optional),
+    view: FieldSelection = Depends(sparse_fields(schemas.MaterialRead)),
 ):
-    db_material = crud.get_material(db, material_id)
+    entry = await db.run(crud.get_published_material, material_id, "material")
+    if entry is not None:
+        # published, so visible to everyone: served from the per-worker cache
+        etag = entity_tag(request, "material", material_id, entry.version)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        return serialize(view.item, entry.payload, etag=etag)
+    if request.headers.get("if-none-match"):
+        state = await db.run(crud.get_material_state, material_id, "material")
+        if state is None:
+            raise HTTPException(status_code=404, detail="Material not found")
+        ensure_visible(state, current_user, "Not allowed to view this material")
+        etag = entity_tag(request, "material", material_id, state.version)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+    # visibility (published or owner/root) is part of the lookup
+    db_material = await db.run(crud.get_material, material_id, fields=view.fields, viewer=current_user)
     if db_material is None:
-        raise HTTPException(status_code=404, detail="Material not found")
-    # If not published, only owner or root may view
-    if db_material.status != "published":
-        if current_user is None or (db_material.user_id != current_user.id and not getattr(current_user, "is_root", False)):
-            raise HTTPException(status_code=403, detail="Not allowed to view this material")
-    return db_material
+        await db.run(deny_access, "material", material_id, "Material not found", "Not allowed to view this material")
+    return serialize(view.item, db_material, etag=entity_tag(request, "material", material_id, db_material.version))
+
+
+@router.get("/{material_id}/similar", response_model=schemas.SimilarMaterials, responses=schemas.HTTP_ERROR_RESPONSES)
+async def read_similar_materials(
+    material_id: int,
+    db: Database = Depends(get_database),
+    current_user=Depends(get_current_user_optional),
+    limit: int = Query(10, ge=1, le=50, description="Number of recommendations"),
+):
+    """Published materials most similar to this one (TF-IDF cosine similarity of titles and descriptions)."""
+    if not similarity.available():
+        raise HTTPException(status_code=503, detail="Recommendations are not available")
+    if not crud.similar_index_ready():
+        # built in the background (startup, or after a reset): never on the request path
+        raise HTTPException(status_code=503, detail="Recommendations are loading, retry shortly", headers={"Retry-After": "5"})
+    items = await db.run(crud.similar_materials, material_id, limit)
+    if items is None:
+        # not published: a draft is compared by its text, for those who may see it
+        db_material = await db.run(crud.get_material, material_id, viewer=current_user)
+        if db_material is None:
+            await db.run(deny_access, "material", material_id, "Material not found", "Not allowed to view this material")
+        text = crud.similarity_text(db_material.title, db_material.description)
+        items = await db.run(crud.similar_to_text, text, limit, material_id)
+    return serialize(schemas.SimilarMaterialsAdapter, {"items": items})
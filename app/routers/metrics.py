@@ -0,0 +1,13 @@
+from fastapi import APIRouter, Depends
+
+import app.schemas as schemas
+from app.core import metrics
+from app.deps import require_root
+
+router = APIRouter(prefix="/metrics", tags=["Metrics"])
+
+
+@router.get("", responses=schemas.HTTP_ERROR_RESPONSES)
+def read_metrics(current_user=Depends(require_root("Only the root user can view metrics"))):
+    """Cache hit rates and counters of the worker that serves the request."""
+    return metrics.snapshot()
@@ -1,104 +1,64 @@
 from typing import List
 
 from fastapi import APIRouter, Depends, HTTPException, status, Query, Response, Request
-from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
-from app.utils import parse_integrity_error
+from app.utils import parse_integrity_error, paginate
 
 import app.db.crud as crud
 import app.schemas as schemas
-from app.db.database import SessionLocal
-from app.deps import get_current_user
+from app.db.database import Database, get_database
+from app.deps import hash_password, require_root, require_self_or_root
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
+# Permission checks are dependencies, so a denied request never reaches the queries
+view_users = require_root("Only the root user can view users")
+manage_users = require_root("Only the root user can manage users")
+manage_self = require_self_or_root("Only the root or same user can manage users")
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
 
 @router.get("", response_model=schemas.Pagination[schemas.User], responses=schemas.HTTP_ERROR_RESPONSES)
-def read_users(response: Response, request: Request, db: Session = Depends(get_db), page: int = Query(1, ge=1), page_size: int = Query(10, ge=1, le=100), current_user=Depends(get_current_user)):
+async def read_users(response: Response, request: Request, db: Database = Depends(get_database), page: int = Query(1, ge=1), page_size: int = Query(10, ge=1, le=100), current_user=Depends(view_users)):
     # Efficient pagination using DB queries
-    q = db.query(crud.User)
-    total = q.count()
-    offset = (page - 1) * page_size
-    items = q.order_by(crud.User.id).limit(page_size).offset(offset).all()
-    last_page = max(1, (total + page_size - 1) // page_size)
-    # build links
-    def _make_url(p: int):
-        return str(request.url.replace_query_params(page=p, page_size=page_size))
-
-    # Only root may view full user list
-    if not getattr(current_user, "is_root", False):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only the root user can view users")
-
-    links = {
-        "first": _make_url(1),
-        "prev": _make_url(page - 1) if page > 1 else None,
-        "next": _make_url(page + 1) if page < last_page else None,
-        "last": _make_url(last_page),
-    }
-
-    return {
-        "items": items,
-        "total": total,
-        "page": page,
-        "page_size": page_size,
-        "links": links,
-    }
+    items, total = await db.run(crud.get_users_page, page, page_size)
+    return paginate(request, items, total, page, page_size)
 
 
 @router.get("/{user_id}", response_model=schemas.User, responses=schemas.HTTP_ERROR_RESPONSES)
-def read_user(user_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    # Only root may view user details
-    if not getattr(current_user, "is_root", False):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only the root user can view users")
-    db_user = crud.get_user(db, user_id)
+async def read_user(user_id: int, db: Database = Depends(get_database), current_user=Depends(view_users)):
+    db_user = await db.run(crud.get_user, user_id)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
     return db_user
 
 @router.post("", response_model=schemas.User, status_code=status.HTTP_201_CREATED, responses=schemas.HTTP_ERROR_RESPONSES)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    # Only the root user may perform user CRUD operations
-    if not getattr(current_user, "is_root", False):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only the root user can manage users")
+async def create_user(user: schemas.UserCreate, db: Database = Depends(get_database), current_user=Depends(manage_users)):
     try:
-        return crud.create_user(db, user)
+        return await db.run(crud.create_user, user, await hash_password(user.password))
     except IntegrityError as e:
         # translate DB constraint errors to HTTP 400
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=parse_integrity_error(e))
 
 
 @router.put("/{user_id}", response_model=schemas.User, responses=schemas.HTTP_ERROR_RESPONSES)
-def update_user(user_id: int, user: schemas.UserCreate, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    # Only root or same user can update an user
-    if not getattr(current_user, "is_root", False) and user_id != current_user.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only the root or same user can manage users")
-    db_user = crud.get_user(db, user_id)
-    if db_user is None:
-        raise HTTPException(status_code=404, detail="User not found")
+async def update_user(user_id: int, user: schemas.UserCreate, db: Database = Depends(get_database), current_user=Depends(manage_self)):
+    data = user.model_dump(exclude_none=True)
+    password_hash = await hash_password(data["password"]) if data.get("password") else None
     try:
-        updated = crud.update_user(db, user_id, user.model_dump(exclude_none=True))
-        return updated
+        updated = await db.run(crud.update_user, user_id, data, password_hash)
     except IntegrityError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=parse_integrity_error(e))
+    if updated is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return updated
 
 
 @router.delete("/{user_id}", response_model=schemas.User, responses=schemas.HTTP_ERROR_RESPONSES)
-def delete_user(user_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    # Only root or same user can delete an user
-    if not getattr(current_user, "is_root", False) and user_id != current_user.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only the root or same user can manage users")
-    db_user = crud.get_user(db, user_id)
-    if db_user is None:
-        raise HTTPException(status_code=404, detail="User not found")
+async def delete_user(user_id: int, db: Database = Depends(get_database), current_user=Depends(manage_self)):
     try:
-        deleted = crud.delete_user(db, user_id)
-        return deleted
+        deleted = await db.run(crud.delete_user, user_id)
     except IntegrityError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=parse_integrity_error(e))
+    if deleted is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return deleted
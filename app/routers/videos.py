@@ -1,102 +1,112 @@
 from typing import List
 
 from fastapi import APIRouter, Depends, status, HTTPException, Query, Response, Request
-from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
-from app.utils import parse_integrity_error
+from app.utils import parse_integrity_error, paginate
+from app.responses import serialize, stream_export, entity_tag, collection_tag, etag_matches, not_modified
 
 import app.db.crud as crud
 import app.schemas as schemas
-from app.db.database import SessionLocal
-from app.deps import get_current_user, get_current_user_optional
+from app.db.database import Database, get_database
+from app.deps import get_current_user, get_current_user_optional, sparse_fields, FieldSelection, deny_access, ensure_visible, ensure_author_exists, require_owner, export_pages
 
 router = APIRouter(prefix="/materials/videos", tags=["Materials - Videos"])
+# the caller's own video, resolved (and 404/403 answered) before the handler runs
+owned_video = require_owner("video", "video_id", "Video not found", "Not allowed to modify this video")
+deletable_video = require_owner("video", "video_id", "Video not found", "Not allowed to delete this video")
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-@router.get("", response_model=schemas.Pagination[schemas.Video], responses=schemas.HTTP_ERROR_RESPONSES)
-def read_videos(
+@router.get("", response_model=schemas.Pagination[schemas.VideoRead], responses=schemas.HTTP_ERROR_RESPONSES)
+async def read_videos(
     response: Response,
     request: Request,
-    db: Session = Depends(get_db),
+    db: Database = Depends(get_database),
     current_user=Depends(get_current_user_optional),
     title: str = Query(None, description="Filter by title"),
     author_name: str = Query(None, description="Filter by author name"),
     description: str = Query(None, description="Filter by description"),
     page: int = Query(1, ge=1, description="Page number"),
     page_size: int = Query(10, ge=1, le=100, description="Page size"),
+    view: FieldSelection = Depends(sparse_fields(schemas.VideoRead)),
+):
+    if request.headers.get("if-none-match"):
+        versions, total = await db.run(crud.get_material_versions, "video", current_user, title=title, author_name=author_name, description=description, page=page, page_size=page_size)
+        etag = collection_tag(request, versions, total)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+    items, total = await db.run(crud.get_videos, current_user, title=title, author_name=author_name, description=description, page=page, page_size=page_size, fields=view.fields)
+    etag = collection_tag(request, [(item.id, item.version) for item in items], total)
+    return serialize(view.page, paginate(request, items, total, page, page_size), etag=etag)
+
+
+@router.get("/export", responses=schemas.HTTP_ERROR_RESPONSES)
+async def export_videos(
+    db: Database = Depends(get_database),
+    current_user=Depends(get_current_user_optional),
+    title: str = Query(None, description="Filter by title"),
+    author_name: str = Query(None, description="Filter by author name"),
+    description: str = Query(None, description="Filter by description"),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="Export format: ndjson or csv"),
+    view: FieldSelection = Depends(sparse_fields(schemas.VideoRead)),
 ):
-    items, total = crud.get_videos(db, current_user, title=title, author_name=author_name, description=description, page=page, page_size=page_size)
-    last_page = max(1, (total + page_size - 1) // page_size)
-    def _make_url(p: int):
-        return str(request.url.replace_query_params(page=p, page_size=page_size))
-    links = {
-        "first": _make_url(1),
-        "prev": _make_url(page - 1) if page > 1 else None,
-        "next": _make_url(page + 1) if page < last_page else None,
-        "last": _make_url(last_page),
-    }
-    return {
-        "items": items,
-        "total": total,
-        "page": page,
-        "page_size": page_size,
-        "links": links,
-    }
+    """Stream every visible video matching the filters, without pagination."""
+    pages = export_pages(db, "video", current_user, title=title, author_name=author_name, description=description, fields=view.fields)
+    return stream_export(pages, "videos", format)
 
 
-@router.get("/{video_id}", response_model=schemas.Video, responses=schemas.HTTP_ERROR_RESPONSES)
-def read_video(
+@router.get("/{video_id}", response_model=schemas.VideoRead, responses=schemas.HTTP_ERROR_RESPONSES)
+async def read_video(
     video_id: int,
-    db: Session = Depends(get_db),
+    request: Request,
+    db: Database = Depends(get_database),
     current_user=Depends(get_current_user_optional),
+    view: FieldSelection = Depends(sparse_fields(schemas.VideoRead)),
 ):
-    db_video = crud.get_video(db, video_id)
+    entry = await db.run(crud.get_published_material, video_id, "video")
+    if entry is not None:
+        # published, so visible to everyone: served from the per-worker cache
+        etag = entity_tag(request, "video", video_id, entry.version)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        return serialize(view.item, entry.payload, etag=etag)
+    if request.headers.get("if-none-match"):
+        state = await db.run(crud.get_material_state, video_id, "video")
+        if state is None:
+            raise HTTPException(status_code=404, detail="Video not found")
+        ensure_visible(state, current_user, "Not allowed to view this video")
+        etag = entity_tag(request, "video", video_id, state.version)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+    # visibility (published or owner/root) is part of the lookup
+    db_video = await db.run(crud.get_video, video_id, fields=view.fields, viewer=current_user)
     if db_video is None:
-        raise HTTPException(status_code=404, detail="Video not found")
-    if db_video.status != "published":
-        if current_user is None or (db_video.user_id != current_user.id and not getattr(current_user, "is_root", False)):
-            raise HTTPException(status_code=403, detail="Not allowed to view this video")
-    return db_video
+        await db.run(deny_access, "video", video_id, "Video not found", "Not allowed to view this video")
+    return serialize(view.item, db_video, etag=entity_tag(request, "video", video_id, db_video.version))
 
 
-@router.post("", response_model=schemas.Video, status_code=status.HTTP_201_CREATED, responses=schemas.HTTP_ERROR_RESPONSES)
-def create_video(video: schemas.VideoCreate, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+@router.post("", response_model=schemas.VideoRead, status_code=status.HTTP_201_CREATED, responses=schemas.HTTP_ERROR_RESPONSES)
+async def create_video(video: schemas.VideoCreate, db: Database = Depends(get_database), current_user=Depends(get_current_user)):
+    await db.run(ensure_author_exists, video.author_id)
     try:
-        return crud.create_video(db, video, current_user.id)
+        return serialize(schemas.VideoAdapter, await db.run(crud.create_video, video, current_user.id), status_code=status.HTTP_201_CREATED)
     except IntegrityError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=parse_integrity_error(e))
 
 
-@router.put("/{video_id}", response_model=schemas.Video, responses=schemas.HTTP_ERROR_RESPONSES)
-def update_video(video_id: int, video: schemas.VideoCreate, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    db_video = crud.get_video(db, video_id)
-    if db_video is None:
-        raise HTTPException(status_code=404, detail="Video not found")
-    if db_video.user_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not allowed to modify this video")
+@router.put("/{video_id}", response_model=schemas.VideoRead, responses=schemas.HTTP_ERROR_RESPONSES)
+async def update_video(video: schemas.VideoCreate, db: Database = Depends(get_database), db_video=Depends(owned_video)):
+    await db.run(ensure_author_exists, video.author_id)
     try:
-        updated = crud.update_video(db, video_id, video.model_dump())
-        return updated
+        updated = await db.run(crud.update_video, db_video, video.model_dump())
     except IntegrityError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=parse_integrity_error(e))
+    return serialize(schemas.VideoAdapter, updated)
 
 
-@router.delete("/{video_id}", response_model=schemas.Video, responses=schemas.HTTP_ERROR_RESPONSES)
-def delete_video(video_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    db_video = crud.get_video(db, video_id)
-    if db_video is None:
-        raise HTTPException(status_code=404, detail="Video not found")
-    if db_video.user_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not allowed to delete this video")
+@router.delete("/{video_id}", response_model=schemas.VideoRead, responses=schemas.HTTP_ERROR_RESPONSES)
+async def delete_video(db: Database = Depends(get_database), db_video=Depends(deletable_video)):
     try:
-        deleted = crud.delete_video(db, video_id)
-        return deleted
+        deleted = await db.run(crud.delete_video, db_video)
     except IntegrityError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=parse_integrity_error(e))
+    return serialize(schemas.VideoAdapter, deleted)
@@ -1,6 +1,7 @@
 from datetime import date
-from typing import Annotated, TypeVar, Generic, Optional, Dict, List
-from pydantic import BaseModel, EmailStr, PositiveInt, PastDate, model_validator, Field
+from functools import lru_cache
+from typing import Annotated, Any, TypeVar, Generic, Literal, Optional, Dict, List, Tuple, Union
+from pydantic import BaseModel, EmailStr, PositiveInt, PastDate, model_validator, Field, TypeAdapter, ConfigDict, create_model
 from pydantic.generics import GenericModel
 import re
 
@@ -16,6 +17,13 @@ class Pagination(GenericModel, Generic[T]):
 	page_size: int
 	links: Dict[str, Optional[str]]
 
+
+class MultiGet(GenericModel, Generic[T]):
+	"""Batch lookup result: the visible items in request order plus the keys that matched nothing or are not visible."""
+	items: List[T]
+	missing: List[Union[int, str]]
+	forbidden: List[Union[int, str]]
+
 #########################################
 # Error schemas used in route responses
 class ErrorItem(BaseModel):
@@ -37,6 +45,7 @@ HTTP_ERROR_RESPONSES = {
 	400: {"model": ValidationErrorResponse, "description": "Bad Request (validation or integrity error)"},
 	403: {"model": SimpleError, "description": "Forbidden"},
 	404: {"model": SimpleError, "description": "Not Found"},
+	409: {"model": SimpleError, "description": "Conflict (modified concurrently)"},
 }
 
 ##################
@@ -89,6 +98,26 @@ class Material(MaterialBase):
 		orm_mode = True
 
 
+def _isbn13_check_digit(digits: str) -> int:
+	return (10 - sum(int(d) * (1 if i % 2 == 0 else 3) for i, d in enumerate(digits[:12])) % 10) % 10
+
+
+def normalize_isbn(value: str) -> str:
+	"""Return the stored 13-digit form of an ISBN-10 or ISBN-13, with or without hyphens/spaces.
+
+	Raises ValueError when `value` is not a valid ISBN of either form.
+	"""
+	isbn = value.replace("-", "").replace(" ", "").upper()
+	if len(isbn) == 10 and isbn[:9].isdigit() and (isbn[9].isdigit() or isbn[9] == "X"):
+		checksum = sum((10 - i) * int(d) for i, d in enumerate(isbn[:9])) + (10 if isbn[9] == "X" else int(isbn[9]))
+		if checksum % 11 == 0:
+			isbn = "978" + isbn[:9]
+			return isbn + str(_isbn13_check_digit(isbn))
+	elif len(isbn) == 13 and isbn.isdigit() and _isbn13_check_digit(isbn) == int(isbn[-1]):
+		return isbn
+	raise ValueError(f"Invalid ISBN: {value}")
+
+
 class BookBase(MaterialBase):
 	isbn: Annotated[str, Field(description="ISBN of the book", example="9780980200447")]
 	page_count: Annotated[PositiveInt, Field(description="Number of pages in the book")]
@@ -97,11 +126,8 @@ class BookBase(MaterialBase):
 	def validate_isbn(cls, values):
 		isbn = values.get("isbn") if isinstance(values, dict) else getattr(values, "isbn", None)
 		# Check ISBN-13 validity
-		if len(isbn) == 13 and isbn.isdigit():
-			checksum = sum(int(d) * (1 if i % 2 == 0 else 3) for i, d in enumerate(isbn[:-1]))
-			checksum = (10 - (checksum % 10)) % 10
-			if checksum == int(isbn[-1]):
-				return values
+		if len(isbn) == 13 and isbn.isdigit() and _isbn13_check_digit(isbn) == int(isbn[-1]):
+			return values
 		raise ValueError("Invalid ISBN-13")
 
 class BookCreate(BookBase):
@@ -233,3 +259,194 @@ class AuthorInstitution(AuthorInstitutionBase):
 	id: Annotated[PositiveInt, Field(description="Institution's author unique identifier")]
 	class Config:
 		orm_mode = True
+
+
+##################
+# Read Schemas
+# Response-only shapes. They carry no input validators (status/ISBN/DOI checks),
+# because everything read back from the database was validated when written.
+class MaterialRead(BaseModel):
+	title: str = Field(description="Title of the material")
+	description: Optional[str] = Field(default=None, description="A short description of the material.")
+	status: str = Field(description='Status of the material: "draft", "published" or "filed"')
+	author_id: int = Field(description="ID of the material's author")
+	id: int = Field(description="Material unique identifier")
+	user_id: int = Field(description="ID of user who created the material")
+	type: str = Field(description="Type of the material", examples=["book", "article", "video"])
+	class Config:
+		from_attributes = True
+
+
+class BookRead(BaseModel):
+	title: str = Field(description="Title of the book")
+	description: Optional[str] = Field(default=None, description="A short description of the book.")
+	status: str = Field(description='Status of the book: "draft", "published" or "filed"')
+	author_id: int = Field(description="ID of the book's author")
+	isbn: str = Field(description="ISBN of the book")
+	page_count: int = Field(description="Number of pages in the book")
+	id: int = Field(description="Book's material unique identifier")
+	user_id: int = Field(description="ID of the user who added the book")
+	class Config:
+		from_attributes = True
+
+
+class ArticleRead(BaseModel):
+	title: str = Field(description="Title of the article")
+	description: Optional[str] = Field(default=None, description="A short description of the article.")
+	status: str = Field(description='Status of the article: "draft", "published" or "filed"')
+	author_id: int = Field(description="ID of the article's author")
+	doi: str = Field(description="Digital Object Identifier of the article")
+	id: int = Field(description="Article's material unique identifier")
+	user_id: int = Field(description="ID of the user who added the article")
+	class Config:
+		from_attributes = True
+
+
+class VideoRead(BaseModel):
+	title: str = Field(description="Title of the video")
+	description: Optional[str] = Field(default=None, description="A short description of the video.")
+	status: str = Field(description='Status of the video: "draft", "published" or "filed"')
+	author_id: int = Field(description="ID of the video's author")
+	duration: int = Field(description="Duration of the video in minutes")
+	id: int = Field(description="Video's material unique identifier")
+	user_id: int = Field(description="ID of the user who added the video")
+	class Config:
+		from_attributes = True
+
+
+class AuthorRead(BaseModel):
+	name: str = Field(description="Author name")
+	id: int = Field(description="Author unique identifier")
+	type: str = Field(description="Type of the author", examples=["person", "institution"])
+	class Config:
+		from_attributes = True
+
+
+class AuthorPersonRead(BaseModel):
+	name: str = Field(description="Name of the person")
+	birth_date: date = Field(description="Birth date with YYYY-MM-DD format")
+	id: int = Field(description="Person's author unique identifier")
+	class Config:
+		from_attributes = True
+
+
+class AuthorInstitutionRead(BaseModel):
+	name: str = Field(description="Name of the institution")
+	city: str = Field(description="City where the institution is located")
+	id: int = Field(description="Institution's author unique identifier")
+	class Config:
+		from_attributes = True
+
+##################
+# Batch Schemas
+class BatchOperation(BaseModel):
+	method: Literal["GET", "POST", "PUT", "DELETE"] = Field(description="HTTP method of the sub-request")
+	path: str = Field(description="Path (and query) under /materials or /authors", examples=["/materials/books/1"])
+	body: Optional[Any] = Field(default=None, description="JSON body for POST/PUT")
+
+
+class BatchRequest(BaseModel):
+	operations: List[BatchOperation] = Field(min_length=1, description="Sub-requests, executed in order")
+	atomic: bool = Field(default=False, description="All-or-nothing: roll every write back if any operation fails")
+
+
+class BatchResult(BaseModel):
+	status: int = Field(description="HTTP status of the sub-request")
+	headers: Dict[str, str] = Field(default_factory=dict, description="Selected response headers (ETag)")
+	body: Optional[Any] = Field(default=None, description="Decoded response body")
+
+
+class BatchResponse(BaseModel):
+	results: List[BatchResult]
+	committed: bool = Field(description="False when an atomic batch was rolled back")
+
+
+##################
+# Facet Schemas
+class AuthorFacet(BaseModel):
+	id: int = Field(description="Author unique identifier")
+	name: str = Field(description="Author name")
+	count: int = Field(description="Matching materials by this author")
+
+
+class MaterialFacets(BaseModel):
+	total: int = Field(description="Matching materials")
+	type: Dict[str, int] = Field(description="Matching materials per type", examples=[{"book": 3, "video": 1}])
+	status: Dict[str, int] = Field(description="Matching materials per status", examples=[{"published": 4}])
+	author: List[AuthorFacet] = Field(description="Authors with the most matching materials, most first")
+
+
+##################
+# Autocomplete Schemas
+class Completion(BaseModel):
+	id: int = Field(description="Material or author unique identifier")
+	text: str = Field(description="Completed title or author name")
+	type: str = Field(description="Material or author type", examples=["book", "person"])
+
+
+class Autocomplete(BaseModel):
+	titles: List[Completion] = Field(description="Published materials whose title matches the prefix")
+	authors: List[Completion] = Field(description="Authors whose name matches the prefix")
+
+
+class FuzzyMatch(Completion):
+	score: float = Field(description="Share of the query's trigrams found in the text (0-1)")
+
+
+class FuzzySearch(BaseModel):
+	titles: List[FuzzyMatch] = Field(description="Published materials with a similar title, best first")
+	authors: List[FuzzyMatch] = Field(description="Authors with a similar name, best first")
+
+
+class SimilarMaterial(Completion):
+	score: float = Field(description="Cosine similarity of the two materials' TF-IDF vectors (0-1)")
+
+
+class SimilarMaterials(BaseModel):
+	items: List[SimilarMaterial] = Field(description="Published materials with similar titles and descriptions, most similar first")
+
+
+#########################################################
+# Pre-built adapters used by the routers to serialize responses.
+# Building a TypeAdapter compiles its core schema, so it is done once per
+# (schema, fieldset) and cached.
+@lru_cache(maxsize=256)
+def _read_model(model, fields: Optional[Tuple[str, ...]] = None):
+	# with `fields`, a derived model holding only those fields (sparse fieldsets)
+	if fields is None:
+		return model
+	return create_model(
+		f"{model.__name__}Fields",
+		__config__=ConfigDict(from_attributes=True),
+		**{name: (model.model_fields[name].annotation, model.model_fields[name]) for name in fields},
+	)
+
+
+@lru_cache(maxsize=256)
+def read_adapters(model, fields: Optional[Tuple[str, ...]] = None) -> Tuple[TypeAdapter, TypeAdapter]:
+	"""Return (item, page) adapters for a read schema.
+
+	With `fields`, the adapters serialize a derived model holding only those
+	fields (sparse fieldsets); otherwise the full schema.
+	"""
+	model = _read_model(model, fields)
+	return TypeAdapter(model), TypeAdapter(Pagination[model])
+
+
+@lru_cache(maxsize=256)
+def multi_get_adapter(model, fields: Optional[Tuple[str, ...]] = None) -> TypeAdapter:
+	"""Adapter for the `MultiGet` envelope of a read schema (and optional fieldset)."""
+	return TypeAdapter(MultiGet[_read_model(model, fields)])
+
+
+MaterialAdapter, MaterialPageAdapter = read_adapters(MaterialRead)
+BookAdapter, BookPageAdapter = read_adapters(BookRead)
+ArticleAdapter, ArticlePageAdapter = read_adapters(ArticleRead)
+VideoAdapter, VideoPageAdapter = read_adapters(VideoRead)
+AuthorAdapter, AuthorPageAdapter = read_adapters(AuthorRead)
+AuthorPersonAdapter, AuthorPersonPageAdapter = read_adapters(AuthorPersonRead)
+AuthorInstitutionAdapter, AuthorInstitutionPageAdapter = read_adapters(AuthorInstitutionRead)
+MaterialFacetsAdapter = TypeAdapter(MaterialFacets)
+AutocompleteAdapter = TypeAdapter(Autocomplete)
+FuzzySearchAdapter = TypeAdapter(FuzzySearch)
+SimilarMaterialsAdapter = TypeAdapter(SimilarMaterials)
@@ -0,0 +1,231 @@
+"""Production server: a pre-forking supervisor around uvicorn.
+
+    python -m app.server [--host 0.0.0.0] [--port 8000] [--workers N]
+
+The application is imported once in the supervisor and the workers are
+forked from it, so the interpreter, the imported modules and everything built
+at import time are shared copy-on-write instead of being rebuilt per worker.
+The supervisor binds the listening socket and every worker accepts on it.
+
+The worker count defaults to WEB_CONCURRENCY, else one per CPU, capped so
+that workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) fits in DB_CONNECTION_BUDGET.
+uvloop and httptools are used when installed.
+
+Signals to the supervisor:
+  SIGHUP           rolling restart: start a fresh worker, then stop an old
+                   one, one at a time, so the socket is always served
+  SIGTERM/SIGINT   graceful shutdown: workers finish in-flight requests
+Workers that die unexpectedly are replaced. A worker that dies within
+`min_uptime` seconds of starting counts as a boot failure: replacements then
+wait `backoff_base` seconds, doubling per consecutive boot failure up to
+`backoff_max`, and after `max_boot_failures` in a row the supervisor stops
+and exits with status 1 (bad configuration, database down) instead of
+forking in a tight loop. Because the app is preloaded, code changes need a
+supervisor restart, not SIGHUP.
+"""
+import argparse
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+import uvicorn
+
+from app.core.config import DB_CONNECTION_BUDGET, DB_MAX_OVERFLOW, DB_POOL_SIZE
+
+logger = logging.getLogger("app.server")
+
+
+def worker_count(cpus: int = None, pool_size: int = DB_POOL_SIZE, max_overflow: int = DB_MAX_OVERFLOW, budget: int = DB_CONNECTION_BUDGET) -> int:
+    """Workers to run: WEB_CONCURRENCY, else one per CPU, within the DB connection budget."""
+    requested = os.getenv("WEB_CONCURRENCY")
+    if requested:
+        return max(1, int(requested))
+    if cpus is None:
+        cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+    per_worker = max(1, pool_size + max_overflow)
+    return max(1, min(cpus, budget // per_worker))
+
+
+def _available(module: str) -> bool:
+    try:
+        __import__(module)
+        return True
+    except ImportError:
+        return False
+
+
+class Supervisor:
+    def __init__(
+        self,
+        app,
+        host: str,
+        port: int,
+        workers: int,
+        graceful_timeout: float = 30.0,
+        min_uptime: float = 10.0,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+        max_boot_failures: int = 10,
+    ):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.graceful_timeout = graceful_timeout
+        self.min_uptime = min_uptime
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_boot_failures = max_boot_failures
+        self.loop = "uvloop" if _available("uvloop") else "asyncio"
+        self.http = "httptools" if _available("httptools") else "h11"
+        self.children = {}  # pid -> start time (monotonic)
+        self.boot_failures = 0
+        self.respawn_at = 0.0
+        self._signals = []
+        self.socket = None
+
+    def _bind(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(2048)
+        sock.set_inheritable(True)
+        return sock
+
+    def _spawn(self) -> int:
+        pid = os.fork()
+        if pid:
+            self.children[pid] = time.monotonic()
+            return pid
+        # worker process
+        for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, signal.SIG_DFL)
+        from app.db.database import engine
+
+        # never reuse connections inherited from the supervisor
+        engine.dispose(close=False)
+        config = uvicorn.Config(
+            self.app,
+            loop=self.loop,
+            http=self.http,
+            lifespan="on",
+            timeout_graceful_shutdown=self.graceful_timeout,
+            log_level="info",
+        )
+        try:
+            uvicorn.Server(config).run(sockets=[self.socket])
+        finally:
+            os._exit(0)
+
+    def _stop(self, pid: int):
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    def _wait(self, pid: int):
+        deadline = time.monotonic() + self.graceful_timeout + 5
+        while time.monotonic() < deadline:
+            try:
+                done, _ = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if done:
+                break
+            time.sleep(0.1)
+        else:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        self.children.pop(pid, None)
+
+    def _reap(self) -> list:
+        """Collect workers that exited on their own; return how long each had run."""
+        uptimes = []
+        while self.children:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if not pid:
+                break
+            if pid in self.children:
+                uptimes.append(time.monotonic() - self.children.pop(pid))
+        return uptimes
+
+    def _exited(self, uptimes, now: float) -> bool:
+        """Schedule replacements for workers that ran `uptimes` seconds; False to give up."""
+        for uptime in uptimes:
+            self.boot_failures = self.boot_failures + 1 if uptime < self.min_uptime else 0
+        if not self.boot_failures:
+            logger.warning("%d worker(s) exited unexpectedly; starting replacements", len(uptimes))
+            return True
+        if self.boot_failures >= self.max_boot_failures:
+            logger.error("Workers exited within %.0fs of starting %d times in a row; giving up", self.min_uptime, self.boot_failures)
+            return False
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (self.boot_failures - 1))
+        self.respawn_at = now + delay
+        logger.warning("Worker exited %.1fs after starting; starting a replacement in %.1fs", min(uptimes), delay)
+        return True
+
+    def _rolling_restart(self):
+        logger.info("SIGHUP: restarting %d workers", len(self.children))
+        for old in list(self.children):
+            self._spawn()
+            self._stop(old)
+            self._wait(old)
+
+    def _shutdown(self):
+        logger.info("Shutting down %d workers", len(self.children))
+        for pid in list(self.children):
+            self._stop(pid)
+        for pid in list(self.children):
+            self._wait(pid)
+
+    def run(self):
+        self.socket = self._bind()
+        logger.info(
+            "Serving on %s:%d with %d workers (cpus=%s, db pool %d+%d of budget %d, loop=%s, http=%s, pid=%d)",
+            self.host, self.port, self.workers, os.cpu_count(), DB_POOL_SIZE, DB_MAX_OVERFLOW,
+            DB_CONNECTION_BUDGET, self.loop, self.http, os.getpid(),
+        )
+        for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, lambda signum, frame: self._signals.append(signum))
+        for _ in range(self.workers):
+            self._spawn()
+        while True:
+            if self._signals:
+                signum = self._signals.pop(0)
+                if signum == signal.SIGHUP:
+                    self._rolling_restart()
+                    continue
+                self._shutdown()
+                return 0
+            uptimes = self._reap()
+            if uptimes and not self._exited(uptimes, time.monotonic()):
+                self._shutdown()
+                return 1
+            if len(self.children) < self.workers and time.monotonic() >= self.respawn_at:
+                for _ in range(self.workers - len(self.children)):
+                    self._spawn()
+            time.sleep(0.5)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the API with pre-forked uvicorn workers.")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=None, help="default: sized from CPUs and the DB connection budget")
+    parser.add_argument("--graceful-timeout", type=float, default=30.0)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+
+    from app.main import app  # preload: imported once, shared copy-on-write by the workers
+
+    return Supervisor(app, args.host, args.port, args.workers or worker_count(), args.graceful_timeout).run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
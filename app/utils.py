@@ -39,4 +39,28 @@ def parse_integrity_error(err: IntegrityError) -> dict:
         return _to_http_validation_error("Foreign key constraint failed: referenced resource not found", type_="value_error.foreign_key")
 
     # Fallback: wrap the original message
-    return _to_http_validation_error(msg, type_="value_error")
\ No newline at end of file
+    return _to_http_validation_error(msg, type_="value_error")
+
+def paginate(request, items, total: int, page: int, page_size: int) -> dict:
+    """Build the `Pagination` envelope (items, total, page, page_size, links).
+
+    Links keep the request's filters and `fields` and only swap the page.
+    """
+    last_page = max(1, (total + page_size - 1) // page_size)
+
+    def _make_url(p: int):
+        return str(request.url.include_query_params(page=p, page_size=page_size))
+
+    links = {
+        "first": _make_url(1),
+        "prev": _make_url(page - 1) if page > 1 else None,
+        "next": _make_url(page + 1) if page < last_page else None,
+        "last": _make_url(last_page),
+    }
+    return {
+        "items": items,
+        "total": total,
+        "page": page,
+        "page_size": page_size,
+        "links": links,
+    }
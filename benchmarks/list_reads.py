@@ -0,0 +1,129 @@
+"""Benchmark the list-endpoint read path: ORM instances vs Core rows.
+
+Seeds a throwaway database with books and compares, for one 100-item page,
+the previous ORM query path (`db.query(Book)...all()`) against the row-based
+`crud.get_books`. Both results are serialized the same way the router does it
+(read-schema adapter, then `dump_json`), so the numbers cover the whole
+request minus HTTP. The anonymous search cache is cleared before every row
+fetch, so each one runs the count and the row select instead of a cache hit.
+
+Usage:
+    python -m benchmarks.list_reads [--rows 5000] [--page-size 100] [--iterations 200]
+
+Set BENCH_DATABASE_URL to run against another database (default: in-memory
+SQLite). Point it at a throwaway database: all tables are dropped and recreated.
+"""
+import argparse
+import os
+import time
+import tracemalloc
+from datetime import date
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import app.db.crud as crud
+import app.schemas as schemas
+from app.db.database import Base
+from app.db.models import AuthorPerson, Book, User
+
+
+def _isbn13(n: int) -> str:
+    base = str(978000000000 + n)[-12:]
+    checksum = sum(int(d) * (1 if i % 2 == 0 else 3) for i, d in enumerate(base))
+    return base + str((10 - (checksum % 10)) % 10)
+
+
+def _seed(Session, rows: int):
+    with Session() as db:
+        user = User(email="bench@example.com", password="x", is_root=False)
+        author = AuthorPerson(name="Bench Author", birth_date=date(1970, 1, 1))
+        db.add_all([user, author])
+        db.flush()
+        db.add_all([
+            Book(
+                title=f"Benchmark book {i}",
+                description="lorem ipsum dolor sit amet " * 30,
+                status="published",
+                author_id=author.id,
+                user_id=user.id,
+                isbn=_isbn13(i),
+                page_count=100 + i % 500,
+            )
+            for i in range(rows)
+        ])
+        db.commit()
+
+
+def _orm_page(db, page: int, page_size: int):
+    """The list path as it was before: full ORM instances for every item."""
+    q = db.query(Book).filter(Book.status == "published")
+    total = q.count()
+    items = q.order_by(Book.id).limit(page_size).offset((page - 1) * page_size).all()
+    return items, total
+
+
+def _row_page(db, page: int, page_size: int):
+    # otherwise every iteration after the first reuses the cached ids and total
+    crud.search_cache.clear()
+    return crud.get_books(db, None, page=page, page_size=page_size)
+
+
+def _render(items, total, page, page_size) -> bytes:
+    envelope = {"items": items, "total": total, "page": page, "page_size": page_size, "links": {}}
+    adapter = schemas.BookPageAdapter
+    return adapter.dump_json(adapter.validate_python(envelope, from_attributes=True))
+
+
+def _measure(Session, fetch, page: int, page_size: int, iterations: int):
+    # warm up statement caches and the adapter
+    with Session() as db:
+        _render(*fetch(db, page, page_size), page, page_size)
+
+    tracemalloc.start()
+    with Session() as db:
+        _render(*fetch(db, page, page_size), page, page_size)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.process_time()
+    for _ in range(iterations):
+        with Session() as db:
+            _render(*fetch(db, page, page_size), page, page_size)
+    cpu = (time.process_time() - start) / iterations
+    return peak, cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    url = os.getenv("BENCH_DATABASE_URL", "sqlite://")
+    if url.startswith("sqlite"):
+        engine = create_engine(url, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    else:
+        engine = create_engine(url, pool_pre_ping=True)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    _seed(Session, args.rows)
+
+    page = max(1, args.rows // args.page_size // 2)
+    results = {
+        "orm instances": _measure(Session, _orm_page, page, args.page_size, args.iterations),
+        "core rows": _measure(Session, _row_page, page, args.page_size, args.iterations),
+    }
+    print(f"{args.rows} books, page {page} of size {args.page_size}, {args.iterations} iterations")
+    print(f"{'path':<16}{'peak KiB/page':>16}{'CPU ms/request':>16}")
+    for name, (peak, cpu) in results.items():
+        print(f"{name:<16}{peak / 1024:>16.1f}{cpu * 1000:>16.2f}")
+
+    Base.metadata.drop_all(bind=engine)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,12 +5,16 @@ SQLite fallback. Run `make test-mysql` (which starts the test compose) before
 running pytest locally, or set `TEST_DATABASE_URL` in the environment.
 """
 
+import asyncio
+import itertools
 import os
+import socket
 import time
+from contextlib import contextmanager
 from pathlib import Path
 import sys
 import pytest
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.orm import sessionmaker
 from fastapi.testclient import TestClient
 
@@ -18,6 +22,16 @@ import app.db.database as db_mod
 from app.db.database import Base
 from app.db.models import User as UserModel
 from app.core.security import pwd_context
+from app.core.cache import reset_caches
+from app.core.prefix_index import reset_indexes
+from app.core.trigram_index import reset_trigram_indexes
+from app.core.similarity import reset_similarity_indexes
+from app.core.metrics import reset_counters
+from app.core.auth_throttle import auth_throttle
+from app.core.bulkheads import reset_bulkheads
+from app.db.changes import change_feed
+from app.middleware.load_shedding import load_shedder
+from app.middleware.rate_limit import rate_limiter
 
 
 def _read_env_test(repo_root: Path) -> dict:
@@ -175,8 +189,176 @@ def client(db_session):
 
     from app.main import app
 
+    # In-process caches outlive the app modules; start every test empty
+    reset_caches()
+    reset_indexes()
+    reset_trigram_indexes()
+    reset_similarity_indexes()
+    reset_counters()
+    change_feed.reset()
+    load_shedder.reset()
+    reset_bulkheads()
+    rate_limiter.reset()
+    auth_throttle.reset()
     client = TestClient(app)
     try:
         yield client
     finally:
-        client.close()
\ No newline at end of file
+        client.close()
+
+
+@pytest.fixture(scope="function")
+def async_database(db_session):
+    """Serve requests through an AsyncSession on the test database (DB_ASYNC mode).
+
+    Uses the async driver for the test URL (aiosqlite for SQLite, aiomysql for
+    MySQL). NullPool because every TestClient request runs on a fresh event loop.
+    """
+    from sqlalchemy.pool import NullPool
+    from app.core.config import async_database_url
+
+    async_engine, async_session_local = db_mod.make_async_engine(
+        async_database_url(os.environ["TEST_DATABASE_URL"]), poolclass=NullPool
+    )
+    db_mod.async_engine, db_mod.AsyncSessionLocal = async_engine, async_session_local
+    try:
+        yield async_session_local
+    finally:
+        db_mod.async_engine, db_mod.AsyncSessionLocal = None, None
+
+
+# Helpers shared by test modules, which never import from one another.
+def _isbn13(n: int) -> str:
+    base = str(978000000000 + n)[-12:]
+    checksum = sum(int(d) * (1 if i % 2 == 0 else 3) for i, d in enumerate(base))
+    return base + str((10 - (checksum % 10)) % 10)
+
+
+@pytest.fixture(scope="session")
+def make_isbn13():
+    """Return a helper generating a valid ISBN-13 from an integer seed.
+
+    Usage:
+        isbn = make_isbn13(900)
+    """
+    return _isbn13
+
+
+@pytest.fixture(scope="function")
+def make_author(client):
+    """Return a helper creating an author via the API as `auth`.
+
+    Usage:
+        author = make_author(auth, "Ada")                          # a person
+        lab = make_author(auth, "Lab", "institutions", city="Porto")
+    """
+
+    def _make_author(auth, name: str = "Test Author", kind: str = "persons", **fields):
+        defaults = {"birth_date": "1970-01-01"} if kind == "persons" else {"city": "Lisbon"}
+        r = client.post(f"/authors/{kind}", json={"name": name, **defaults, **fields}, auth=auth)
+        assert r.status_code == 201, r.text
+        return r.json()
+
+    return _make_author
+
+
+@pytest.fixture(scope="function")
+def make_material(client):
+    """Return a helper creating a book, article or video via the API as `auth`.
+
+    Fields not given get defaults: a published material with a title and a
+    description, and a fresh ISBN/DOI (seeds far above the ones tests pass to
+    `make_isbn13`) or duration.
+
+    Usage:
+        book = make_material(auth, "books", author_id=author["id"], title="Moby Dick")
+    """
+    seeds = itertools.count(100000)
+
+    def _make_material(auth, kind: str, **fields):
+        seed = next(seeds)
+        payload = {"title": f"Material {seed}", "description": "d", "status": "published"}
+        if kind == "books":
+            payload.update(isbn=_isbn13(seed), page_count=10)
+        elif kind == "articles":
+            payload["doi"] = f"10.1234/material{seed}"
+        else:
+            payload["duration"] = 5
+        r = client.post(f"/materials/{kind}", json={**payload, **fields}, auth=auth)
+        assert r.status_code == 201, r.text
+        return r.json()
+
+    return _make_material
+
+
+@pytest.fixture(scope="function")
+def capture_sql(db_session):
+    """Return a context manager recording every statement run on the test engine.
+
+    Usage:
+        with capture_sql() as executed:
+            client.get("/materials")
+    """
+
+    @contextmanager
+    def _capture_sql():
+        executed = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            executed.append(statement)
+
+        event.listen(db_mod.engine, "before_cursor_execute", record)
+        try:
+            yield executed
+        finally:
+            event.remove(db_mod.engine, "before_cursor_execute", record)
+
+    return _capture_sql
+
+
+@pytest.fixture(scope="session")
+def free_port():
+    """Return a helper picking a free local TCP port."""
+
+    def _free_port():
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            return sock.getsockname()[1]
+
+    return _free_port
+
+
+@pytest.fixture(scope="session")
+def fake_response():
+    """Return a helper building a stand-in for a `requests` response: fake_response(200, {...})."""
+
+    class FakeResponse:
+        def __init__(self, status_code, data):
+            self.status_code = status_code
+            self._data = data
+
+        def json(self):
+            return self._data
+
+    return FakeResponse
+
+
+class GatedApp:
+    """ASGI app that counts calls and holds each response until released."""
+
+    def __init__(self):
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self, scope, receive, send):
+        self.calls += 1
+        await self.release.wait()
+        body = f"{scope['path']}?{scope['query_string'].decode()}#{self.calls}".encode()
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/plain")]})
+        await send({"type": "http.response.body", "body": body})
+
+
+@pytest.fixture(scope="function")
+def gated_app():
+    """Return a GatedApp: an ASGI app holding every response until `release` is set."""
+    return GatedApp()
@@ -0,0 +1,59 @@
+import asyncio
+
+from starlette.requests import Request
+
+import app.db.crud as crud
+import app.db.database as db_mod
+
+
+def test_get_database_yields_async_handle(async_database):
+    async def main():
+        handles = db_mod.get_database(Request({"type": "http", "method": "GET"}))
+        db = await handles.__anext__()
+        try:
+            assert isinstance(db, db_mod.AsyncDatabase)
+            return await db.run(crud.get_authors, page=1, page_size=5)
+        finally:
+            await handles.aclose()
+
+    items, total = asyncio.run(main())
+    assert items == [] and total == 0
+
+
+def test_routes_in_async_mode(async_database, client, make_user, root_credentials, make_isbn13):
+    user = make_user("async@example.com", "password")
+    auth = (user["email"], "password")
+    r = client.post("/authors/persons", json={"name": "Async Author", "birth_date": "1970-01-01"}, auth=auth)
+    assert r.status_code == 201, r.text
+    author = r.json()
+    payload = {
+        "title": "Async Book",
+        "description": "Served without threads",
+        "status": "published",
+        "author_id": author["id"],
+        "isbn": make_isbn13(995),
+        "page_count": 10,
+    }
+    r = client.post("/materials/books", json=payload, auth=auth)
+    assert r.status_code == 201, r.text
+    book = r.json()
+
+    r = client.get("/materials/books?title=async")
+    assert [item["id"] for item in r.json()["items"]] == [book["id"]]
+    r = client.get(f"/materials/books/{book['id']}")
+    assert r.status_code == 200
+    assert client.get(f"/materials/books/{book['id']}", headers={"If-None-Match": r.headers["etag"]}).status_code == 304
+    assert client.get(f"/authors/persons/{author['id']}").json()["name"] == "Async Author"
+
+    r = client.put(f"/materials/books/{book['id']}", json={**payload, "title": "Async Book 2"}, auth=auth)
+    assert r.status_code == 200, r.text
+    assert client.get(f"/materials/{book['id']}").json()["title"] == "Async Book 2"
+    assert client.post("/materials/books", json={**payload, "author_id": 999999}, auth=auth).status_code == 400
+
+    # exports page through the async handle too
+    assert client.get("/materials/books/export").text.count("\n") == 1
+
+    r = client.delete(f"/materials/books/{book['id']}", auth=auth)
+    assert r.status_code == 200, r.text
+    assert r.json()["title"] == "Async Book 2"
+    assert client.get("/users", auth=root_credentials).json()["total"] == 2
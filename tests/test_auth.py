@@ -38,3 +38,19 @@ def test_optional_auth_returns_none_on_bad(client, db_session):
     # calling an endpoint that allows optional auth with bad credentials should still succeed
     r = client.get("/materials?page=1&page_size=1", auth=("noone", "x"))
     assert r.status_code == 200
+
+
+def test_passwords_are_hashed_before_the_session_call(client, root_credentials, monkeypatch):
+    class NoHashing:
+        def hash(self, password):
+            raise AssertionError("hashed inside db.run")
+
+    # crud's copy: under DB_ASYNC anything it runs is on the event loop
+    monkeypatch.setattr(crud, "pwd_context", NoHashing())
+    r = client.post("/users", json={"email": "hashed@example.com", "password": "first-password"}, auth=root_credentials)
+    assert r.status_code == 201, r.text
+    user_id = r.json()["id"]
+    r = client.put(f"/users/{user_id}", json={"email": "hashed@example.com", "password": "second-password"}, auth=("hashed@example.com", "first-password"))
+    assert r.status_code == 200, r.text
+    r = client.post("/authors/persons", json={"name": "Hashed", "birth_date": "1990-01-01"}, auth=("hashed@example.com", "second-password"))
+    assert r.status_code == 201, r.text
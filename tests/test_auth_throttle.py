@@ -0,0 +1,78 @@
+from app.core.auth_throttle import AuthThrottle, auth_throttle
+from app.core.bulkheads import get_bulkhead
+from app.core.security import pwd_context
+
+
+def test_backoff_grows_and_expires():
+    now = [0.0]
+    throttle = AuthThrottle(threshold=2, base=1, max_delay=4, window=60, max_keys=10, clock=lambda: now[0])
+    throttle.failure("a@example.com", "10.0.0.1")
+    assert throttle.retry_after("a@example.com", "10.0.0.1") == 0
+    delays = []
+    for _ in range(4):
+        throttle.failure("A@example.com", "10.0.0.1")
+        delays.append(throttle.retry_after("a@example.com", "10.0.0.2"))
+    assert delays == [1, 2, 4, 4]
+    # the address is throttled for every username it tries
+    assert throttle.retry_after("other@example.com", "10.0.0.1") == 4
+    now[0] += 61
+    assert throttle.retry_after("a@example.com", "10.0.0.1") == 0
+    assert throttle.stats()["tracked"] == 0
+
+
+def test_success_clears_only_the_username():
+    throttle = AuthThrottle(threshold=1, base=10, max_delay=10, window=60, max_keys=10)
+    throttle.failure("a@example.com", "10.0.0.1")
+    throttle.success("a@example.com")
+    assert throttle.retry_after("a@example.com", "10.0.0.2") == 0
+    assert throttle.retry_after("a@example.com", "10.0.0.1") > 0
+
+
+def test_attempts_in_flight_use_up_the_budget():
+    throttle = AuthThrottle(threshold=3, base=1, max_delay=4, window=60, max_keys=10)
+    # a parallel burst: only `threshold` attempts reach the hash at once
+    assert [throttle.acquire("a@example.com", "10.0.0.1") for _ in range(4)] == [0, 0, 0, 1]
+    # the address budget is shared by every username it tries
+    assert throttle.acquire("b@example.com", "10.0.0.1") == 1
+    assert throttle.stats()["in_flight"] == 3
+    throttle.release("a@example.com", "10.0.0.1")
+    throttle.failure("a@example.com", "10.0.0.1")
+    # one failure recorded and two still in flight: the budget of two is used up
+    assert throttle.acquire("a@example.com", "10.0.0.2") == 1
+    throttle.release("a@example.com", "10.0.0.1")
+    assert throttle.acquire("a@example.com", "10.0.0.2") == 0
+    for _ in range(2):
+        throttle.release("a@example.com", "10.0.0.1")
+    throttle.release("a@example.com", "10.0.0.2")
+    assert throttle.stats()["in_flight"] == 0
+
+
+def test_records_are_bounded():
+    throttle = AuthThrottle(threshold=5, base=1, max_delay=1, window=60, max_keys=4)
+    for i in range(10):
+        throttle.failure(f"user{i}@example.com", "10.0.0.1")
+    assert throttle.stats()["tracked"] == 4
+
+
+def test_repeated_failures_are_refused_before_hashing(client, make_user, monkeypatch):
+    monkeypatch.setattr(auth_throttle, "threshold", 2)
+    user = make_user("stuffed@example.com", "password")
+
+    statuses = [client.get("/users", auth=(user["email"], "wrong")).status_code for _ in range(2)]
+    assert statuses == [401, 401]
+    checks = get_bulkhead("auth").stats()["completed"]
+
+    for username, password in ((user["email"], "password"), ("nobody@example.com", "wrong"), ("new@example.com", "x")):
+        r = client.get("/users", auth=(username, password))
+        assert r.status_code == 429
+        assert int(r.headers["retry-after"]) >= 1
+    # refused attempts never reached the user lookup / bcrypt
+    assert get_bulkhead("auth").stats()["completed"] == checks
+
+
+def test_unknown_user_pays_the_same_hash(monkeypatch, client):
+    calls = []
+    monkeypatch.setattr(pwd_context, "dummy_verify", lambda *a, **kw: calls.append(1))
+    r = client.get("/users", auth=("ghost@example.com", "password"))
+    assert r.status_code == 401
+    assert calls == [1]
@@ -0,0 +1,59 @@
+from app.core.cache import get_cache
+
+
+def test_author_reads_come_from_the_cache(client, make_user):
+    user = make_user("authors-cache@example.com", "password")
+    auth = (user["email"], "password")
+    r = client.post("/authors/persons", json={"name": "Cached Person", "birth_date": "1960-05-04"}, auth=auth)
+    assert r.status_code == 201, r.text
+    person = r.json()
+    r = client.post("/authors/institutions", json={"name": "Cached Lab", "city": "Recife"}, auth=auth)
+    assert r.status_code == 201, r.text
+    institution = r.json()
+    cache = get_cache("authors")
+
+    assert client.get(f"/authors/persons/{person['id']}").json() == person
+    hits = cache.stats()["hits"]
+    assert client.get(f"/authors/{person['id']}").json() == {"id": person["id"], "type": "person", "name": "Cached Person"}
+    assert client.get(f"/authors/institutions/{institution['id']}?fields=city").json() == {"city": "Recife"}
+    assert cache.stats()["hits"] == hits + 1
+
+    # the subtype routes only serve their own kind
+    assert client.get(f"/authors/institutions/{person['id']}").status_code == 404
+    assert client.get(f"/authors/persons/{institution['id']}").status_code == 404
+    assert client.get("/authors/999999").status_code == 404
+
+
+def test_material_writes_reject_unknown_authors(client, make_user, make_isbn13):
+    user = make_user("authors-check@example.com", "password")
+    auth = (user["email"], "password")
+    payload = {
+        "title": "Orphan Book",
+        "description": "No author",
+        "status": "published",
+        "author_id": 999999,
+        "isbn": make_isbn13(990),
+        "page_count": 10,
+    }
+    r = client.post("/materials/books", json=payload, auth=auth)
+    assert r.status_code == 400
+    assert r.json()["detail"] == [
+        {"loc": ["body", "author_id"], "msg": "Author 999999 not found", "type": "value_error.foreign_key"}
+    ]
+
+    # an author created after a failed check is accepted straight away
+    r = client.post("/authors/persons", json={"name": "Late Author", "birth_date": "1970-01-01"}, auth=auth)
+    assert r.status_code == 201, r.text
+    r = client.post("/materials/books", json={**payload, "author_id": r.json()["id"]}, auth=auth)
+    assert r.status_code == 201, r.text
+    book = r.json()
+
+    r = client.put(f"/materials/books/{book['id']}", json={**payload, "author_id": 999999}, auth=auth)
+    assert r.status_code == 400
+
+    # ownership is checked first: a non-owner cannot probe which author ids exist
+    other = make_user("authors-probe@example.com", "password")
+    for author_id in (999999, book["author_id"]):
+        r = client.put(f"/materials/books/{book['id']}", json={**payload, "author_id": author_id}, auth=(other["email"], "password"))
+        assert r.status_code == 403
+    assert client.put("/materials/books/999998", json=payload, auth=auth).status_code == 404
@@ -0,0 +1,51 @@
+from app.core.prefix_index import PrefixIndex
+
+
+def test_prefix_index_matches_word_starts():
+    index = PrefixIndex("test_titles")
+    index.load([(1, "The Great Gatsby", "gatsby"), (2, "Great Expectations", "expectations"), (3, "Éloge de l'ombre", "ombre")])
+    assert index.complete("great") == ["expectations", "gatsby"]
+    assert index.complete("GREAT  gat") == ["gatsby"]
+    assert index.complete("eloge") == ["ombre"]
+    assert index.complete("l omb") == ["ombre"]
+    assert index.complete("the g", limit=1) == ["gatsby"]
+    assert index.complete("x") == []
+
+    index.refresh({1, 3}, [(1, "Tender Is the Night", "night")])
+    assert index.complete("great") == ["expectations"]
+    assert index.complete("the") == ["night"]
+    assert index.complete("elo") == []
+    assert index.stats()["entries"] == 2
+
+
+def test_autocomplete_follows_writes(client, make_user, make_author, make_material, capture_sql):
+    user = make_user("complete@example.com", "password")
+    auth = (user["email"], "password")
+    author = make_author(auth, "Émile Zola", birth_date="1940-04-02")
+    book = make_material(auth, "books", title="The Great Gatsby", author_id=author["id"])
+    draft = make_material(auth, "articles", title="Great Secret", status="draft", author_id=author["id"], doi="10.1234/secret")
+
+    r = client.get("/materials/autocomplete", params={"q": "gre"})
+    assert r.status_code == 200, r.text
+    # drafts are never completed, not even for their owner
+    assert r.json() == {"titles": [{"id": book["id"], "text": "The Great Gatsby", "type": "book"}], "authors": []}
+    assert client.get("/materials/autocomplete", params={"q": "gre"}, auth=auth).json()["titles"] == r.json()["titles"]
+    assert client.get("/materials/autocomplete", params={"q": "emile"}).json()["authors"] == [{"id": author["id"], "text": "Émile Zola", "type": "person"}]
+
+    # a warm index answers from memory
+    with capture_sql() as executed:
+        assert client.get("/materials/autocomplete", params={"q": "zo"}).json()["authors"][0]["id"] == author["id"]
+    assert executed == []
+
+    fields = ("title", "description", "status", "author_id")
+    r = client.put(f"/materials/articles/{draft['id']}", json={**{k: draft[k] for k in fields}, "doi": draft["doi"], "status": "published"}, auth=auth)
+    assert r.status_code == 200, r.text
+    r = client.put(f"/materials/books/{book['id']}", json={**{k: book[k] for k in fields}, "isbn": book["isbn"], "page_count": 10, "title": "Tender Is the Night"}, auth=auth)
+    assert r.status_code == 200, r.text
+    titles = client.get("/materials/autocomplete", params={"q": "gre"}).json()["titles"]
+    assert [item["text"] for item in titles] == ["Great Secret"]
+    assert [item["text"] for item in client.get("/materials/autocomplete", params={"q": "night"}).json()["titles"]] == ["Tender Is the Night"]
+
+    assert client.delete(f"/materials/articles/{draft['id']}", auth=auth).status_code == 200
+    assert client.get("/materials/autocomplete", params={"q": "gre"}).json()["titles"] == []
+    assert client.get("/materials/autocomplete", params={"q": ""}).status_code == 422
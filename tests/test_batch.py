@@ -0,0 +1,136 @@
+from app.core.security import pwd_context
+from app.middleware.load_shedding import load_shedder
+from app.middleware.rate_limit import rate_limiter
+
+
+def _person(name):
+    return {"method": "POST", "path": "/authors/persons", "body": {"name": name, "birth_date": "1970-01-01"}}
+
+
+def _article(title, author_id, doi):
+    body = {"title": title, "description": "d", "status": "published", "author_id": author_id, "doi": doi}
+    return {"method": "POST", "path": "/materials/articles", "body": body}
+
+
+def test_batch_mixes_reads_and_writes_with_one_auth(client, make_user, monkeypatch):
+    user = make_user("batcher@example.com", "password")
+    auth = (user["email"], "password")
+    r = client.post("/authors/persons", json={"name": "Existing", "birth_date": "1960-01-01"}, auth=auth)
+    author_id = r.json()["id"]
+
+    checks = []
+    verify = pwd_context.verify
+    monkeypatch.setattr(pwd_context, "verify", lambda *args: checks.append(1) or verify(*args))
+
+    operations = [
+        _article("Batch One", author_id, "10.1234/b1"),
+        {"method": "GET", "path": f"/authors/persons/{author_id}"},
+        {"method": "GET", "path": "/materials/articles?limit=10"},
+        {"method": "GET", "path": "/materials/999999"},
+        {"method": "GET", "path": "/authors/nowhere/1"},
+        _article("Batch Two", author_id, "10.1234/b2"),
+        {"method": "DELETE", "path": "/materials/articles/999999"},
+    ]
+    r = client.post("/batch", json={"operations": operations}, auth=auth)
+    assert r.status_code == 200, r.text
+    body = r.json()
+    assert body["committed"] is True
+    statuses = [result["status"] for result in body["results"]]
+    assert statuses == [201, 200, 200, 404, 404, 201, 404]
+    assert body["results"][1]["body"]["name"] == "Existing"
+    assert [item["title"] for item in body["results"][2]["body"]["items"]] == ["Batch One"]
+    assert "etag" in body["results"][1]["headers"]
+    # one credential check for seven operations
+    assert len(checks) == 1
+
+    r = client.get("/materials/articles?limit=10")
+    assert sorted(item["title"] for item in r.json()["items"]) == ["Batch One", "Batch Two"]
+
+
+def test_batch_without_credentials_runs_operations_anonymously(client):
+    operations = [{"method": "GET", "path": "/authors/persons"}, _person("Nobody")]
+    r = client.post("/batch", json={"operations": operations})
+    assert r.status_code == 200, r.text
+    assert [result["status"] for result in r.json()["results"]] == [200, 401]
+
+
+def test_atomic_batch_rolls_back_on_first_failure(client, make_user):
+    user = make_user("atomic@example.com", "password")
+    auth = (user["email"], "password")
+    operations = [
+        _person("Rolled Back"),
+        {"method": "GET", "path": "/authors/persons/999999"},
+        _person("Never Run"),
+    ]
+    r = client.post("/batch", json={"operations": operations, "atomic": True}, auth=auth)
+    assert r.status_code == 200, r.text
+    body = r.json()
+    assert body["committed"] is False
+    assert [result["status"] for result in body["results"]] == [201, 404, 424]
+    assert body["results"][2]["body"]["detail"] == "Not executed: operation 1 failed"
+    names = [item["name"] for item in client.get("/authors/persons").json()["items"]]
+    assert "Rolled Back" not in names and "Never Run" not in names
+
+    r = client.post("/batch", json={"operations": [_person("Kept A"), _person("Kept B")], "atomic": True}, auth=auth)
+    assert r.json()["committed"] is True
+    names = [item["name"] for item in client.get("/authors/persons").json()["items"]]
+    assert {"Kept A", "Kept B"} <= set(names)
+
+
+def test_rolled_back_batch_leaves_nothing_cached(client, make_user, make_isbn13):
+    user = make_user("uncommitted@example.com", "password")
+    auth = (user["email"], "password")
+    author_id = client.post("/authors/persons", json={"name": "Cached", "birth_date": "1960-01-01"}, auth=auth).json()["id"]
+    # loaded before the batch, so the batch refreshes it
+    assert client.get("/materials/autocomplete", params={"q": "phantom"}).json()["titles"] == []
+
+    book = {"title": "Phantom Book", "description": "d", "status": "published", "author_id": author_id, "isbn": make_isbn13(990), "page_count": 10}
+    operations = [
+        {"method": "POST", "path": "/materials/books", "body": book},
+        # the first material of the test database
+        {"method": "GET", "path": "/materials/books/1"},
+        {"method": "GET", "path": "/materials/books?limit=10"},
+        {"method": "GET", "path": "/materials/autocomplete?q=phantom"},
+        {"method": "DELETE", "path": "/materials/books/999999"},
+    ]
+    r = client.post("/batch", json={"operations": operations, "atomic": True}, auth=auth)
+    body = r.json()
+    assert body["committed"] is False
+    assert [result["status"] for result in body["results"]] == [201, 200, 200, 200, 404]
+    book_id = body["results"][0]["body"]["id"]
+    assert book_id == 1 and body["results"][3]["body"]["titles"][0]["text"] == "Phantom Book"
+
+    # the uncommitted book was read (and cached) inside the batch, but is gone now
+    assert client.get(f"/materials/books/{book_id}").status_code == 404
+    assert client.get(f"/materials/{book_id}").status_code == 404
+    assert client.get("/materials/books").json()["total"] == 0
+    assert client.get("/materials/autocomplete", params={"q": "phantom"}).json()["titles"] == []
+
+
+def test_batch_rejects_paths_outside_the_api(client):
+    for path in ("/users", "/batch", "/materials/export", "/metrics"):
+        r = client.post("/batch", json={"operations": [{"method": "GET", "path": "/materials"}, {"method": "GET", "path": path}]})
+        assert r.status_code == 400, path
+        assert r.json()["detail"][0]["loc"] == ["body", "operations", "1", "path"]
+
+    r = client.post("/batch", json={"operations": [{"method": "GET", "path": "/materials"}] * 51})
+    assert r.status_code == 400
+    assert client.post("/batch", json={"operations": []}).status_code == 422
+
+
+def test_operations_are_rate_limited_and_shed_one_by_one(client, monkeypatch):
+    monkeypatch.setitem(rate_limiter.limits, "search", (0.01, 2))
+    searches = [{"method": "GET", "path": "/materials?title=x"}, {"method": "GET", "path": "/materials/fuzzy?q=x"}]
+    assert client.post("/batch", json={"operations": searches}).status_code == 200
+    # two more search tokens: none left for the second one, so nothing runs
+    r = client.post("/batch", json={"operations": [{"method": "GET", "path": "/authors"}, *searches]})
+    assert r.status_code == 429
+    assert int(r.headers["retry-after"]) >= 1
+    assert rate_limiter.limited["search"] == 1
+
+    # the batch itself is a write; a book creation in it is shed as enrichment
+    monkeypatch.setitem(load_shedder.thresholds, "enrichment", 0)
+    book = {"method": "POST", "path": "/materials/books", "body": {}}
+    r = client.post("/batch", json={"operations": [{"method": "GET", "path": "/authors"}, book]})
+    assert r.status_code == 503
+    assert load_shedder.shed == {"enrichment": 1, "write": 0, "export": 0, "read": 0}
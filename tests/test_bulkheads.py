@@ -0,0 +1,71 @@
+import asyncio
+import threading
+
+import httpx
+import pytest
+import requests
+
+from app.core.bulkheads import Bulkhead, BulkheadFull, get_bulkhead
+
+
+def test_bulkhead_limits_threads_and_queue():
+    bulkhead = Bulkhead("test", limit=1, max_queue=1)
+    gate = threading.Event()
+
+    async def main():
+        running = asyncio.create_task(bulkhead.run(gate.wait, 5))
+        queued = asyncio.create_task(bulkhead.run(lambda: "queued"))
+        await asyncio.sleep(0.05)
+        busy = bulkhead.stats()
+        with pytest.raises(BulkheadFull):
+            await bulkhead.run(lambda: "rejected")
+        gate.set()
+        return busy, await running, await queued
+
+    busy, first, second = asyncio.run(main())
+    assert busy["active"] == 1 and busy["waiting"] == 1
+    assert (first, second) == (True, "queued")
+    assert bulkhead.stats() == {"limit": 1, "max_queue": 1, "active": 0, "waiting": 0, "completed": 2, "rejected": 1}
+
+
+def test_slow_enrichment_does_not_block_reads(monkeypatch, client, make_user, root_credentials, fake_response):
+    isbn = "9783161484100"
+    gate = threading.Event()
+
+    def slow_get(url, timeout=5):
+        gate.wait(5)
+        return fake_response(200, {f"ISBN:{isbn}": {"title": "Slow Title", "number_of_pages": 12}})
+
+    monkeypatch.setattr(requests, "get", slow_get)
+    enrichment = get_bulkhead("enrichment")
+    monkeypatch.setattr(enrichment, "limit", 1)
+    monkeypatch.setattr(enrichment, "max_queue", 0)
+
+    user = make_user("bulkhead@example.com", "password")
+    auth = (user["email"], "password")
+    r = client.post("/authors/persons", json={"name": "Bulkhead Author", "birth_date": "1970-01-01"}, auth=auth)
+    assert r.status_code == 201, r.text
+    book = {"isbn": isbn, "author_id": r.json()["id"], "status": "published", "description": "x"}
+
+    async def main():
+        transport = httpx.ASGITransport(app=client.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+            slow = asyncio.create_task(ac.post("/materials/books", json=book, auth=auth))
+            while enrichment.active == 0:
+                await asyncio.sleep(0.01)
+            read = await ac.get("/materials")
+            rejected = await ac.post("/materials/books", json=book, auth=auth)
+            gate.set()
+            return read, rejected, await slow
+
+    read, rejected, slow = asyncio.run(main())
+    assert read.status_code == 200
+    assert rejected.status_code == 503
+    assert rejected.headers["retry-after"] == "1"
+    assert slow.status_code == 201, slow.text
+    assert slow.json()["title"] == "Slow Title"
+
+    stats = client.get("/metrics", auth=root_credentials).json()["bulkheads"]
+    assert stats["enrichment"]["rejected"] == 1
+    assert stats["enrichment"]["completed"] == 1
+    assert stats["read"]["completed"] >= 1 and stats["auth"]["completed"] >= 1
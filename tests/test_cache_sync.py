@@ -0,0 +1,124 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+import requests
+
+from app.db.changes import ChangeFeed
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_change_feed_between_workers(db_session):
+    clock = FakeClock()
+    writer = ChangeFeed(interval=1, clock=clock)
+    reader = ChangeFeed(interval=1, clock=clock)
+    seen = []
+    reader.subscribe("material:", seen.append)
+
+    reader.poll(db_session)  # starts from the newest change
+    writer.publish(db_session, "material:1")
+    writer.publish(db_session, "author:7")
+    db_session.commit()
+
+    # throttled until the interval has passed
+    assert reader.poll(db_session) == 0
+    clock.now = 1
+    assert reader.poll(db_session) == 2
+    assert seen == ["material:1"]
+
+    # a rolled-back write leaves nothing behind
+    writer.publish(db_session, "material:2")
+    db_session.rollback()
+    clock.now = 2
+    assert reader.poll(db_session) == 0
+
+    # idle for too long: drop everything rather than trust the log
+    clock.now = 1000
+    reader.poll(db_session)
+    assert seen == ["material:1", None]
+
+
+def test_change_feed_applies_late_commits_once(db_session):
+    reader = ChangeFeed(interval=0)
+    seen = []
+    reader.subscribe("material:", seen.append)
+    reader.poll(db_session)
+
+    ChangeFeed().publish(db_session, "material:1")
+    db_session.commit()
+    reader.poll(db_session)
+    reader.poll(db_session)
+    assert seen == ["material:1"]
+
+
+@pytest.fixture
+def workers(db_session, free_port):
+    """Start two API worker processes sharing the test database."""
+    env = dict(
+        os.environ,
+        DATABASE_URL=os.environ["TEST_DATABASE_URL"],
+        CACHE_SYNC_INTERVAL="0.2",
+        MATERIAL_CACHE_TTL="600",
+    )
+    ports = [free_port(), free_port()]
+    procs = [
+        subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        for port in ports
+    ]
+    urls = [f"http://127.0.0.1:{port}" for port in ports]
+    try:
+        deadline = time.monotonic() + 30
+        for url in urls:
+            while True:
+                try:
+                    requests.get(url + "/openapi.json", timeout=1)
+                    break
+                except requests.ConnectionError:
+                    if time.monotonic() > deadline:
+                        raise RuntimeError("worker did not start")
+                    time.sleep(0.1)
+        yield urls
+    finally:
+        for proc in procs:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+
+def test_workers_drop_entries_written_elsewhere(workers, root_credentials, make_isbn13):
+    a, b = workers
+    r = requests.post(a + "/authors/persons", json={"name": "Synced Author", "birth_date": "1970-01-01"}, auth=root_credentials)
+    assert r.status_code == 201, r.text
+    payload = {
+        "title": "Synced Book",
+        "description": "Synced",
+        "status": "published",
+        "author_id": r.json()["id"],
+        "isbn": make_isbn13(960),
+        "page_count": 10,
+    }
+    r = requests.post(a + "/materials/books", json=payload, auth=root_credentials)
+    assert r.status_code == 201, r.text
+    book_id = r.json()["id"]
+
+    # worker B caches the published book ...
+    assert requests.get(f"{b}/materials/books/{book_id}").json()["title"] == "Synced Book"
+    # ... worker A changes it ...
+    r = requests.put(f"{a}/materials/books/{book_id}", json={**payload, "title": "Renamed Elsewhere"}, auth=root_credentials)
+    assert r.status_code == 200, r.text
+    # ... and B serves the new title within the sync interval, long before the TTL
+    time.sleep(0.3)
+    assert requests.get(f"{b}/materials/books/{book_id}").json()["title"] == "Renamed Elsewhere"
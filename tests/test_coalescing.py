@@ -0,0 +1,55 @@
+import asyncio
+
+import httpx
+
+from app.core import metrics
+from app.middleware.coalescing import CoalescingMiddleware
+
+
+def _run(app, requests):
+    async def main():
+        transport = httpx.ASGITransport(app=CoalescingMiddleware(app))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            tasks = [asyncio.create_task(client.get(url, **kwargs)) for url, kwargs in requests]
+            await asyncio.sleep(0.05)
+            app.release.set()
+            return await asyncio.gather(*tasks)
+
+    return asyncio.run(main())
+
+
+def test_identical_anonymous_gets_share_one_call(gated_app):
+    metrics.reset_counters()
+    app = gated_app
+    responses = _run(app, [("/materials/1?x=1", {})] * 10)
+    assert app.calls == 1
+    assert {r.text for r in responses} == {"/materials/1?x=1#1"}
+    assert metrics.snapshot()["counters"]["coalesced_requests"] == 9
+
+
+def test_different_or_authenticated_requests_are_not_coalesced(gated_app):
+    app = gated_app
+    _run(app, [
+        ("/materials/1", {}),
+        ("/materials/1?page=2", {}),
+        ("/materials/1", {"headers": {"Accept": "application/msgpack"}}),
+        ("/materials/1", {"auth": ("user@example.com", "password")}),
+        ("/materials/export", {}),
+        ("/materials/export", {}),
+    ])
+    assert app.calls == 6
+
+
+def test_coalesced_app_responses_match(client, make_user):
+    user = make_user("coalesce@example.com", "password")
+    r = client.post("/authors/persons", json={"name": "Popular Author", "birth_date": "1970-01-01"}, auth=(user["email"], "password"))
+    assert r.status_code == 201, r.text
+
+    async def main():
+        transport = httpx.ASGITransport(app=client.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+            return await asyncio.gather(*(ac.get("/authors") for _ in range(20)))
+
+    responses = asyncio.run(main())
+    assert {r.status_code for r in responses} == {200}
+    assert len({r.content for r in responses}) == 1
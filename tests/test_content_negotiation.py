@@ -0,0 +1,109 @@
+import gzip
+from datetime import date
+
+import msgpack
+import orjson
+import pytest
+from pydantic import TypeAdapter
+
+from app.middleware.compression import choose_encoding, precompressed_cache
+from app.responses import serialize, wants_msgpack
+from app.schemas import AuthorPersonRead
+
+
+@pytest.fixture
+def negotiated_books(make_user, make_author, make_material):
+    """Return a helper creating `count` published books with compressible descriptions; returns their author."""
+
+    def _negotiated_books(count):
+        user = make_user("negotiate@example.com", "password")
+        auth = (user["email"], "password")
+        author = make_author(auth, "Negotiated Author")
+        for i in range(count):
+            make_material(auth, "books", title=f"Negotiated Book {i}", description="compressible description " * 10, author_id=author["id"])
+        return author
+
+    return _negotiated_books
+
+
+@pytest.mark.parametrize("accept,expected", [
+    ("application/msgpack", True),
+    ("application/x-msgpack", True),
+    ("application/msgpack, application/json;q=0.5", True),
+    ("application/json, application/msgpack;q=0.5", False),
+    ("*/*", False),
+    ("", False),
+])
+def test_wants_msgpack(accept, expected):
+    assert wants_msgpack(accept) is expected
+
+
+@pytest.mark.parametrize("accept_encoding,expected", [
+    ("gzip", "gzip"),
+    ("gzip, br", "br"),
+    ("br;q=0.5, gzip", "gzip"),
+    ("identity", None),
+    ("gzip;q=0", None),
+    ("", None),
+])
+def test_choose_encoding(accept_encoding, expected):
+    assert choose_encoding(accept_encoding) == expected
+
+
+def test_json_is_written_by_the_adapter(monkeypatch):
+    class Row:
+        id, name, birth_date = 1, "Ada", date(1815, 12, 10)
+
+    adapter = TypeAdapter(AuthorPersonRead)
+    response = serialize(adapter, Row())
+    # no intermediate dicts on the JSON path
+    monkeypatch.setattr(TypeAdapter, "dump_python", lambda *args, **kwargs: pytest.fail("dump_python called"))
+    body, media_type = response.encode("application/json")
+    assert media_type == "application/json"
+    assert orjson.loads(body) == {"id": 1, "name": "Ada", "birth_date": "1815-12-10"}
+
+
+def test_msgpack_matches_json(client, db_session, negotiated_books):
+    author = negotiated_books(2)
+
+    as_json = client.get("/materials/books")
+    as_msgpack = client.get("/materials/books", headers={"Accept": "application/msgpack"})
+    assert as_json.headers["content-type"] == "application/json"
+    assert as_msgpack.headers["content-type"] == "application/msgpack"
+    assert "Accept" in as_msgpack.headers["vary"]
+    assert msgpack.unpackb(as_msgpack.content) == as_json.json()
+
+    # dates are sent as ISO strings, like in JSON
+    r = client.get(f"/authors/persons/{author['id']}", headers={"Accept": "application/msgpack"})
+    assert msgpack.unpackb(r.content)["birth_date"] == "1970-01-01"
+
+
+def test_compression_threshold(client, db_session, negotiated_books):
+    negotiated_books(10)
+
+    r = client.get("/materials/books", headers={"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip"
+    assert int(r.headers["content-length"]) < len(r.content)
+    assert r.json()["total"] == 10
+
+    # an identical hot response reuses the compressed body
+    hits = precompressed_cache.hits
+    r2 = client.get("/materials/books", headers={"Accept-Encoding": "gzip"})
+    assert r2.content == r.content
+    assert precompressed_cache.hits == hits + 1
+
+    # small bodies are sent as-is
+    r = client.get("/materials/books?page_size=1&fields=id", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in r.headers
+
+    r = client.get("/materials/books", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in r.headers
+
+
+def test_streaming_export_is_compressed(client, db_session, negotiated_books):
+    negotiated_books(3)
+
+    with client.stream("GET", "/materials/books/export", headers={"Accept-Encoding": "gzip"}) as r:
+        raw = b"".join(r.iter_raw())
+    assert r.headers["content-encoding"] == "gzip"
+    assert len(gzip.decompress(raw).splitlines()) == 3
@@ -0,0 +1,89 @@
+import pytest
+from sqlalchemy.orm.exc import StaleDataError
+
+import app.db.crud as crud
+
+
+@pytest.fixture
+def tagged_book(make_user, make_author, make_material):
+    """Return a helper creating "etag@example.com", an author and a book: (auth, author, book)."""
+
+    def _tagged_book(status="published"):
+        user = make_user("etag@example.com", "password")
+        auth = (user["email"], "password")
+        author = make_author(auth, "Tagged Author")
+        book = make_material(auth, "books", title="Tagged Book", description="Tagged", status=status, author_id=author["id"])
+        return auth, author, book
+
+    return _tagged_book
+
+
+def test_detail_etag_and_not_modified(client, tagged_book):
+    auth, author, book = tagged_book()
+
+    r = client.get(f"/materials/books/{book['id']}")
+    assert r.status_code == 200
+    etag = r.headers["etag"]
+    assert not etag.startswith("W/")
+
+    r = client.get(f"/materials/books/{book['id']}", headers={"If-None-Match": etag})
+    assert r.status_code == 304
+    assert r.headers["etag"] == etag
+    assert r.content == b""
+
+    # sparse and msgpack representations carry their own tags
+    assert client.get(f"/materials/books/{book['id']}?fields=title").headers["etag"] != etag
+    assert client.get(f"/materials/books/{book['id']}", headers={"Accept": "application/msgpack"}).headers["etag"] != etag
+
+    r = client.put(f"/materials/books/{book['id']}", json={**book, "title": "Retitled Book"}, auth=auth)
+    assert r.status_code == 200, r.text
+
+    r = client.get(f"/materials/books/{book['id']}", headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.json()["title"] == "Retitled Book"
+    assert r.headers["etag"] != etag
+
+    r = client.get(f"/authors/{author['id']}")
+    assert r.status_code == 200
+    r = client.get(f"/authors/{author['id']}", headers={"If-None-Match": r.headers["etag"]})
+    assert r.status_code == 304
+
+
+def test_concurrent_update_is_a_conflict(client, tagged_book, monkeypatch):
+    auth, author, book = tagged_book()
+
+    def lost_race(*args, **kwargs):
+        # what the version check raises when another request updated the row first
+        raise StaleDataError("UPDATE statement on table 'materials' expected to update 1 row(s); 0 were matched.")
+
+    monkeypatch.setattr(crud, "update_book", lost_race)
+    r = client.put(f"/materials/books/{book['id']}", json={**book, "title": "Lost Update"}, auth=auth)
+    assert r.status_code == 409
+    assert r.json() == {"detail": "Modified concurrently, retry with the current version"}
+
+
+def test_list_weak_etag(client, tagged_book):
+    auth, author, book = tagged_book()
+
+    r = client.get("/materials/books")
+    assert r.status_code == 200
+    etag = r.headers["etag"]
+    assert etag.startswith("W/")
+    assert client.get("/materials/books", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/materials/books", headers={"If-None-Match": "*"}).status_code == 304
+
+    r = client.put(f"/materials/books/{book['id']}", json={**book, "page_count": 11}, auth=auth)
+    assert r.status_code == 200, r.text
+    assert client.get("/materials/books", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_conditional_get_still_checks_visibility(client, tagged_book):
+    auth, _, book = tagged_book(status="draft")
+
+    r = client.get(f"/materials/books/{book['id']}", auth=auth)
+    assert r.status_code == 200
+    etag = r.headers["etag"]
+
+    assert client.get(f"/materials/books/{book['id']}", headers={"If-None-Match": etag}).status_code == 403
+    assert client.get(f"/materials/books/{book['id']}", headers={"If-None-Match": etag}, auth=auth).status_code == 304
+    assert client.get("/materials/books/999999", headers={"If-None-Match": etag}).status_code == 404
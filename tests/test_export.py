@@ -0,0 +1,81 @@
+import csv
+import io
+import json
+
+import pytest
+
+import app.db.crud as crud
+
+
+@pytest.fixture
+def exported_materials(make_user, make_author, make_material):
+    """Return a helper creating two published books, a draft book and a video for "exporter@example.com"; returns auth."""
+
+    def _exported_materials():
+        owner = make_user("exporter@example.com", "password")
+        auth = (owner["email"], "password")
+        author = make_author(auth, "Export Author")
+        for i, status in enumerate(["published", "published", "draft"]):
+            make_material(auth, "books", title=f"Export Book {i}", description="desc, with comma", status=status, author_id=author["id"])
+        make_material(auth, "videos", title="Export Video", author_id=author["id"])
+        return auth
+
+    return _exported_materials
+
+
+def test_export_ndjson_respects_visibility(client, db_session, exported_materials):
+    auth = exported_materials()
+
+    r = client.get("/materials/export")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in r.text.splitlines()]
+    assert [row["title"] for row in rows] == ["Export Book 0", "Export Book 1", "Export Video"]
+    assert rows[0]["type"] == "book"
+
+    # the owner also sees their draft
+    r = client.get("/materials/books/export", auth=auth)
+    assert len(r.text.splitlines()) == 3
+
+    r = client.get("/materials/export?title=video&fields=id,title")
+    rows = [json.loads(line) for line in r.text.splitlines()]
+    assert len(rows) == 1 and set(rows[0]) == {"id", "title"}
+
+
+def test_export_csv(client, db_session, exported_materials):
+    exported_materials()
+
+    r = client.get("/materials/books/export?format=csv&fields=title,description,isbn")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/csv")
+    rows = list(csv.reader(io.StringIO(r.text)))
+    assert rows[0] == ["title", "description", "isbn"]
+    assert [row[0] for row in rows[1:]] == ["Export Book 0", "Export Book 1"]
+    assert rows[1][1] == "desc, with comma"
+
+    # header only when nothing matches
+    r = client.get("/materials/articles/export?format=csv&fields=id,doi")
+    assert r.text.splitlines() == ["id,doi"]
+
+    r = client.get("/materials/export?format=xml")
+    assert r.status_code == 422
+
+
+def test_export_pages_by_id(client, db_session, exported_materials, monkeypatch):
+    exported_materials()
+    export = crud.export_materials
+    calls = []
+
+    def paged(db, *args, **kwargs):
+        page = export(db, *args, **{**kwargs, "batch_size": 2})
+        calls.append((kwargs["after"], len(page.rows)))
+        return page
+
+    monkeypatch.setattr(crud, "export_materials", paged)
+    r = client.get("/materials/export?fields=title")
+    assert [json.loads(line)["title"] for line in r.text.splitlines()] == ["Export Book 0", "Export Book 1", "Export Video"]
+    # keyset pages: each continues after the last id of the one before
+    assert calls == [(0, 2), (2, 1)]
+
+    r = client.get("/materials/books/export?format=csv&fields=title", auth=("exporter@example.com", "password"))
+    assert r.text.splitlines() == ["title", "Export Book 0", "Export Book 1", "Export Book 2"]
@@ -0,0 +1,93 @@
+import pytest
+
+import app.db.crud as crud
+
+
+@pytest.fixture
+def facet_materials(make_user, make_author, make_material):
+    """Return a helper creating two authors and four materials, one a draft: (auth, ada, lab, created)."""
+
+    def _facet_materials():
+        user = make_user("facets@example.com", "password")
+        auth = (user["email"], "password")
+        ada = make_author(auth, "Ada")["id"]
+        lab = make_author(auth, "Lab", "institutions")["id"]
+        created = [make_material(auth, "books", title=f"Facet Book {i}", author_id=ada) for i in range(2)]
+        created.append(make_material(auth, "articles", title="Facet Draft", status="draft", author_id=ada, doi="10.1234/facets"))
+        created.append(make_material(auth, "videos", title="Lab Video", author_id=lab))
+        return auth, ada, lab, created
+
+    return _facet_materials
+
+
+def test_unfiltered_facets_come_from_the_summary_table(client, facet_materials, capture_sql):
+    auth, ada, lab, created = facet_materials()
+
+    with capture_sql() as executed:
+        r = client.get("/materials/facets")
+    assert r.status_code == 200, r.text
+    assert not [s for s in executed if "FROM materials" in s]
+    assert r.json() == {
+        "total": 3,
+        "type": {"book": 2, "video": 1},
+        "status": {"published": 3},
+        "author": [{"id": ada, "name": "Ada", "count": 2}, {"id": lab, "name": "Lab", "count": 1}],
+    }
+
+    # the owner also sees their draft
+    body = client.get("/materials/facets", auth=auth).json()
+    assert body["total"] == 4
+    assert body["type"] == {"book": 2, "article": 1, "video": 1}
+    assert body["status"] == {"published": 3, "draft": 1}
+    assert body["author"][0] == {"id": ada, "name": "Ada", "count": 3}
+
+    with capture_sql() as executed:
+        assert client.get("/materials/facets?authors=1").json()["author"] == [{"id": ada, "name": "Ada", "count": 2}]
+    # the top authors are picked by the database, not by reading every author's count
+    assert [s for s in executed if "FROM material_author_counts" in s and "LIMIT" in s]
+
+
+def test_own_materials_can_lift_an_author_into_the_top(client, facet_materials):
+    auth, ada, lab, created = facet_materials()
+    for i in range(3):
+        payload = {"title": f"Lab Draft {i}", "description": "d", "status": "draft", "author_id": lab, "duration": 5}
+        assert client.post("/materials/videos", json=payload, auth=auth).status_code == 201
+    assert client.get("/materials/facets?authors=1").json()["author"] == [{"id": ada, "name": "Ada", "count": 2}]
+    assert client.get("/materials/facets?authors=1", auth=auth).json()["author"] == [{"id": lab, "name": "Lab", "count": 4}]
+
+
+def test_filtered_facets_match_the_listing(client, facet_materials):
+    auth, ada, lab, created = facet_materials()
+    body = client.get("/materials/facets", params={"title": "facet"}).json()
+    assert body == {"total": 2, "type": {"book": 2}, "status": {"published": 2}, "author": [{"id": ada, "name": "Ada", "count": 2}]}
+    assert body["total"] == client.get("/materials", params={"title": "facet"}).json()["total"]
+
+    body = client.get("/materials/facets", params={"author_name": "lab"}, auth=auth).json()
+    assert body["type"] == {"video": 1} and body["author"] == [{"id": lab, "name": "Lab", "count": 1}]
+
+
+def test_summary_without_a_native_upsert(client, facet_materials, monkeypatch):
+    # dialects without INSERT ... ON CONFLICT update, then insert
+    monkeypatch.setattr(crud, "_UPSERTS", {})
+    test_summary_follows_writes(client, facet_materials)
+
+
+def test_summary_follows_writes(client, facet_materials):
+    auth, ada, lab, created = facet_materials()
+    book, _, draft, video = created
+    fields = ("title", "description", "status", "author_id")
+    r = client.put(f"/materials/articles/{draft['id']}", json={**{k: draft[k] for k in fields}, "doi": draft["doi"], "status": "published"}, auth=auth)
+    assert r.status_code == 200, r.text
+    r = client.put(f"/materials/videos/{video['id']}", json={**{k: video[k] for k in fields}, "duration": 5, "author_id": ada}, auth=auth)
+    assert r.status_code == 200, r.text
+    assert client.delete(f"/materials/books/{book['id']}", auth=auth).status_code == 200
+
+    summary = client.get("/materials/facets").json()
+    # every material has description "d": the same counts through the GROUP BY path
+    assert summary == client.get("/materials/facets", params={"description": "d"}).json()
+    assert summary == {
+        "total": 3,
+        "type": {"book": 1, "article": 1, "video": 1},
+        "status": {"published": 3},
+        "author": [{"id": ada, "name": "Ada", "count": 3}],
+    }
@@ -0,0 +1,61 @@
+from app.core.trigram_index import TrigramIndex, trigrams
+from app.middleware.rate_limit import classify
+
+
+def test_trigrams_pad_each_word():
+    assert trigrams("Ox!") == {"  o", " ox", "ox "}
+    assert trigrams("Gatsby") == {"  g", " ga", "gat", "ats", "tsb", "sby", "by "}
+
+
+def test_trigram_index_tolerates_typos():
+    index = TrigramIndex("test_fuzzy", min_score=0.5, max_candidates=100)
+    index.load([(1, "The Great Gatsby", "gatsby"), (2, "Great Expectations", "expectations"), (3, "Gaston", "gaston")])
+    matches = index.search("gatsbi")
+    assert [value for value, _ in matches] == ["gatsby"]
+    assert 0.5 <= matches[0][1] < 1
+    assert [value for value, _ in index.search("grate expectatons")] == ["expectations"]
+    assert index.search("zzzz") == []
+
+    index.refresh({1}, [(1, "Tender Is the Night", "night")])
+    assert index.search("gatsby") == []
+    assert [value for value, _ in index.search("tender nigth")] == ["night"]
+    assert index.stats()["entries"] == 3
+
+
+def test_candidate_cap_keeps_the_best_candidates():
+    index = TrigramIndex("test_fuzzy_cap", min_score=0.3, max_candidates=1)
+    index.load([(1, "abcdef", "close"), (2, "abcxyz", "far")])
+    assert [value for value, _ in index.search("abcdeg")] == ["close"]
+
+
+def test_fuzzy_search_endpoint(client, make_user, make_isbn13):
+    user = make_user("fuzzy@example.com", "password")
+    auth = (user["email"], "password")
+    author = client.post("/authors/persons", json={"name": "Fyodor Dostoevsky", "birth_date": "1921-11-11"}, auth=auth).json()
+    book = {"title": "Crime and Punishment", "description": "d", "status": "published", "author_id": author["id"], "isbn": make_isbn13(970), "page_count": 10}
+    book = client.post("/materials/books", json=book, auth=auth).json()
+    draft = {"title": "Crime Notebook", "description": "d", "status": "draft", "author_id": author["id"], "doi": "10.1234/crime"}
+    client.post("/materials/articles", json=draft, auth=auth)
+
+    # ilike finds nothing for a misspelling
+    assert client.get("/materials", params={"title": "punishmnet"}).json()["total"] == 0
+    r = client.get("/materials/fuzzy", params={"q": "punishmnet"})
+    assert r.status_code == 200, r.text
+    titles = r.json()["titles"]
+    assert [(item["id"], item["text"], item["type"]) for item in titles] == [(book["id"], "Crime and Punishment", "book")]
+    assert 0.5 <= titles[0]["score"] < 1
+
+    assert [item["text"] for item in client.get("/materials/fuzzy", params={"q": "crme"}).json()["titles"]] == ["Crime and Punishment"]
+    authors = client.get("/materials/fuzzy", params={"q": "dostoyevsky"}).json()["authors"]
+    assert [item["id"] for item in authors] == [author["id"]]
+
+    fields = ("title", "description", "status", "author_id")
+    r = client.put(f"/materials/books/{book['id']}", json={**{k: book[k] for k in fields}, "isbn": book["isbn"], "page_count": 10, "title": "The Idiot"}, auth=auth)
+    assert r.status_code == 200, r.text
+    assert client.get("/materials/fuzzy", params={"q": "punishmnet"}).json()["titles"] == []
+    assert [item["text"] for item in client.get("/materials/fuzzy", params={"q": "idiott"}).json()["titles"]] == ["The Idiot"]
+
+
+def test_fuzzy_search_is_rate_limited_as_search():
+    assert classify("GET", "/materials/fuzzy", b"q=x") == "search"
+    assert classify("GET", "/materials/autocomplete", b"q=x") == "read"
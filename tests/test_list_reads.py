@@ -0,0 +1,59 @@
+import pytest
+
+
+@pytest.fixture
+def listed_materials(make_user, make_author, make_material):
+    """Return a helper creating a person, an institution, three books and a video: (person, institution)."""
+
+    def _listed_materials():
+        user = make_user("lists@example.com", "password")
+        auth = (user["email"], "password")
+        person = make_author(auth, "Ada Person")
+        institution = make_author(auth, "Acme Institute", "institutions")
+        for i, author in enumerate([person, institution, person]):
+            make_material(auth, "books", title=f"List Book {i}", description="desc", author_id=author["id"], page_count=10 + i)
+        make_material(auth, "videos", title="List Video", description="desc", author_id=institution["id"], duration=12)
+        return person, institution
+
+    return _listed_materials
+
+
+def test_material_lists_return_full_items(client, db_session, listed_materials):
+    person, institution = listed_materials()
+
+    r = client.get("/materials/books")
+    assert r.status_code == 200
+    data = r.json()
+    assert data["total"] == 3
+    first = data["items"][0]
+    assert set(first) == {"id", "title", "description", "status", "author_id", "user_id", "isbn", "page_count"}
+    assert first["page_count"] == 10
+
+    r = client.get("/materials")
+    items = r.json()["items"]
+    assert [m["type"] for m in items] == ["book", "book", "book", "video"]
+
+    # author_name filter matches person and institution names
+    r = client.get("/materials?author_name=acme")
+    assert r.json()["total"] == 2
+    r = client.get("/materials/books?author_name=ada")
+    assert r.json()["total"] == 2
+
+
+def test_author_lists(client, db_session, listed_materials):
+    person, institution = listed_materials()
+
+    r = client.get("/authors")
+    assert r.status_code == 200
+    assert r.json()["items"] == [
+        {"id": person["id"], "type": "person", "name": "Ada Person"},
+        {"id": institution["id"], "type": "institution", "name": "Acme Institute"},
+    ]
+
+    r = client.get("/authors/persons")
+    assert r.status_code == 200
+    assert r.json()["items"] == [{"id": person["id"], "name": "Ada Person", "birth_date": "1970-01-01"}]
+
+    r = client.get("/authors/institutions")
+    assert r.status_code == 200
+    assert r.json()["items"] == [{"id": institution["id"], "name": "Acme Institute", "city": "Lisbon"}]
@@ -0,0 +1,69 @@
+import asyncio
+
+import httpx
+
+from app.middleware.load_shedding import LoadShedder, LoadSheddingMiddleware, classify
+
+
+def test_classify():
+    assert classify("GET", "/materials") == "read"
+    assert classify("GET", "/materials/books/export") == "export"
+    assert classify("POST", "/materials/books") == "enrichment"
+    assert classify("POST", "/materials/articles") == "write"
+    assert classify("DELETE", "/materials/books/3") == "write"
+
+
+def test_expensive_classes_are_shed_first(gated_app):
+    shedder = LoadShedder(max_in_flight=10, max_queue_delay=0, max_thread_queue=0)
+    app = gated_app
+
+    async def main():
+        transport = httpx.ASGITransport(app=LoadSheddingMiddleware(app, shedder))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            held = []
+
+            async def hold(method, url, n):
+                held.extend(asyncio.create_task(client.request(method, f"{url}?n={i}")) for i in range(n))
+                await asyncio.sleep(0.05)
+
+            # pressure 0.5: book creation (may call OpenLibrary) is rejected, writes are admitted
+            await hold("GET", "/materials", 5)
+            enrichment = await client.post("/materials/books", json={})
+            # pressure 0.8: writes are rejected, reads still admitted
+            await hold("PUT", "/materials/articles/1", 3)
+            write = await client.delete("/materials/videos/1")
+            # pressure 1.0: even reads are rejected, but metrics stay reachable
+            await hold("GET", "/authors", 2)
+            read = await client.get("/materials")
+            await hold("GET", "/metrics", 1)
+            stats = shedder.stats()
+            app.release.set()
+            return enrichment, write, read, await asyncio.gather(*held), stats
+
+    enrichment, write, read, done, stats = asyncio.run(main())
+    for rejected in (enrichment, write, read):
+        assert rejected.status_code == 503
+        assert rejected.headers["retry-after"] == "1"
+        assert rejected.json() == {"detail": "Service overloaded, retry later"}
+    assert {r.status_code for r in done} == {200}
+    assert app.calls == 11
+    assert stats["in_flight"] == 10
+    assert stats["shed"] == {"enrichment": 1, "write": 1, "export": 0, "read": 1}
+    assert shedder.in_flight == 0
+
+
+def test_queue_delay_raises_pressure():
+    shedder = LoadShedder(max_in_flight=100, max_queue_delay=0.01, max_thread_queue=0, smoothing=1.0)
+    shedder.queue_delay = 0.007
+    assert shedder.admit("read") and shedder.admit("write")
+    assert not shedder.admit("enrichment")
+    shedder.queue_delay = 0.02
+    assert not shedder.admit("read")
+
+
+def test_load_shedding_state_in_metrics(client, root_credentials):
+    r = client.get("/metrics", auth=root_credentials)
+    assert r.status_code == 200
+    state = r.json()["load_shedding"]
+    assert state["in_flight"] == 0
+    assert set(state["thresholds"]) == {"enrichment", "write", "export", "read"}
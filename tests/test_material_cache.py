@@ -0,0 +1,70 @@
+from app.core.cache import TTLCache, get_cache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_cache_expiry_lru_and_generation():
+    clock = FakeClock()
+    cache = TTLCache("test-ttl", maxsize=2, ttl=10, clock=clock)
+
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)  # evicts "b", the least recently used
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+    clock.now = 11
+    assert cache.get("a") is None
+
+    # a load that raced with an invalidation is not cached
+    generation = cache.generation()
+    cache.invalidate("a")
+    assert cache.set("a", "stale", generation) is False
+    assert cache.get("a") is None
+    assert cache.stats()["hits"] == 2
+
+
+def test_published_detail_is_cached_and_invalidated(client, make_user, make_author, make_material):
+    user = make_user("cache@example.com", "password")
+    auth = (user["email"], "password")
+    author = make_author(auth, "Cached Author")
+    book = make_material(auth, "books", title="Cached Book", description="Cached", author_id=author["id"])
+    cache = get_cache("materials")
+
+    assert client.get(f"/materials/books/{book['id']}").json()["title"] == "Cached Book"
+    assert client.get(f"/materials/{book['id']}").status_code == 200
+    hits = cache.stats()["hits"]
+    r = client.get(f"/materials/books/{book['id']}?fields=id,title")
+    assert r.json() == {"id": book["id"], "title": "Cached Book"}
+    assert cache.stats()["hits"] == hits + 1
+
+    r = client.put(f"/materials/books/{book['id']}", json={**book, "title": "Renamed Book"}, auth=auth)
+    assert r.status_code == 200, r.text
+    assert client.get(f"/materials/books/{book['id']}").json()["title"] == "Renamed Book"
+    assert client.get(f"/materials/{book['id']}").json()["title"] == "Renamed Book"
+
+    # unpublishing hides it again from anonymous readers
+    r = client.put(f"/materials/books/{book['id']}", json={**book, "status": "draft"}, auth=auth)
+    assert r.status_code == 200, r.text
+    assert client.get(f"/materials/books/{book['id']}").status_code == 403
+
+    assert client.delete(f"/materials/books/{book['id']}", auth=auth).status_code in (200, 204)
+    assert client.get(f"/materials/books/{book['id']}", auth=auth).status_code == 404
+
+
+def test_drafts_are_not_cached(client, make_user, make_author, make_material):
+    user = make_user("cache-draft@example.com", "password")
+    auth = (user["email"], "password")
+    author = make_author(auth, "Cached Author")
+    book = make_material(auth, "books", title="Cached Book", description="Cached", status="draft", author_id=author["id"])
+
+    assert client.get(f"/materials/books/{book['id']}", auth=auth).status_code == 200
+    assert client.get(f"/materials/books/{book['id']}").status_code == 403
+    assert get_cache("materials").stats()["size"] == 0
@@ -0,0 +1,30 @@
+from sqlalchemy import create_engine, inspect, text
+
+from app.db.migrate import upgrade
+
+
+def test_upgrade_brings_an_old_database_up_to_date(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    # the tables as the first release created them, without row versions
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE authors (id INTEGER PRIMARY KEY, type VARCHAR(50) NOT NULL)"))
+        conn.execute(text(
+            "CREATE TABLE materials (id INTEGER PRIMARY KEY, title VARCHAR(300) NOT NULL, description VARCHAR(1000),"
+            " status VARCHAR(9) NOT NULL, author_id INTEGER NOT NULL, user_id INTEGER NOT NULL, type VARCHAR(50) NOT NULL)"
+        ))
+        conn.execute(text("INSERT INTO authors (id, type) VALUES (1, 'person')"))
+        conn.execute(text("INSERT INTO materials VALUES (1, 'Old Book', NULL, 'published', 1, 1, 'book')"))
+
+    steps = upgrade(engine)
+    assert "added column materials.version" in steps and "added column authors.version" in steps
+    assert {"created table material_type_counts", "created table material_author_counts", "created table cache_changes"} <= set(steps)
+    assert "created table materials" not in steps
+    assert "version" in {column["name"] for column in inspect(engine).get_columns("materials")}
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT version FROM materials WHERE id = 1")).scalar_one() == 1
+        # the existing material is counted
+        assert conn.execute(text("SELECT type, status, total FROM material_type_counts")).all() == [("book", "published", 1)]
+        assert conn.execute(text("SELECT author_id, status, total FROM material_author_counts")).all() == [(1, "published", 1)]
+
+    # idempotent
+    assert upgrade(engine) == []
@@ -0,0 +1,120 @@
+import pytest
+
+import app.db.crud as crud
+
+
+@pytest.fixture
+def batch_materials(make_user, make_author, make_material):
+    """Return a helper creating three books and two articles, the last of each a draft: (auth, books, articles)."""
+
+    def _batch_materials():
+        user = make_user("batch@example.com", "password")
+        auth = (user["email"], "password")
+        author_id = make_author(auth, "Batch Author")["id"]
+        books = [make_material(auth, "books", title=f"Batch Book {i}", status=status, author_id=author_id) for i, status in enumerate(("published", "published", "draft"))]
+        articles = [make_material(auth, "articles", title=f"Batch Article {i}", status=status, author_id=author_id, doi=f"10.1234/batch{i}") for i, status in enumerate(("published", "draft"))]
+        return auth, books, articles
+
+    return _batch_materials
+
+
+def _selects(executed):
+    # the credential lookup aside
+    return [s for s in executed if s.lstrip().upper().startswith("SELECT") and "FROM users" not in s]
+
+
+def test_multi_get_by_ids(client, batch_materials, capture_sql):
+    auth, books, articles = batch_materials()
+    ids = [articles[0]["id"], books[1]["id"], 999999, books[2]["id"], books[0]["id"]]
+    query = ",".join(map(str, ids[:3])) + f"&ids={ids[3]}&ids={ids[4]},{ids[0]}"
+
+    with capture_sql() as executed:
+        r = client.get(f"/materials?ids={query}")
+    assert r.status_code == 200, r.text
+    body = r.json()
+    # one IN query, items in request order, each key reported once
+    selects = _selects(executed)
+    assert len(selects) == 1 and " IN " in selects[0]
+    assert [item["id"] for item in body["items"]] == [articles[0]["id"], books[1]["id"], books[0]["id"]]
+    assert body["missing"] == [999999]
+    assert body["forbidden"] == [books[2]["id"]]
+    assert "ETag" in r.headers
+
+    # the owner sees their draft
+    body = client.get(f"/materials?ids={books[2]['id']}", auth=auth).json()
+    assert [item["id"] for item in body["items"]] == [books[2]["id"]] and body["forbidden"] == []
+
+    body = client.get(f"/materials?ids={books[0]['id']}&fields=id,title").json()
+    assert body["items"] == [{"id": books[0]["id"], "title": "Batch Book 0"}]
+
+
+def test_multi_get_by_isbn_and_doi(client, batch_materials, make_isbn13):
+    auth, books, articles = batch_materials()
+    unknown_isbn = make_isbn13(799)
+    r = client.get("/materials/books", params={"isbn": f"{books[1]['isbn']},{unknown_isbn},{books[2]['isbn']},{books[0]['isbn']}"})
+    assert r.status_code == 200, r.text
+    body = r.json()
+    assert [item["isbn"] for item in body["items"]] == [books[1]["isbn"], books[0]["isbn"]]
+    assert body["items"][0]["page_count"] == 10
+    assert body["missing"] == [unknown_isbn]
+    assert body["forbidden"] == [books[2]["isbn"]]
+
+    body = client.get("/materials/articles", params=[("doi", articles[1]["doi"]), ("doi", articles[0]["doi"]), ("doi", "10.1234/none")], auth=auth).json()
+    assert [item["doi"] for item in body["items"]] == [articles[1]["doi"], articles[0]["doi"]]
+    assert body["missing"] == ["10.1234/none"]
+
+
+def test_multi_get_matches_dois_in_any_case(client, batch_materials, monkeypatch):
+    auth, books, articles = batch_materials()
+    by_keys = crud.get_materials_by_keys
+    # what MySQL's case-insensitive collation returns for the IN query
+    monkeypatch.setattr(crud, "get_materials_by_keys", lambda db, kind, key, values, **kw: by_keys(db, kind, key, [v.lower() for v in values], **kw))
+    doi = articles[0]["doi"]
+    body = client.get("/materials/articles", params=[("doi", doi.upper()), ("doi", doi)]).json()
+    assert [item["doi"] for item in body["items"]] == [doi]
+    assert body["missing"] == [] and body["forbidden"] == []
+
+
+def test_multi_get_etag_covers_missing_and_forbidden(client, batch_materials):
+    auth, books, articles = batch_materials()
+    url = f"/materials?ids={books[0]['id']},{books[2]['id']}"
+    before = client.get(url)
+    assert before.json()["forbidden"] == [books[2]["id"]]
+    # the draft is deleted: the items are unchanged, the representation is not
+    assert client.delete(f"/materials/books/{books[2]['id']}", auth=auth).status_code == 200
+    after = client.get(url)
+    assert after.json()["missing"] == [books[2]["id"]]
+    assert after.headers["etag"] != before.headers["etag"]
+
+
+def _isbn10(isbn13: str) -> str:
+    digits = isbn13[3:12]
+    check = -sum((10 - i) * int(d) for i, d in enumerate(digits)) % 11
+    return digits + ("X" if check == 10 else str(check))
+
+
+def test_multi_get_normalizes_isbns(client, batch_materials):
+    auth, books, articles = batch_materials()
+    isbn = books[0]["isbn"]
+    hyphenated = f"{isbn[:3]}-{isbn[3:5]}-{isbn[5:12]}-{isbn[12]}"
+    r = client.get("/materials/books", params=[("isbn", hyphenated), ("isbn", _isbn10(books[1]["isbn"])), ("isbn", "0-306-40615-2")])
+    assert r.status_code == 200, r.text
+    body = r.json()
+    assert [item["isbn"] for item in body["items"]] == [books[0]["isbn"], books[1]["isbn"]]
+    # reported in the stored 13-digit form
+    assert body["missing"] == ["9780306406157"]
+
+    for bad in ("9780306406158", "0306406153", "not-an-isbn"):
+        r = client.get("/materials/books", params={"isbn": bad})
+        assert r.status_code == 400, bad
+        assert r.json()["detail"][0]["loc"] == ["query", "isbn"]
+
+
+def test_multi_get_rejects_bad_keys(client):
+    r = client.get("/materials?ids=1,abc")
+    assert r.status_code == 400
+    assert r.json()["detail"][0]["loc"] == ["query", "ids"]
+    assert client.get("/materials?ids=" + ",".join(str(i) for i in range(1, 102))).status_code == 400
+    assert client.get("/materials?ids=").status_code == 400
+    # without the parameter the list endpoint is unchanged
+    assert "total" in client.get("/materials").json()
@@ -2,26 +2,14 @@ from app import schemas
 import requests
 
 
-def _make_resp(status_code: int, data: dict):
-    class R:
-        def __init__(self, status_code, data):
-            self.status_code = status_code
-            self._data = data
-
-        def json(self):
-            return self._data
-
-    return R(status_code, data)
-
-
-def test_openlibrary_enrichment_success(monkeypatch, client, db_session, make_user):
+def test_openlibrary_enrichment_success(monkeypatch, client, db_session, make_user, fake_response):
     isbn = "9783161484100"
 
     # Mock successful OpenLibrary response with title and number_of_pages
     data = {f"ISBN:{isbn}": {"title": "Enriched Title", "number_of_pages": 321}}
 
     def fake_get(url, timeout=5):
-        return _make_resp(200, data)
+        return fake_response(200, data)
 
     monkeypatch.setattr(requests, "get", fake_get)
 
@@ -41,14 +29,14 @@ def test_openlibrary_enrichment_success(monkeypatch, client, db_session, make_us
     assert b["page_count"] == 321
 
 
-def test_openlibrary_enrichment_no_data_or_error(monkeypatch, client, db_session, make_user):
+def test_openlibrary_enrichment_no_data_or_error(monkeypatch, client, db_session, make_user, fake_response):
     # use a valid ISBN (same valid ISBN used in the success case) so model validation
     # doesn't fail with 422 and we can test enrichment behavior
     isbn = "9783161484100"
 
     # Case A: API returns 200 but no key present
     def fake_get_empty(url, timeout=5):
-        return _make_resp(200, {})
+        return fake_response(200, {})
 
     monkeypatch.setattr(requests, "get", fake_get_empty)
 
@@ -0,0 +1,78 @@
+import pytest
+
+
+def _unrestricted_book_loads(executed):
+    # full book rows may only be selected with an owner or visibility condition
+    return [s for s in executed if "books_page_count" in s and not ("materials.user_id =" in s or "materials.status =" in s)]
+
+
+@pytest.fixture
+def owned_book(make_user, make_author, make_material):
+    """Return a helper creating a user, an author and a book owned by that user: (auth, author, book)."""
+
+    def _owned_book(email, status="published"):
+        user = make_user(email, "password")
+        auth = (user["email"], "password")
+        author = make_author(auth, "Permission Author")
+        book = make_material(auth, "books", title="Permission Book", status=status, author_id=author["id"])
+        return auth, author, book
+
+    return _owned_book
+
+
+def test_root_only_routes_deny_before_querying(client, make_user, capture_sql):
+    user = make_user("plain@example.com", "password")
+    auth = (user["email"], "password")
+    for method, url in (("GET", "/users"), ("GET", "/users/1"), ("GET", "/metrics"), ("DELETE", f"/users/{user['id'] + 1}")):
+        with capture_sql() as executed:
+            r = client.request(method, url, auth=auth)
+        assert r.status_code == 403, (url, r.text)
+        # only the credential lookup ran
+        assert len(executed) == 1 and "FROM users" in executed[0]
+
+
+def test_users_update_and_delete_missing(client, root_credentials):
+    assert client.put("/users/999", json={"email": "x@example.com", "password": "password"}, auth=root_credentials).status_code == 404
+    assert client.delete("/users/999", auth=root_credentials).status_code == 404
+
+
+def test_non_owner_write_is_denied_without_loading_the_row(client, make_user, owned_book, capture_sql):
+    auth, author, book = owned_book("owner@example.com")
+    other = make_user("other@example.com", "password")
+    other_auth = (other["email"], "password")
+
+    with capture_sql() as executed:
+        r = client.put(f"/materials/books/{book['id']}", json={**book, "title": "Stolen"}, auth=other_auth)
+    assert r.status_code == 403
+    assert r.json()["detail"] == "Not allowed to modify this book"
+    assert not any(s.lstrip().upper().startswith("UPDATE") for s in executed)
+    assert _unrestricted_book_loads(executed) == []
+
+    assert client.delete(f"/materials/books/{book['id']}", auth=other_auth).status_code == 403
+    assert client.put("/materials/books/999999", json=book, auth=other_auth).status_code == 404
+    assert client.delete("/materials/books/999999", auth=other_auth).status_code == 404
+    assert client.get(f"/materials/books/{book['id']}").json()["title"] == "Permission Book"
+
+    # the owner's update loads the row once: the owner-restricted lookup, no separate state query
+    with capture_sql() as executed:
+        assert client.put(f"/materials/books/{book['id']}", json={**book, "title": "Renamed"}, auth=auth).status_code == 200
+    first_update = next(i for i, s in enumerate(executed) if s.lstrip().upper().startswith("UPDATE"))
+    assert len([s for s in executed[:first_update] if s.lstrip().upper().startswith("SELECT") and "materials" in s]) == 1
+    assert client.delete(f"/materials/books/{book['id']}", auth=auth).status_code == 200
+
+
+def test_draft_visibility_is_part_of_the_lookup(client, make_user, owned_book, capture_sql, root_credentials):
+    auth, _, book = owned_book("drafter@example.com", status="draft")
+    other = make_user("reader@example.com", "password")
+    url = f"/materials/books/{book['id']}"
+
+    assert client.get(url, auth=auth).status_code == 200
+    assert client.get(url, auth=root_credentials).status_code == 200
+    assert client.get(f"/materials/{book['id']}", auth=auth).status_code == 200
+    with capture_sql() as executed:
+        r = client.get(url)
+    assert r.status_code == 403
+    assert _unrestricted_book_loads(executed) == []
+    assert client.get(url, auth=(other["email"], "password")).status_code == 403
+    assert client.get(f"/materials/{book['id']}").status_code == 403
+    assert client.get("/materials/books/999999").status_code == 404
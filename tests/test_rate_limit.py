@@ -0,0 +1,111 @@
+import asyncio
+import base64
+
+import pytest
+
+from app.middleware.rate_limit import MemoryBackend, RateLimitBackend, RateLimiter, classify, principal, rate_limiter
+
+
+def test_classify():
+    assert classify("GET", "/materials", b"page=2") == "read"
+    assert classify("GET", "/materials", b"author_name=smith") == "search"
+    assert classify("GET", "/materials/books", b"description=&page=1") == "read"
+    assert classify("GET", "/materials/books/7", b"title=x") == "read"
+    assert classify("GET", "/materials/export", b"title=x") == "export"
+    assert classify("POST", "/materials/books", b"") == "write"
+
+
+def _scope(client, username=None, path="/authors"):
+    headers = []
+    if username is not None:
+        headers.append((b"authorization", b"Basic " + base64.b64encode(f"{username}:pw".encode())))
+    return {"type": "http", "method": "GET", "path": path, "query_string": b"", "headers": headers, "client": (client, 5000)}
+
+
+def test_principal_is_verified_username_else_client_ip():
+    scope = {"type": "http", "headers": [(b"authorization", b"Basic VXNlckBFeGFtcGxlLmNvbTpwdw==")], "client": ("10.0.0.1", 5000)}
+    assert principal(scope) == "ip:10.0.0.1"
+    assert principal(scope, {("user@example.com", "10.0.0.1")}) == "user:user@example.com"
+    assert principal(scope, {("user@example.com", "10.0.0.2")}) == "ip:10.0.0.1"
+    assert principal({"type": "http", "headers": [], "client": ("10.0.0.1", 5000)}) == "ip:10.0.0.1"
+    assert principal({"type": "http", "headers": [(b"authorization", b"Basic !!")], "client": None}) == "ip:unknown"
+
+
+def test_token_bucket_refills_at_rate():
+    now = [0.0]
+    backend = MemoryBackend(max_keys=2, clock=lambda: now[0])
+
+    def consume(key):
+        return asyncio.run(backend.consume(key, 2, 3))
+
+    assert [consume("a") for _ in range(3)] == [0, 0, 0]
+    assert consume("a") == 0.5
+    now[0] += 0.5
+    assert consume("a") == 0
+    assert consume("b") == 0 and consume("c") == 0
+    # "a" was least recently used and got dropped: it starts over with a full bucket
+    assert backend.stats()["buckets"] == 2
+    assert consume("a") == 0
+
+
+def test_over_limit_requests_get_429(client, make_user, root_credentials, monkeypatch):
+    monkeypatch.setitem(rate_limiter.limits, "search", (0.01, 2))
+    user = make_user("limited@example.com", "password")
+
+    statuses = [client.get("/materials", params={"author_name": "x"}).status_code for _ in range(3)]
+    assert statuses == [200, 200, 429]
+    r = client.get("/materials", params={"author_name": "x"})
+    assert r.status_code == 429
+    assert int(r.headers["retry-after"]) >= 1
+    assert r.json() == {"detail": "Too many requests, retry later"}
+
+    # other classes and other principals have their own buckets
+    assert client.get("/materials").status_code == 200
+    # the first authenticated request is still charged to the address; once verified, the user has a bucket
+    assert client.get("/materials", auth=(user["email"], "password")).status_code == 200
+    assert client.get("/materials", params={"author_name": "x"}, auth=(user["email"], "password")).status_code == 200
+
+    stats = client.get("/metrics", auth=root_credentials).json()
+    assert stats["rate_limits"]["limited"]["search"] == 2
+    assert stats["counters"]["rate_limited_search_requests"] == 2
+
+
+def test_backends_must_implement_consume():
+    class NoConsume(RateLimitBackend):
+        pass
+
+    with pytest.raises(TypeError):
+        NoConsume()
+
+
+def test_disabled_class_is_not_limited():
+    limiter = RateLimiter({"read": None, "search": None, "write": (1, 1), "export": None})
+    scope = {"type": "http", "method": "GET", "path": "/authors", "query_string": b"", "headers": [], "client": ("1.2.3.4", 1)}
+    assert all(asyncio.run(limiter.check(scope)) == 0 for _ in range(5))
+
+
+def test_unverified_usernames_cannot_drain_or_dodge_buckets():
+    limiter = RateLimiter({"read": (0.01, 2), "search": None, "write": None, "export": None})
+    limiter.verified("Victim@example.com", "10.0.0.1")
+
+    def check(client, username):
+        return asyncio.run(limiter.check(_scope(client, username)))
+
+    # someone else sending the victim's username pays from their own address
+    assert [check("10.0.0.66", "victim@example.com") > 0 for _ in range(3)] == [False, False, True]
+    assert check("10.0.0.1", "victim@example.com") == 0
+    # made-up usernames share the sender's (empty) bucket
+    assert check("10.0.0.66", "nobody-1@example.com") > 0
+    assert check("10.0.0.66", "nobody-2@example.com") > 0
+
+    limiter.rejected("victim@example.com", "10.0.0.1")
+    assert limiter.stats()["verified_principals"] == 0
+
+
+def test_rotating_usernames_get_429(client, make_user, monkeypatch):
+    monkeypatch.setitem(rate_limiter.limits, "read", (0.01, 2))
+    user = make_user("rotating@example.com", "password")
+    statuses = [client.get("/authors", auth=(f"fake-{i}@example.com", "x")).status_code for i in range(3)]
+    assert statuses == [200, 200, 429]
+    # a failed login with a real username does not earn it a bucket either
+    assert client.get("/authors", auth=(user["email"], "wrong")).status_code == 429
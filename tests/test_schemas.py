@@ -1,7 +1,7 @@
 import pytest
 from pydantic import ValidationError
 
-from app.schemas import UserCreate, BookCreate, ArticleCreate, MaterialBase
+from app.schemas import UserCreate, BookCreate, ArticleCreate, MaterialBase, BookPageAdapter, ArticleAdapter
 
 
 def test_user_password_min_length():
@@ -52,3 +52,31 @@ def test_material_status_validation():
             "status": "invalid-status",
             "author_id": 1,
         })
+
+
+def test_read_adapters_skip_input_validators():
+    # Read schemas serialize stored rows as-is; ISBN/DOI checks only run on input
+    book = {
+        "id": 1,
+        "user_id": 1,
+        "title": "Tit",
+        "description": "d",
+        "status": "published",
+        "author_id": 1,
+        "isbn": "123",
+        "page_count": 10,
+    }
+    envelope = {"items": [book], "total": 1, "page": 1, "page_size": 10, "links": {"first": None}}
+    dumped = BookPageAdapter.dump_python(BookPageAdapter.validate_python(envelope))
+    assert dumped["items"][0]["isbn"] == "123"
+
+    article = ArticleAdapter.validate_python({
+        "id": 2,
+        "user_id": 1,
+        "title": "Art",
+        "description": None,
+        "status": "draft",
+        "author_id": 1,
+        "doi": "not-a-doi",
+    })
+    assert article.doi == "not-a-doi"
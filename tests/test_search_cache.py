@@ -0,0 +1,47 @@
+def _searches(client, root_credentials):
+    r = client.get("/metrics", auth=root_credentials)
+    assert r.status_code == 200, r.text
+    return r.json()["caches"]["searches"]
+
+
+def test_anonymous_searches_are_cached_by_normalized_filters(client, make_user, make_author, make_material, root_credentials):
+    user = make_user("search@example.com", "password")
+    auth = (user["email"], "password")
+    author = make_author(auth, "Searched Author")
+    book = make_material(auth, "books", title="Python Tricks", description="Searchable", author_id=author["id"])
+    make_material(auth, "books", title="Rust Basics", description="Searchable", author_id=author["id"])
+
+    r = client.get("/materials?title=python")
+    assert [item["title"] for item in r.json()["items"]] == ["Python Tricks"]
+    before = _searches(client, root_credentials)
+
+    # same filter set modulo case, different fields: served from the cache
+    r = client.get("/materials?title=PYTHON&fields=id,title")
+    assert r.json()["items"] == [{"id": book["id"], "title": "Python Tricks"}]
+    assert r.json()["total"] == 1
+    after = _searches(client, root_credentials)
+    assert after["hits"] == before["hits"] + 1
+    assert after["hit_rate"] > 0
+
+    # a write clears the cache, so the renamed book drops out of the search
+    r = client.put(f"/materials/books/{book['id']}", json={**book, "title": "Go Patterns"}, auth=auth)
+    assert r.status_code == 200, r.text
+    r = client.get("/materials?title=python")
+    assert r.json()["items"] == [] and r.json()["total"] == 0
+
+
+def test_authenticated_searches_bypass_the_cache(client, make_user, make_author, make_material, root_credentials):
+    user = make_user("search-owner@example.com", "password")
+    auth = (user["email"], "password")
+    author = make_author(auth, "Searched Author")
+    book = make_material(auth, "books", title="Draft Python", description="Searchable", author_id=author["id"])
+    r = client.put(f"/materials/books/{book['id']}", json={**book, "status": "draft"}, auth=auth)
+    assert r.status_code == 200, r.text
+
+    assert client.get("/materials?title=python").json()["total"] == 0
+    assert client.get("/materials?title=python", auth=auth).json()["total"] == 1
+
+
+def test_metrics_requires_root(client, make_user):
+    user = make_user("metrics@example.com", "password")
+    assert client.get("/metrics", auth=(user["email"], "password")).status_code == 403
@@ -0,0 +1,84 @@
+import os
+import signal
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+import requests
+
+from app.server import Supervisor, worker_count
+
+
+def test_worker_count_respects_cpus_and_connection_budget(monkeypatch):
+    monkeypatch.delenv("WEB_CONCURRENCY", raising=False)
+    assert worker_count(cpus=4, pool_size=5, max_overflow=10, budget=150) == 4
+    assert worker_count(cpus=32, pool_size=5, max_overflow=10, budget=150) == 10
+    assert worker_count(cpus=8, pool_size=50, max_overflow=50, budget=10) == 1
+    monkeypatch.setenv("WEB_CONCURRENCY", "3")
+    assert worker_count(cpus=32) == 3
+
+
+def test_workers_failing_on_boot_back_off_then_give_up():
+    supervisor = Supervisor(None, "127.0.0.1", 0, 2, min_uptime=10, backoff_base=0.5, backoff_max=3, max_boot_failures=5)
+    delays = []
+    for _ in range(4):
+        assert supervisor._exited([1.0], now=100.0)
+        delays.append(supervisor.respawn_at - 100.0)
+    assert delays == [0.5, 1.0, 2.0, 3.0]
+    # a worker that ran for a while resets the count: it is replaced at once
+    assert supervisor._exited([60.0], now=200.0)
+    assert supervisor.boot_failures == 0 and supervisor.respawn_at == 103.0
+    for _ in range(4):
+        assert supervisor._exited([0.1], now=300.0)
+    assert not supervisor._exited([0.1], now=300.0)
+
+
+def _children(pid):
+    path = Path(f"/proc/{pid}/task/{pid}/children")
+    return set(map(int, path.read_text().split()))
+
+
+def _wait_for(predicate, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if predicate():
+                return
+        except (requests.ConnectionError, OSError):
+            pass
+        time.sleep(0.1)
+    raise AssertionError("timed out")
+
+
+@pytest.mark.skipif(not Path("/proc/self/task").exists() or not hasattr(os, "fork"), reason="needs fork and /proc")
+def test_supervisor_serves_restarts_and_stops(db_session, free_port):
+    port = free_port()
+    url = f"http://127.0.0.1:{port}/openapi.json"
+    env = dict(os.environ, DATABASE_URL=os.environ["TEST_DATABASE_URL"])
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "app.server", "--host", "127.0.0.1", "--port", str(port), "--workers", "2", "--graceful-timeout", "5"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        _wait_for(lambda: requests.get(url, timeout=1).status_code == 200 and len(_children(proc.pid)) == 2)
+        before = _children(proc.pid)
+
+        proc.send_signal(signal.SIGHUP)
+        _wait_for(lambda: len(_children(proc.pid)) == 2 and not (_children(proc.pid) & before))
+        assert requests.get(url, timeout=5).status_code == 200
+
+        # a crashed worker is replaced
+        victim = next(iter(_children(proc.pid)))
+        os.kill(victim, signal.SIGKILL)
+        _wait_for(lambda: len(_children(proc.pid)) == 2 and victim not in _children(proc.pid))
+
+        proc.send_signal(signal.SIGTERM)
+        assert proc.wait(timeout=20) == 0
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
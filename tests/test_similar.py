@@ -0,0 +1,159 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("scipy")
+
+import app.db.crud as crud
+from app.core import similarity
+from app.db.changes import change_feed
+from app.core.similarity import SimilarityIndex
+
+DOCUMENTS = [
+    (1, "whales sea voyage captain", "moby"),
+    (2, "sea voyage island treasure", "treasure"),
+    (3, "whales ocean biology", "whales"),
+    (4, "kitchen recipes bread", "bread"),
+]
+
+
+def test_similar_ranks_by_cosine():
+    index = SimilarityIndex("test_similar", n_features=1024)
+    index.load(DOCUMENTS)
+    matches = index.similar(1)
+    assert [value for value, _ in matches] == ["treasure", "whales"]
+    assert 0 < matches[1][1] < matches[0][1] < 1
+    assert index.similar(4) == []
+    assert index.similar(99) is None
+    assert [value for value, _ in index.similar_to_text("bread and whales biology", exclude=4)] == ["whales", "moby"]
+    assert [value for value, _ in index.similar(1, limit=1)] == ["treasure"]
+
+
+def test_refresh_updates_rows_incrementally():
+    index = SimilarityIndex("test_similar_refresh", n_features=1024)
+    index.load(DOCUMENTS)
+    index.refresh({2, 3}, [(3, "bread baking recipes", "baking"), (5, "captain whales hunt", "hunt")])
+    assert [value for value, _ in index.similar(1)] == ["hunt"]
+    assert [value for value, _ in index.similar(4)] == ["baking"]
+    assert [value for value, _ in index.similar(3)] == ["bread"]
+    assert index.similar(2) is None
+    stats = index.stats()
+    assert (stats["rows"], stats["masked"], stats["extra"], stats["changes"]) == (4, 2, 2, 2)
+
+
+def test_rebuild_after_enough_changes(monkeypatch):
+    monkeypatch.setattr(similarity, "REBUILD_FLOOR", 0)
+    index = SimilarityIndex("test_similar_rebuild", n_features=1024, rebuild_after=0.5)
+    index.load(DOCUMENTS)
+    index.refresh({4}, [(4, "whales captain", "captain")])
+    assert not index.start_rebuild()
+    index.refresh({2, 3}, [])
+    assert index.start_rebuild()
+    assert not index.start_rebuild()
+    items = [(1, "whales sea voyage captain", "moby"), (4, "whales captain", "captain")]
+    # changed while the rows were read: applied again on top of the new matrix
+    index.refresh({1}, [items[0]])
+    index.rebuild(items)
+    assert index.take_pending() == {1}
+    stats = index.stats()
+    assert (stats["rows"], stats["extra"], stats["changes"], stats["rebuilding"]) == (2, 0, 0, False)
+    assert [value for value, _ in index.similar(1)] == ["captain"]
+
+
+def _get_when_loaded(client, path, **kwargs):
+    # the first lookup starts the background build and is refused until it is done
+    deadline = time.monotonic() + 10
+    while True:
+        r = client.get(path, **kwargs)
+        if r.status_code != 503 or time.monotonic() > deadline:
+            return r
+        assert r.headers["retry-after"]
+        time.sleep(0.01)
+
+
+def test_generation_drops_a_build_from_before_clear():
+    index = SimilarityIndex("test_similar_generation", n_features=1024)
+    assert index.start_rebuild(force=True)
+    generation = index.generation
+    index.clear()
+    index.rebuild(DOCUMENTS, generation)
+    assert not index.loaded and not index.rebuilding
+    assert index.start_rebuild(force=True)
+    index.rebuild(DOCUMENTS, index.generation)
+    assert index.loaded and [value for value, _ in index.similar(1)] == ["treasure", "whales"]
+
+
+def test_lookups_never_wait_for_a_build(client, make_user, monkeypatch, make_isbn13):
+    owner = make_user("similar-build@example.com", "password")
+    auth = (owner["email"], "password")
+    author = client.post("/authors/persons", json={"name": "Build Author", "birth_date": "1919-08-01"}, auth=auth).json()
+    for n, title in enumerate(("Whales at sea", "Whales of the deep")):
+        data = {"title": title, "description": "whales", "status": "published", "author_id": author["id"], "isbn": make_isbn13(970 + n), "page_count": 10}
+        assert client.post("/materials/books", json=data, auth=auth).status_code == 201
+
+    release = threading.Event()
+    build = crud._build_similar_index
+
+    def slow_build(generation):
+        release.wait(10)
+        build(generation)
+
+    monkeypatch.setattr(crud, "_build_similar_index", slow_build)
+    r = client.get("/materials/1/similar")
+    assert r.status_code == 503 and r.headers["retry-after"] == "5"
+    release.set()
+    assert [item["id"] for item in _get_when_loaded(client, "/materials/1/similar").json()["items"]] == [2]
+
+    # a resync rebuilds in the background; lookups keep the current matrix meanwhile
+    release.clear()
+    change_feed._dispatch(None)
+    assert crud.similar_index.rebuilding
+    assert [item["id"] for item in client.get("/materials/1/similar").json()["items"]] == [2]
+    release.set()
+    deadline = time.monotonic() + 10
+    while crud.similar_index.rebuilding and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not crud.similar_index.rebuilding and crud.similar_index.loaded
+
+
+def test_similar_materials_endpoint(client, make_user, make_isbn13):
+    owner = make_user("similar@example.com", "password")
+    other = make_user("other-similar@example.com", "password")
+    auth = (owner["email"], "password")
+    author = client.post("/authors/persons", json={"name": "Herman Melville", "birth_date": "1919-08-01"}, auth=auth).json()
+
+    def book(title, description, n, status="published"):
+        data = {"title": title, "description": description, "status": status, "author_id": author["id"], "isbn": make_isbn13(n), "page_count": 10}
+        r = client.post("/materials/books", json=data, auth=auth)
+        assert r.status_code in (200, 201), r.text
+        return r.json()
+
+    moby = book("Moby Dick", "A whaling voyage on the sea", 980)
+    whales = book("Whales of the Sea", "The biology of whales", 981)
+    bread = book("Bread Baking", "Kitchen recipes", 982)
+    draft = book("Whale Notes", "whaling notes on whales", 983, status="draft")
+
+    r = _get_when_loaded(client, f"/materials/{moby['id']}/similar")
+    assert r.status_code == 200, r.text
+    items = r.json()["items"]
+    # drafts are never recommended
+    assert [(item["id"], item["text"], item["type"]) for item in items] == [(whales["id"], "Whales of the Sea", "book")]
+    assert 0 < items[0]["score"] <= 1
+
+    # a draft is compared by its text, for its owner only
+    assert [item["id"] for item in client.get(f"/materials/{draft['id']}/similar", auth=auth).json()["items"]] == [moby["id"], whales["id"]]
+    assert client.get(f"/materials/{draft['id']}/similar", auth=(other["email"], "password")).status_code == 403
+    assert client.get("/materials/999999/similar").status_code == 404
+
+    fields = ("title", "description", "status", "author_id")
+    r = client.put(f"/materials/books/{bread['id']}", json={**{k: bread[k] for k in fields}, "isbn": bread["isbn"], "page_count": 10, "description": "Whales and the sea"}, auth=auth)
+    assert r.status_code == 200, r.text
+    assert {item["id"] for item in client.get(f"/materials/{moby['id']}/similar").json()["items"]} == {whales["id"], bread["id"]}
+    assert client.delete(f"/materials/books/{whales['id']}", auth=auth).status_code == 200
+    assert [item["id"] for item in client.get(f"/materials/{moby['id']}/similar").json()["items"]] == [bread["id"]]
+
+
+def test_similar_materials_needs_scipy(client, monkeypatch):
+    monkeypatch.setattr(similarity, "available", lambda: False)
+    assert client.get("/materials/1/similar").status_code == 503
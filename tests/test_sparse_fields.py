@@ -0,0 +1,55 @@
+import pytest
+
+
+@pytest.fixture
+def sparse_books(make_user, make_author, make_material):
+    """Return a helper creating `count` published books with long descriptions: (author, books)."""
+
+    def _sparse_books(count=3):
+        user = make_user("sparse@example.com", "password")
+        auth = (user["email"], "password")
+        author = make_author(auth, "Sparse Author")
+        books = [
+            make_material(auth, "books", title=f"Sparse Book {i}", description="a long description " * 20, author_id=author["id"], page_count=50)
+            for i in range(count)
+        ]
+        return author, books
+
+    return _sparse_books
+
+
+def test_list_fields_restrict_response_and_sql(client, db_session, sparse_books, capture_sql):
+    sparse_books()
+
+    with capture_sql() as statements:
+        r = client.get("/materials?fields=id,title,status&page_size=2")
+    assert r.status_code == 200, r.text
+    data = r.json()
+    assert data["total"] == 3
+    assert all(set(item) == {"id", "title", "status"} for item in data["items"])
+    # the page query selects only the requested columns
+    page_queries = [s for s in statements if "LIMIT" in s.upper()]
+    assert page_queries and all("description" not in s for s in page_queries)
+    # pagination links keep the fieldset
+    assert "fields=id%2Ctitle%2Cstatus" in data["links"]["next"]
+
+
+def test_detail_fields(client, db_session, sparse_books):
+    author, books = sparse_books(count=1)
+    book_id = books[0]["id"]
+
+    r = client.get(f"/materials/books/{book_id}?fields=title,isbn")
+    assert r.status_code == 200, r.text
+    assert r.json() == {"title": "Sparse Book 0", "isbn": books[0]["isbn"]}
+
+    r = client.get(f"/materials/{book_id}?fields=id,type")
+    assert r.json() == {"id": book_id, "type": "book"}
+
+    r = client.get(f"/authors/{author['id']}?fields=name")
+    assert r.json() == {"name": "Sparse Author"}
+
+
+def test_unknown_field_is_rejected(client, db_session):
+    r = client.get("/materials/books?fields=title,password")
+    assert r.status_code == 400
+    assert r.json()["detail"][0]["loc"] == ["query", "fields"]